@@ -0,0 +1,644 @@
+"""Benchmark de carga do bot com um Discord simulado dentro do processo.
+
+Os handlers reais do `r6_bot.py` (comandos, views, veto, finalização e boas-vindas)
+são executados contra objetos falsos de guilda, canais, membros e interações.
+Cada chamada à API vira uma requisição HTTP para um servidor local (aiohttp)
+que imita a API do Discord, inclusive latência e respostas 429 por bucket.
+Nenhum token ou conexão externa é necessário.
+
+Relatório: latência p50/p95/p99 por comando, comandos SQL por comando, atraso
+do event loop, memória por lobby, restauração dos lobbies após um reinício
+simulado, custo das rodadas do matchmaking, consultas
+durante um backup e uma exportação completos e métricas do pipeline de
+boas-vindas.
+
+Uso:
+    python benchmark.py --jogadores 5000 --historico 2000 --comandos 500 --lobbies 50
+    python benchmark.py --json resultado.json   # para acompanhar regressões
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+# --- API HTTP falsa ---
+
+class ErroApi(Exception):
+    """Erro HTTP da API falsa (mesmos atributos usados do `discord.HTTPException`)."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+class ServidorApi:
+    """Servidor local que imita a API REST do Discord.
+
+    Cada bucket (rota + recurso) aceita `limite` requisições por `janela`
+    segundos; acima disso responde 429 com `retry_after`. Toda resposta leva
+    `latencia` segundos.
+    """
+
+    def __init__(self, limite: int, janela: float, latencia: float):
+        self.limite = limite
+        self.janela = janela
+        self.latencia = latencia
+        self.requisicoes = 0
+        self.limitadas = 0
+        self._buckets: Dict[str, List[float]] = {}  # bucket -> [início da janela, contagem]
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def _tratar(self, request: web.Request) -> web.Response:
+        self.requisicoes += 1
+        await asyncio.sleep(self.latencia)
+        bucket = f"{request.method} {request.match_info.get('bucket', '')}"
+        agora = time.monotonic()
+        estado = self._buckets.setdefault(bucket, [agora, 0])
+        if agora - estado[0] >= self.janela:
+            estado[0], estado[1] = agora, 0
+        estado[1] += 1
+        if estado[1] > self.limite:
+            self.limitadas += 1
+            retry_after = self.janela - (agora - estado[0])
+            return web.json_response({"retry_after": retry_after, "global": False}, status=429)
+        await request.read()
+        return web.json_response({"id": next(_ids)})
+
+    async def iniciar(self):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_route("*", "/{bucket:[^/]+/[^/]+}{resto:.*}", self._tratar)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        porta = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{porta}"
+
+    async def parar(self):
+        await self._runner.cleanup()
+
+class ClienteApi:
+    """Cliente da API falsa. Como o discord.py, espera e repete em caso de 429."""
+
+    def __init__(self, servidor: ServidorApi):
+        self.servidor = servidor
+        self.sessao: Optional[ClientSession] = None
+        self.esperas_429 = 0
+
+    async def requisitar(self, metodo: str, rota: str, corpo: Optional[dict] = None, repetir_429: bool = True) -> dict:
+        if self.sessao is None:
+            self.sessao = ClientSession()
+        while True:
+            async with self.sessao.request(metodo, self.servidor.url + rota, json=corpo) as resposta:
+                dados = await resposta.json()
+            if resposta.status != 429:
+                return dados
+            if not repetir_429:
+                raise ErroApi(429, dados["retry_after"])
+            self.esperas_429 += 1
+            await asyncio.sleep(dados["retry_after"])
+
+    async def fechar(self):
+        if self.sessao:
+            await self.sessao.close()
+
+_ids = itertools.count(10 ** 17)
+api: Optional[ClienteApi] = None
+
+def _corpo(content=None, embed=None, view=None, **_) -> dict:
+    """Serializa a mensagem como o discord.py faria antes de enviar."""
+    corpo = {"content": content}
+    if embed is not None:
+        corpo["embeds"] = [embed.to_dict()]
+    if view is not None:
+        corpo["components"] = view.to_components()
+    return corpo
+
+# --- Objetos falsos do Discord ---
+
+class AvatarFalso:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+class MembroFalso:
+    avatar = None
+    default_avatar = AvatarFalso()
+    bot = False
+
+    def __init__(self, guild: "GuildFalsa", discord_id: int):
+        self.guild = guild
+        self.id = discord_id
+        self.name = f"jogador{discord_id}"
+        self.display_name = self.name
+        self.mention = f"<@{discord_id}>"
+
+class MensagemFalsa:
+    def __init__(self, canal: "CanalFalso", mensagem_id: int):
+        self.canal = canal
+        self.channel = canal
+        self.id = mensagem_id
+
+    async def edit(self, **kwargs):
+        await api.requisitar("PATCH", f"/channels/{self.canal.id}/messages/{self.id}", _corpo(**kwargs))
+
+    async def delete(self):
+        await api.requisitar("DELETE", f"/channels/{self.canal.id}/messages/{self.id}")
+
+class CanalFalso:
+    def __init__(self, guild: "GuildFalsa", nome: str):
+        self.guild = guild
+        self.id = next(_ids)
+        self.name = nome
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content=None, **kwargs) -> MensagemFalsa:
+        dados = await api.requisitar("POST", f"/channels/{self.id}/messages", _corpo(content, **kwargs))
+        return MensagemFalsa(self, dados["id"])
+
+    async def create_voice_channel(self, nome: str, **_) -> "CanalFalso":
+        await api.requisitar("POST", f"/guilds/{self.guild.id}/channels", {"name": nome, "type": 2})
+        return CanalFalso(self.guild, nome)
+
+    async def delete(self):
+        await api.requisitar("DELETE", f"/channels/{self.id}/x")
+
+class GuildFalsa:
+    shard_id = 0
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = "Guilda de Benchmark"
+        self.membros: Dict[int, MembroFalso] = {}
+
+    def membro(self, discord_id: int) -> MembroFalso:
+        membro = self.membros.get(discord_id)
+        if membro is None:
+            membro = self.membros[discord_id] = MembroFalso(self, discord_id)
+        return membro
+
+class AnexoFalso:
+    filename = "resultado.png"
+
+    def __init__(self, dados: bytes):
+        self._dados = dados
+        self.size = len(dados)
+
+    async def read(self) -> bytes:
+        return self._dados
+
+class MensagemComandoFalsa:
+    def __init__(self, anexos: list):
+        self.attachments = anexos
+
+class ContextoFalso:
+    def __init__(self, membro: MembroFalso, canal: CanalFalso, anexos: Optional[list] = None):
+        self.author = membro
+        self.guild = membro.guild
+        self.channel = canal
+        self.message = MensagemComandoFalsa(anexos or [])
+
+    async def send(self, content=None, **kwargs) -> MensagemFalsa:
+        return await self.channel.send(content, **kwargs)
+
+class RespostaFalsa:
+    def __init__(self, interacao: "InteracaoFalsa"):
+        self._interacao = interacao
+        self._feita = False
+
+    def is_done(self) -> bool:
+        return self._feita
+
+    async def _responder(self, tipo: int, corpo: Optional[dict] = None):
+        self._feita = True
+        await api.requisitar("POST", f"/interactions/{self._interacao.id}/callback", {"type": tipo, "data": corpo})
+
+    async def defer(self, **_):
+        await self._responder(6)
+
+    async def send_message(self, content=None, ephemeral: bool = False, **kwargs):
+        await self._responder(4, _corpo(content, **kwargs))
+
+    async def edit_message(self, **kwargs):
+        await self._responder(7, _corpo(**kwargs))
+
+    async def send_modal(self, modal):
+        self._interacao.modal = modal
+        await self._responder(9, modal.to_dict())
+
+class WebhookFalso:
+    def __init__(self, interacao: "InteracaoFalsa"):
+        self._interacao = interacao
+
+    async def send(self, content=None, ephemeral: bool = False, **kwargs):
+        await api.requisitar("POST", f"/webhooks/{self._interacao.id}/x", _corpo(content, **kwargs))
+
+class InteracaoFalsa:
+    def __init__(self, membro: MembroFalso, mensagem: Optional[MensagemFalsa] = None):
+        self.id = next(_ids)
+        self.user = membro
+        self.guild = membro.guild
+        self.guild_id = membro.guild.id
+        self.message = mensagem
+        self.response = RespostaFalsa(self)
+        self.followup = WebhookFalso(self)
+        self.modal = None
+
+# --- Medições ---
+
+class Contador:
+    """Conta os comandos SQL executados em todas as conexões do bot."""
+
+    def __init__(self):
+        self.total = 0
+        self._trava = threading.Lock()
+
+    def __call__(self, sql: str):
+        with self._trava:
+            self.total += 1
+
+class MonitorLoop:
+    """Mede o atraso do event loop: quanto um sleep de `intervalo` demora além do pedido."""
+
+    def __init__(self, intervalo: float = 0.01):
+        self.intervalo = intervalo
+        self.atrasos: List[float] = []
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def _medir(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            self.atrasos.append(time.perf_counter() - inicio - self.intervalo)
+
+    def iniciar(self):
+        self.atrasos = []
+        self._tarefa = asyncio.create_task(self._medir())
+
+    def parar(self) -> List[float]:
+        self._tarefa.cancel()
+        return self.atrasos
+
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace, bot_modulo):
+        self.args = args
+        self.b = bot_modulo
+        self.guild = GuildFalsa(random.randint(10 ** 17, 10 ** 18))
+        self.canais = [CanalFalso(self.guild, f"comandos-{i}") for i in range(args.canais)]
+        self.sql = Contador()
+        self.monitor = MonitorLoop()
+        self.latencias: Dict[str, List[float]] = {}
+        self.resultados: Dict[str, dict] = {}
+
+    @property
+    def canal(self) -> CanalFalso:
+        """Canal de comandos sorteado (o rate limit da API é por canal)."""
+        return random.choice(self.canais)
+
+    async def medir(self, nome: str, coro):
+        inicio = time.perf_counter()
+        await coro
+        self.latencias.setdefault(nome, []).append(time.perf_counter() - inicio)
+
+    async def fase(self, nome: str, fabricas: list, concorrencia: Optional[int] = None):
+        """Executa as corrotinas de `fabricas` com concorrência limitada e registra as métricas."""
+        semaforo = asyncio.Semaphore(concorrencia or self.args.concorrencia)
+        sql_inicio = self.sql.total
+        self.monitor.iniciar()
+        inicio = time.perf_counter()
+
+        async def executar(fabrica):
+            async with semaforo:
+                await fabrica()
+
+        await asyncio.gather(*(executar(fabrica) for fabrica in fabricas))
+        duracao = time.perf_counter() - inicio
+        atrasos = self.monitor.parar()
+        self.resultados.setdefault("fases", {})[nome] = {
+            "operacoes": len(fabricas),
+            "duracao_s": round(duracao, 3),
+            "sql_por_operacao": round((self.sql.total - sql_inicio) / max(len(fabricas), 1), 2),
+            "atraso_loop_p99_ms": round(percentil(atrasos, 99) * 1000, 2),
+            "atraso_loop_max_ms": round(max(atrasos, default=0) * 1000, 2),
+        }
+
+    # Preparação
+
+    def instrumentar_banco(self):
+        original = self.b.get_db_connection
+
+        def conexao_instrumentada():
+            conn = original()
+            conn.set_trace_callback(self.sql)
+            return conn
+
+        self.b.get_db_connection = conexao_instrumentada
+
+    async def popular(self):
+        """Cria a população sintética de jogadores e o histórico de partidas."""
+        b, args = self.b, self.args
+        ranks = list(b.RANKS)
+
+        def inserir_jogadores(conn):
+            linhas = []
+            for discord_id in range(1, args.jogadores + 1):
+                rank = random.choice(ranks)
+                linhas.append((self.guild.id, discord_id, f"jogador{discord_id}", f"Nick{discord_id}", rank, b.RANKS[rank]["valor"]))
+            conn.executemany(
+                "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo) VALUES (?, ?, ?, ?, ?, ?)",
+                linhas
+            )
+
+        await b.db.transacao(inserir_jogadores)
+
+        partidas = []
+        for _ in range(args.historico):
+            ids = random.sample(range(1, args.jogadores + 1), b.MAX_JOGADORES)
+            partidas.append({
+                "guild_id": self.guild.id,
+                "lobby_id": "lobby_historico",
+                "mapa": random.choice(b.mapas),
+                "time_vencedor": random.choice((1, 2)),
+                "jogadores": [(d, 1 if i < 5 else 2, random.randint(0, 25), random.randint(0, 25)) for i, d in enumerate(ids)]
+            })
+        for bloco in b._em_blocos(partidas, 500):
+            await b.db.transacao(b._finalizar_partidas_lote, bloco)
+
+        estado = b.estado_guild(self.guild.id)
+        estado.canal_resultados = CanalFalso(self.guild, "resultados-partidas")
+        estado.canal_boas_vindas = CanalFalso(self.guild, "boas-vindas")
+        estado.categoria_partidas = CanalFalso(self.guild, "PARTIDAS")
+
+    # Cenários
+
+    async def cenario_registro(self):
+        """!registrar seguido das views: botão de registro, modal do nick e seleção de rank."""
+        b = self.b
+        novos = [self.guild.membro(self.args.jogadores + 1 + i) for i in range(self.args.comandos)]
+
+        async def registrar(membro):
+            await self.medir("registrar", b.registrar(ContextoFalso(membro, self.canal)))
+            interacao = InteracaoFalsa(membro)
+            await self.medir("view:BotaoRegistro", b.BotaoRegistro(membro.id).callback(interacao))
+            modal = interacao.modal
+            modal.nick._refresh_state(interacao, {"value": f"Novo{membro.id}"})
+            await self.medir("view:NickModal", modal.on_submit(InteracaoFalsa(membro)))
+            selecao = b.SelecaoRank(membro.id)
+            interacao = InteracaoFalsa(membro)
+            selecao.item._refresh_state(interacao, {"values": [random.choice(list(b.RANKS))]})
+            await self.medir("view:SelecaoRank", selecao.callback(interacao))
+
+        await self.fase("registro", [lambda m=m: registrar(m) for m in novos])
+
+    async def cenario_consultas(self):
+        b = self.b
+
+        def estatisticas():
+            membro = self.guild.membro(random.randint(1, self.args.jogadores))
+            return self.medir("estatisticas", b.estatisticas(ContextoFalso(membro, self.canal)))
+
+        def ranking():
+            membro = self.guild.membro(random.randint(1, self.args.jogadores))
+            return self.medir("ranking", b.ranking(ContextoFalso(membro, self.canal)))
+
+        await self.fase("estatisticas", [estatisticas] * self.args.comandos)
+        await self.fase("ranking", [ranking] * self.args.comandos)
+
+    async def cenario_partidas(self):
+        """Enche lobbies com !entrar, faz o veto pelos botões e finaliza as partidas."""
+        b, args = self.b, self.args
+        b.VETO_DEBOUNCE = 0.05
+        estado = b.estado_guild(self.guild.id)
+        jogadores = random.sample(range(1, args.jogadores + 1), args.lobbies * b.MAX_JOGADORES)
+        membros = [self.guild.membro(discord_id) for discord_id in jogadores]
+
+        gc.collect()
+        tracemalloc.start()
+        memoria_inicio = tracemalloc.get_traced_memory()[0]
+
+        await self.fase("entrar", [
+            lambda m=m: self.medir("entrar", b.entrar(ContextoFalso(m, self.canal))) for m in membros
+        ])
+
+        # A rodada simula a janela já aberta ao máximo: todos os jogadores da fila viram partidas
+        espera_maxima = b.MM_JANELA_MAX / b.MM_JANELA_POR_SEGUNDO
+        await self.fase("matchmaking", [
+            lambda: self.medir("matchmaking", b.matchmaking.rodada(time.monotonic() + espera_maxima))
+        ])
+
+        lobbies = [lobby for lobby in estado.lobbies if lobby.estado == b.LOBBY_VETO]
+
+        async def vetar(lobby):
+            while lobby.estado == b.LOBBY_VETO:
+                capitao = b.capitao_da_vez(lobby)
+                indice = random.choice([i for i, mapa in enumerate(b.mapas) if mapa not in lobby.mapas_banidos])
+                botao = b.BanMapaButton(lobby.numero, indice)
+                await self.medir("view:BanMapaButton", botao.callback(InteracaoFalsa(capitao, lobby.ban_message)))
+
+        await self.fase("veto", [lambda l=l: vetar(l) for l in lobbies])
+        await asyncio.sleep(b.VETO_DEBOUNCE * 4)
+
+        gc.collect()
+        memoria = tracemalloc.get_traced_memory()[0] - memoria_inicio
+        tracemalloc.stop()
+        self.resultados["memoria_por_lobby_kb"] = round(memoria / max(len(lobbies), 1) / 1024, 2)
+
+        # Reinício simulado: os lobbies em memória são descartados e voltam do banco
+        await b.db.transacao(lambda conn: None)  # Espera as gravações de lobby já enfileiradas
+        estado.lobbies = b.GerenciadorLobbies(self.guild.id)
+        await self.fase("restaurar_lobbies", [lambda: self.medir("restaurar_lobbies", b.carregar_lobbies())])
+        self.resultados["lobbies_restaurados"] = len(estado.lobbies)
+
+        admin = self.guild.membro(10 ** 6)
+
+        def finalizar(lobby):
+            anexo = AnexoFalso(os.urandom(64 * 1024))
+            ctx = ContextoFalso(admin, self.canal, [anexo])
+            return self.medir("finalizar_partida", b.finalizar_partida(ctx, lobby.id))
+
+        # Acima de OCR_FILA_MAX envios simultâneos o pipeline recusa (backpressure)
+        await self.fase("finalizar_partida", [lambda l=l: finalizar(l) for l in lobbies], b.OCR_FILA_MAX)
+
+    async def cenario_fila(self):
+        """Custo de cada rodada do matchmaking com milhares de jogadores na fila (só CPU, sem API)."""
+        b, args = self.b, self.args
+        fila = b.FilaMatchmaking()
+        elos = [b.RANKS[rank]["valor"] + random.randint(-400, 400) for rank in random.choices(list(b.RANKS), k=args.fila)]
+        agora = 0.0
+        for discord_id, elo in enumerate(elos, 10 ** 8):
+            fila.entrar(self.guild.membro(discord_id), elo, self.canal, agora=agora - random.random() * 60)
+
+        inicio = time.perf_counter()
+        fila.rodada(agora)
+        self.latencias.setdefault("fila:rodada_inicial", []).append(time.perf_counter() - inicio)
+
+        proximo_id = 10 ** 8 + args.fila
+        for _ in range(args.rodadas_fila):
+            agora += b.MM_INTERVALO
+            for _ in range(args.chegadas_fila):
+                fila.entrar(self.guild.membro(proximo_id), random.choice(elos), self.canal, agora=agora)
+                proximo_id += 1
+            inicio = time.perf_counter()
+            fila.rodada(agora)
+            self.latencias.setdefault("fila:rodada", []).append(time.perf_counter() - inicio)
+        self.resultados["fila_restante"] = len(fila)
+
+    async def cenario_backup_exportacao(self):
+        """Backup online e exportação completa da guilda enquanto consultas são atendidas."""
+        b = self.b
+        exportacao = {}
+
+        async def exportar():
+            for tabela, caminho, linhas in await b.exportar_estatisticas(self.guild.id, list(b.EXPORTACOES), "csv"):
+                exportacao[tabela] = {"linhas": linhas, "kb": round(os.path.getsize(caminho) / 1024, 1)}
+
+        def estatisticas():
+            membro = self.guild.membro(random.randint(1, self.args.jogadores))
+            return self.medir("estatisticas:durante_backup", b.estatisticas(ContextoFalso(membro, self.canal)))
+
+        await self.fase("backup_exportacao", [
+            lambda: self.medir("backup", b.servico_backup.executar()),
+            lambda: self.medir("exportar", exportar()),
+        ] + [estatisticas] * self.args.comandos)
+        self.resultados["exportacao"] = exportacao
+
+    async def cenario_boas_vindas(self):
+        """Rajada de entradas no servidor passando pelo pipeline de boas-vindas."""
+        b = self.b
+
+        async def enviar(canal, mensagem):
+            # Sem repetição automática: o 429 chega ao pipeline, que ajusta o ritmo
+            await api.requisitar("POST", f"/channels/{canal.id}/messages", _corpo(**mensagem), repetir_429=False)
+
+        b.pipeline_boas_vindas = b.PipelineBoasVindas(enviar=enviar, janela=self.args.janela_boas_vindas)
+        membros = [self.guild.membro(10 ** 7 + i) for i in range(self.args.entradas)]
+
+        await self.fase("on_member_join", [
+            lambda m=m: self.medir("on_member_join", b.on_member_join(m)) for m in membros
+        ])
+
+        inicio = time.perf_counter()
+        pipeline = b.pipeline_boas_vindas
+        while pipeline.entregues + pipeline.descartados < len(membros) and time.perf_counter() - inicio < self.args.limite_boas_vindas:
+            await asyncio.sleep(0.05)
+        self.resultados["boas_vindas"] = dict(pipeline.metricas(), segundos_para_entregar=round(time.perf_counter() - inicio, 2))
+
+    async def executar(self):
+        servidor = ServidorApi(self.args.api_limite, self.args.api_janela, self.args.api_latencia)
+        await servidor.iniciar()
+        global api
+        api = ClienteApi(servidor)
+        try:
+            inicio = time.perf_counter()
+            await self.popular()
+            self.resultados["populacao_s"] = round(time.perf_counter() - inicio, 2)
+
+            await self.cenario_registro()
+            await self.cenario_consultas()
+            await self.cenario_partidas()
+            await self.cenario_fila()
+            await self.cenario_backup_exportacao()
+            await self.cenario_boas_vindas()
+        finally:
+            await api.fechar()
+            await servidor.parar()
+
+        self.resultados["comandos"] = {
+            nome: {
+                "n": len(valores),
+                "p50_ms": round(percentil(valores, 50) * 1000, 2),
+                "p95_ms": round(percentil(valores, 95) * 1000, 2),
+                "p99_ms": round(percentil(valores, 99) * 1000, 2),
+            }
+            for nome, valores in self.latencias.items()
+        }
+        self.resultados["api"] = {
+            "requisicoes": servidor.requisicoes,
+            "respostas_429": servidor.limitadas,
+            "esperas_429_cliente": api.esperas_429,
+        }
+        self.resultados["cache_jogadores_acerto"] = round(
+            self.b.estado_shard(self.b.shard_da_guild(self.guild.id)).cache_jogadores.taxa_acerto, 3
+        )
+
+def imprimir(resultados: dict):
+    print(f"\n{'comando':<24}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nome, m in resultados["comandos"].items():
+        print(f"{nome:<24}{m['n']:>7}{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}")
+    print(f"\n{'fase':<20}{'ops':>7}{'dur s':>9}{'sql/op':>9}{'loop p99 ms':>13}{'loop max ms':>13}")
+    for nome, m in resultados["fases"].items():
+        print(f"{nome:<20}{m['operacoes']:>7}{m['duracao_s']:>9}{m['sql_por_operacao']:>9}"
+              f"{m['atraso_loop_p99_ms']:>13}{m['atraso_loop_max_ms']:>13}")
+    print(f"\nMemória por lobby: {resultados['memoria_por_lobby_kb']} KB")
+    print(f"Lobbies restaurados após o reinício: {resultados['lobbies_restaurados']}")
+    print(f"Acerto do cache de jogadores: {resultados['cache_jogadores_acerto']:.1%}")
+    print(f"API: {resultados['api']}")
+    print(f"Exportação: {resultados['exportacao']}")
+    print(f"Boas-vindas: {resultados['boas_vindas']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jogadores", type=int, default=5000, help="Jogadores registrados na população sintética")
+    parser.add_argument("--historico", type=int, default=2000, help="Partidas já existentes no histórico")
+    parser.add_argument("--comandos", type=int, default=300, help="Execuções por cenário de comando")
+    parser.add_argument("--concorrencia", type=int, default=20, help="Comandos simultâneos")
+    parser.add_argument("--lobbies", type=int, default=30, help="Lobbies cheios criados e finalizados")
+    parser.add_argument("--canais", type=int, default=10, help="Canais de texto onde os comandos são usados")
+    parser.add_argument("--entradas", type=int, default=500, help="Membros na rajada de on_member_join")
+    parser.add_argument("--janela-boas-vindas", type=float, default=1.0, help="Janela de agrupamento das boas-vindas (s)")
+    parser.add_argument("--limite-boas-vindas", type=float, default=60.0, help="Tempo máximo esperando as boas-vindas (s)")
+    parser.add_argument("--api-limite", type=int, default=50, help="Requisições por bucket e janela antes do 429")
+    parser.add_argument("--api-janela", type=float, default=1.0, help="Janela do rate limit da API falsa (s)")
+    parser.add_argument("--api-latencia", type=float, default=0.005, help="Latência de cada requisição à API falsa (s)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--fila", type=int, default=5000, help="Jogadores na fila no cenário de matchmaking")
+    parser.add_argument("--chegadas-fila", type=int, default=20, help="Novos jogadores na fila a cada rodada")
+    parser.add_argument("--rodadas-fila", type=int, default=300, help="Rodadas medidas no cenário de matchmaking")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    args = parser.parse_args()
+    random.seed(args.semente)
+
+    # Os caminhos do bot são lidos na importação: aponta para um banco temporário antes
+    diretorio = tempfile.mkdtemp(prefix="r6_benchmark_")
+    os.environ["R6_DB_PATH"] = os.path.join(diretorio, "benchmark.db")
+    os.environ["R6_CAPTURAS_DIR"] = os.path.join(diretorio, "capturas")
+    os.environ["R6_BACKUP_DIR"] = os.path.join(diretorio, "backups")
+    os.environ["R6_EXPORTACAO_DIR"] = os.path.join(diretorio, "exportacoes")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import r6_bot
+    r6_bot.init_db()
+    r6_bot.pipeline_resultados.aquecer()
+    logging.getLogger("discord_bot").setLevel(logging.WARNING)
+
+    benchmark = Benchmark(args, r6_bot)
+    benchmark.instrumentar_banco()
+    try:
+        asyncio.run(benchmark.executar())
+    finally:
+        r6_bot.pipeline_resultados.fechar()
+        r6_bot.db.fechar()
+
+    imprimir(benchmark.resultados)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(benchmark.resultados, arquivo, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
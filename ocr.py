@@ -0,0 +1,101 @@
+"""Backends de extração dos prints de resultado, executados nos processos do pool de OCR.
+
+Os processos do pool são iniciados por "spawn" e importam este módulo para
+rodar `executar_ocr`. Por isso ele não pode ter efeitos colaterais na
+importação (banco, bot, logging): só define os backends.
+"""
+import difflib
+import hashlib
+import random
+import re
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+class BackendOCR:
+    """Backend de extração executado dentro dos processos do pool.
+
+    Subclasses implementam `_preprocessar` e `_ler_placar`; o mapeamento dos
+    nomes lidos para os jogadores do lobby é comum a todos os backends.
+    """
+
+    def extrair(self, dados: bytes, nicknames: List[str]) -> dict:
+        imagem = self._preprocessar(dados)
+        time_vencedor, linhas = self._ler_placar(imagem)
+        kills, deaths = self._mapear_jogadores(linhas, nicknames)
+        return {"time_vencedor": time_vencedor, "kills": kills, "deaths": deaths}
+
+    def _preprocessar(self, dados: bytes):
+        raise NotImplementedError
+
+    def _ler_placar(self, imagem) -> Tuple[int, List[Tuple[str, int, int]]]:
+        """Retorna o time vencedor e as linhas `(nome, kills, deaths)` do placar."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _mapear_jogadores(linhas: List[Tuple[str, int, int]], nicknames: List[str]) -> Tuple[List[int], List[int]]:
+        """Associa cada linha lida ao nick mais parecido do lobby (jogadores não lidos ficam 0/0)."""
+        lidos = {nome.lower(): (k, d) for nome, k, d in linhas}
+        kills, deaths = [], []
+        for nick in nicknames:
+            parecidos = difflib.get_close_matches((nick or "").lower(), list(lidos), n=1, cutoff=0.6)
+            k, d = lidos.pop(parecidos[0]) if parecidos else (0, 0)
+            kills.append(k)
+            deaths.append(d)
+        return kills, deaths
+
+class BackendSimulado(BackendOCR):
+    """Backend determinístico: o resultado depende apenas do hash da imagem."""
+
+    def extrair(self, dados: bytes, nicknames: List[str]) -> dict:
+        gerador = random.Random(hashlib.sha256(dados).digest())
+        return {
+            "time_vencedor": gerador.randint(1, 2),
+            "kills": [gerador.randint(0, 15) for _ in nicknames],
+            "deaths": [gerador.randint(0, 15) for _ in nicknames]
+        }
+
+class BackendTesseract(BackendOCR):
+    """OCR local com Tesseract (requer `Pillow` e `pytesseract` instalados)."""
+
+    PADRAO_LINHA = re.compile(r"^\s*(\S+)\s+(\d{1,2})\s+(\d{1,2})\b")
+
+    def _preprocessar(self, dados: bytes):
+        from PIL import Image, ImageOps
+        imagem = Image.open(BytesIO(dados)).convert("L")
+        imagem = ImageOps.autocontrast(imagem)
+        imagem = imagem.resize((imagem.width * 2, imagem.height * 2))
+        return imagem.point(lambda p: 255 if p > 140 else 0)
+
+    def _ler_placar(self, imagem) -> Tuple[int, List[Tuple[str, int, int]]]:
+        import pytesseract
+        texto = pytesseract.image_to_string(imagem)
+        maiusculo = texto.upper()
+        if "VICTORY" in maiusculo or "VITÓRIA" in maiusculo:
+            time_vencedor = 1
+        elif "DEFEAT" in maiusculo or "DERROTA" in maiusculo:
+            time_vencedor = 2
+        else:
+            raise ValueError("Não foi possível identificar o time vencedor no print.")
+        linhas = []
+        for linha in texto.splitlines():
+            encontrado = self.PADRAO_LINHA.match(linha)
+            if encontrado:
+                linhas.append((encontrado.group(1), int(encontrado.group(2)), int(encontrado.group(3))))
+        return time_vencedor, linhas
+
+BACKENDS_OCR = {
+    "simulado": BackendSimulado,
+    "tesseract": BackendTesseract
+}
+
+_backends_processo: Dict[str, BackendOCR] = {}
+
+def executar_ocr(nome_backend: str, dados: bytes, nicknames: List[str]) -> dict:
+    """Ponto de entrada nos processos do pool (uma instância de backend por processo)."""
+    backend = _backends_processo.get(nome_backend)
+    if backend is None:
+        backend = _backends_processo[nome_backend] = BACKENDS_OCR[nome_backend]()
+    return backend.extrair(dados, nicknames)
+
+def aquecer() -> None:
+    """Tarefa vazia, enviada na inicialização para os processos do pool já estarem de pé no primeiro print."""
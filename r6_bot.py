@@ -1,18 +1,39 @@
 import discord
 from discord.ext import commands
-from discord.ui import Button, View, Select
+from discord import app_commands
+from discord.ui import View, Select
 import random
 import os
 import asyncio
 import logging
 import sqlite3
-from typing import Optional, Dict, List, Tuple
+import threading
+import queue
+import heapq
+import time
+import bisect
+import functools
+import sys
+from collections import OrderedDict, deque
+import hashlib
+import csv
+import gzip
+import json
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Dict, List, Set, Tuple
 from datetime import datetime, timedelta
 import aiohttp
 from io import BytesIO
 import pytz
 from dotenv import load_dotenv
 import re
+import unicodedata
+from array import array
+
+from ocr import BACKENDS_OCR, aquecer, executar_ocr
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -29,8 +50,8 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-# Criando a instância do bot
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Criando a instância do bot (os shards são definidos automaticamente pelo Discord)
+bot = commands.AutoShardedBot(command_prefix='!', intents=intents)
 
 # --- Variáveis e Constantes ---
 
@@ -46,16 +67,10 @@ RANKS = {
     "CHAMPION": {"emoji": "🏆", "valor": 7000}
 }
 
-# Variáveis globais (simplificadas para o lobby_1)
-lobbies = {
-    "lobby_1": {
-        "jogadores": [],
-        "em_andamento": False,
-        "sala_partida": None,
-        "canal_resultados": None
-    }
-}
+# Configurações dos lobbies
 MAX_JOGADORES = 10
+ELO_VITORIA = 25
+ELO_DERROTA = -10
 TIMEOUT_DURATION = 900  # 15 minutos em segundos
 
 # Lista atualizada de mapas
@@ -65,36 +80,474 @@ mapas = [
     "NIGHTHAVEN LABS", "LAIR", "OUTBACK", "THEME PARK", "EMERALD PLAINS"
 ]
 
-# Dicionário para armazenar informações de cada lobby
-lobby_info = {
-    "lobby_1": {
-        "capitao1": None,
-        "capitao2": None,
-        "mapas_banidos": [],
-        "mapa_escolhido": None,
-        "ban_view": None,
-        "ban_message": None,
-        "jogadores_timeout": set()
-    }
-}
-
-# Canais de administração
-categoria_partidas = None
-categoria_lobbies = None
-canal_resultados = None
-canal_boas_vindas = None
+PROVISIONAMENTO_PARALELO = 5  # Guildas configuradas simultaneamente na inicialização
 
 # Configuração do banco de dados
-DB_PATH = "r6_stats.db"
+DB_PATH = os.getenv("R6_DB_PATH", "r6_stats.db")
+DB_LEITORES = 4  # Conexões de leitura simultâneas (o modo WAL permite leitores concorrentes)
+DB_LOTE_MAX = 128  # Máximo de escritas gravadas em um único commit
+DB_LOTE_JANELA = 0.002  # Tempo (s) que a thread de escrita espera por mais operações antes do commit
+
+# --- Métricas ---
+
+METRICAS_PORTA = os.getenv("R6_METRICAS_PORTA")      # Se definida, expõe /metrics (formato Prometheus) nesta porta
+METRICAS_HOST = os.getenv("R6_METRICAS_HOST", "127.0.0.1")  # Endereço do /metrics; "0.0.0.0" expõe fora da máquina
+METRICAS_ARQUIVO = os.getenv("R6_METRICAS_ARQUIVO")  # Se definido, grava as métricas neste arquivo periodicamente
+METRICAS_INTERVALO_ARQUIVO = 15
+BALDES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    """Histograma de baldes fixos (segundos), como os do Prometheus."""
+    __slots__ = ("contagens", "soma", "total")
+
+    def __init__(self):
+        self.contagens = [0] * (len(BALDES_LATENCIA) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect.bisect_left(BALDES_LATENCIA, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def percentil(self, p: float) -> float:
+        """Limite superior do balde que contém o percentil `p` (infinito se passar do último)."""
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for limite, contagem in zip(BALDES_LATENCIA, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return limite
+        return float("inf")
+
+class Metricas:
+    """Registro em memória de histogramas, contadores e medidores com rótulos.
+
+    É seguro entre threads (as consultas SQL são medidas nas threads do banco).
+    Medidores são funções avaliadas apenas na exportação.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._histogramas: Dict[str, Dict[tuple, Histograma]] = {}
+        self._contadores: Dict[str, Dict[tuple, float]] = {}
+        self._medidores: Dict[str, Callable[[], float]] = {}
+
+    def observar(self, nome: str, valor: float, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._trava:
+            serie = self._histogramas.setdefault(nome, {})
+            histograma = serie.get(chave)
+            if histograma is None:
+                histograma = serie[chave] = Histograma()
+            histograma.observar(valor)
+
+    def incrementar(self, nome: str, valor: float = 1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._trava:
+            serie = self._contadores.setdefault(nome, {})
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def medidor(self, nome: str, funcao: Callable[[], float]):
+        self._medidores[nome] = funcao
+
+    def histogramas(self, nome: str) -> Dict[tuple, Histograma]:
+        with self._trava:
+            return dict(self._histogramas.get(nome, {}))
+
+    def contadores(self, nome: str) -> Dict[tuple, float]:
+        with self._trava:
+            return dict(self._contadores.get(nome, {}))
+
+    def valor_medidor(self, nome: str) -> float:
+        try:
+            return float(self._medidores[nome]())
+        except Exception:
+            return float("nan")
+
+    def prometheus(self) -> str:
+        """Exporta tudo no formato texto do Prometheus."""
+        def escapar(valor) -> str:
+            return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        def rotulos(chave: tuple, extra: str = "") -> str:
+            partes = [f'{nome}="{escapar(valor)}"' for nome, valor in chave]
+            if extra:
+                partes.append(extra)
+            return "{" + ",".join(partes) + "}" if partes else ""
+        
+        linhas = []
+        with self._trava:
+            for nome, serie in sorted(self._histogramas.items()):
+                linhas.append(f"# TYPE {nome} histogram")
+                for chave, histograma in serie.items():
+                    acumulado = 0
+                    for limite, contagem in zip(BALDES_LATENCIA + (float("inf"),), histograma.contagens):
+                        acumulado += contagem
+                        le = "+Inf" if limite == float("inf") else repr(limite)
+                        balde = f'le="{le}"'
+                        linhas.append(f"{nome}_bucket{rotulos(chave, balde)} {acumulado}")
+                    linhas.append(f"{nome}_sum{rotulos(chave)} {histograma.soma}")
+                    linhas.append(f"{nome}_count{rotulos(chave)} {histograma.total}")
+            for nome, serie in sorted(self._contadores.items()):
+                linhas.append(f"# TYPE {nome} counter")
+                for chave, valor in serie.items():
+                    linhas.append(f"{nome}{rotulos(chave)} {valor}")
+        for nome in sorted(self._medidores):
+            linhas.append(f"# TYPE {nome} gauge")
+            linhas.append(f"{nome} {self.valor_medidor(nome)}")
+        return "\n".join(linhas) + "\n"
+
+metricas = Metricas()
+
+def cronometrar(nome: str, **rotulos):
+    """Decorador que registra a duração de cada chamada da corrotina no histograma `nome`."""
+    def decorador(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metricas.observar(nome, time.perf_counter() - inicio, **rotulos)
+        return envoltorio
+    return decorador
+
+class ColetorRateLimit(logging.Handler):
+    """Converte os avisos de rate limit do cliente HTTP do discord.py em métricas.
+
+    O discord.py repete sozinho as requisições que recebem 429, então esses
+    avisos são o único sinal de limitação que chega ao bot. Os `ouvintes`
+    recebem `(escopo, espera, rota)` de cada 429 (`rota` é None no global).
+
+    Um 429 global gera o aviso da rota e, logo em seguida, o global. O aviso
+    da rota fica pendente até a próxima iteração do loop e é descartado se o
+    global chegar antes, para que cada 429 seja contado uma só vez.
+    """
+
+    def __init__(self, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.ouvintes: List[Callable[[str, float, Optional[str]], None]] = []
+        self._pendente: Optional[Tuple[float, str]] = None
+
+    def _registrar(self, escopo: str, espera: float, rota: Optional[str]):
+        metricas.observar("r6_discord_rate_limit_espera_segundos", espera, escopo=escopo)
+        for ouvinte in self.ouvintes:
+            ouvinte(escopo, espera, rota)
+
+    def _confirmar(self):
+        if self._pendente is not None:
+            espera, rota = self._pendente
+            self._pendente = None
+            self._registrar("rota", espera, rota)
+
+    def emit(self, record: logging.LogRecord):
+        if not isinstance(record.msg, str):
+            return
+        if record.msg.startswith("We are being rate limited"):
+            self._confirmar()
+            self._pendente = (float(record.args[2]), f"{record.args[0]} {record.args[1]}")
+            try:
+                asyncio.get_running_loop().call_soon(self._confirmar)
+            except RuntimeError:
+                self._confirmar()
+        elif record.msg.startswith("Global rate limit has been hit"):
+            self._pendente = None
+            self._registrar("global", float(record.args[0]), None)
+
+coletor_rate_limit = ColetorRateLimit(logging.WARNING)
+logging.getLogger("discord.http").addHandler(coletor_rate_limit)
+
+_atraso_loop = 0.0
+
+async def monitorar_loop(intervalo: float = 0.5):
+    """Mede o atraso do event loop: quanto um sleep demora além do pedido."""
+    global _atraso_loop
+    while True:
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        _atraso_loop = time.perf_counter() - inicio - intervalo
+        metricas.observar("r6_loop_atraso_segundos", _atraso_loop)
+
+metricas.medidor("r6_loop_atraso_atual_segundos", lambda: _atraso_loop)
+
+async def _servir_metricas(porta: int):
+    from aiohttp import web
+    
+    async def tratar(request):
+        return web.Response(text=metricas.prometheus(), content_type="text/plain", charset="utf-8")
+    
+    app = web.Application()
+    app.router.add_get("/metrics", tratar)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICAS_HOST, porta).start()
+    logger.info(f"Métricas disponíveis em http://{METRICAS_HOST}:{porta}/metrics")
+
+def _gravar_metricas(caminho: str, texto: str):
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(texto)
+    os.replace(temporario, caminho)
+
+async def gravar_metricas_periodicamente(caminho: str):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _gravar_metricas, caminho, metricas.prometheus())
+        except OSError as e:
+            logger.error(f"Erro ao gravar métricas em {caminho}: {e}")
+        await asyncio.sleep(METRICAS_INTERVALO_ARQUIVO)
+
+_tarefas_metricas: List[asyncio.Task] = []
+
+async def iniciar_metricas():
+    """Inicia o monitor do loop e os exportadores configurados (uma vez por processo)."""
+    if _tarefas_metricas:
+        return
+    _tarefas_metricas.append(asyncio.create_task(monitorar_loop()))
+    if METRICAS_ARQUIVO:
+        _tarefas_metricas.append(asyncio.create_task(gravar_metricas_periodicamente(METRICAS_ARQUIVO)))
+    if METRICAS_PORTA:
+        await _servir_metricas(int(METRICAS_PORTA))
 
 # --- Funções de Banco de Dados ---
 
 def get_db_connection():
-    """Retorna uma nova conexão com o banco de dados."""
-    conn = sqlite3.connect(DB_PATH)
+    """Retorna uma nova conexão com o banco de dados, já com os pragmas de desempenho."""
+    conn = sqlite3.connect(DB_PATH, cached_statements=256, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA mmap_size=268435456")
     return conn
 
+class BancoDados:
+    """Camada assíncrona de acesso ao SQLite.
+
+    Mantém conexões de longa duração em threads dedicadas: um pool de leitura e
+    uma única thread de escrita. O loop de eventos só aguarda os resultados e
+    nunca bloqueia em I/O de disco. Os comandos SQL ficam em cache em cada
+    conexão (`cached_statements`), então as consultas repetidas reaproveitam o
+    statement já preparado.
+
+    Todas as escritas passam por uma fila única consumida pela thread de
+    escrita, que aplica as operações em lotes (group commit): até
+    `DB_LOTE_MAX` operações, ou o que chegar em `DB_LOTE_JANELA` segundos, são
+    gravadas em uma única transação e um único commit. Cada operação roda em
+    seu próprio SAVEPOINT, então uma falha desfaz só ela; as demais do lote
+    seguem. A ordem de chegada é a ordem de aplicação, e cada chamador só é
+    liberado depois que o commit do seu lote foi concluído.
+    """
+
+    def __init__(self, leitores: int = DB_LEITORES):
+        self._local = threading.local()
+        self._conexoes: List[sqlite3.Connection] = []
+        self._trava_conexoes = threading.Lock()
+        self._leitura = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="db-leitura")
+        self._fila_escrita: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._escritor: Optional[threading.Thread] = None
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Conexão persistente da thread atual (criada no primeiro uso)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_db_connection()
+            self._local.conn = conn
+            with self._trava_conexoes:
+                self._conexoes.append(conn)
+        return conn
+
+    def _ler(self, func: Callable, args: tuple, origem: str, enviado_em: float):
+        inicio = time.perf_counter()
+        metricas.observar("r6_sql_espera_segundos", inicio - enviado_em, tipo="leitura")
+        try:
+            return func(self._conexao(), *args)
+        finally:
+            metricas.observar("r6_sql_segundos", time.perf_counter() - inicio, origem=origem, tipo="leitura")
+
+    # --- Escrita em lote ---
+
+    def _executar_escritor(self):
+        """Laço da thread de escrita: junta operações em lotes até receber `None`.
+
+        A janela de espera só é usada quando o lote anterior teve mais de uma
+        operação (há carga); uma escrita isolada é gravada sem atraso extra.
+        """
+        conn = self._conexao()
+        encerrar = False
+        janela = 0.0
+        while not encerrar:
+            operacao = self._fila_escrita.get()
+            if operacao is None:
+                break
+            lote = [operacao]
+            limite = time.perf_counter() + janela
+            while len(lote) < DB_LOTE_MAX:
+                restante = limite - time.perf_counter()
+                try:
+                    operacao = self._fila_escrita.get(timeout=restante) if restante > 0 else self._fila_escrita.get_nowait()
+                except queue.Empty:
+                    break
+                if operacao is None:
+                    encerrar = True
+                    break
+                lote.append(operacao)
+            self._aplicar_lote(conn, lote)
+            janela = DB_LOTE_JANELA if len(lote) > 1 else 0.0
+
+    def _aplicar_lote(self, conn: sqlite3.Connection, lote: List[tuple]):
+        """Grava o lote em uma transação e entrega o resultado de cada operação."""
+        resultados: List[Tuple[bool, Any]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, origem, enviado_em, _, _ in lote:
+                inicio = time.perf_counter()
+                metricas.observar("r6_sql_espera_segundos", inicio - enviado_em, tipo="escrita")
+                conn.execute("SAVEPOINT operacao")
+                try:
+                    resultados.append((True, func(conn, *args)))
+                    conn.execute("RELEASE operacao")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operacao")
+                    conn.execute("RELEASE operacao")
+                    resultados.append((False, e))
+                metricas.observar("r6_sql_segundos", time.perf_counter() - inicio, origem=origem, tipo="escrita")
+            inicio = time.perf_counter()
+            conn.commit()
+            metricas.observar("r6_sql_commit_segundos", time.perf_counter() - inicio)
+        except Exception as e:
+            # Falha no BEGIN/COMMIT (ou ao desfazer um savepoint): nada do lote foi gravado
+            logger.error(f"Erro ao gravar lote de {len(lote)} escrita(s): {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            resultados = [(False, e)] * len(lote)
+        metricas.incrementar("r6_sql_lotes_total")
+        metricas.incrementar("r6_sql_escritas_total", len(lote))
+        for (_, _, _, _, loop, futuro), (sucesso, valor) in zip(lote, resultados):
+            try:
+                loop.call_soon_threadsafe(self._entregar, futuro, sucesso, valor)
+            except RuntimeError:
+                pass  # Loop do chamador já foi fechado
+
+    @staticmethod
+    def _entregar(futuro: asyncio.Future, sucesso: bool, valor: Any):
+        if futuro.done():
+            return  # Chamador cancelou a espera; a escrita já foi aplicada mesmo assim
+        if sucesso:
+            futuro.set_result(valor)
+        else:
+            futuro.set_exception(valor)
+
+    @staticmethod
+    def _origem(func: Callable, origem: Optional[str]) -> str:
+        """Rótulo da consulta nas métricas: o informado ou o nome da função executada."""
+        return origem or getattr(func, "__name__", "desconhecida")
+
+    async def ler(self, func: Callable, *args, origem: Optional[str] = None) -> Any:
+        """Executa `func(conn, *args)` em uma thread de leitura."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._leitura, self._ler, func, args, self._origem(func, origem), time.perf_counter()
+        )
+
+    def enfileirar(self, func: Callable, *args, origem: Optional[str] = None) -> asyncio.Future:
+        """Enfileira `func(conn, *args)` para a thread de escrita sem aguardar.
+
+        A escrita é aplicada na ordem da chamada em relação às demais; o futuro
+        retornado é resolvido após o commit do lote.
+        """
+        if self._escritor is None:
+            self._escritor = threading.Thread(target=self._executar_escritor, name="db-escrita", daemon=True)
+            self._escritor.start()
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._fila_escrita.put((func, args, self._origem(func, origem), time.perf_counter(), loop, futuro))
+        return futuro
+
+    async def transacao(self, func: Callable, *args, origem: Optional[str] = None) -> Any:
+        """Enfileira `func(conn, *args)` para a thread de escrita e aguarda o commit do lote.
+
+        `func` não deve chamar `commit`/`rollback`: a transação é do lote inteiro.
+        """
+        return await self.enfileirar(func, *args, origem=origem)
+
+    # Os atalhos abaixo usam o nome da função chamadora como origem nas métricas
+
+    async def buscar_um(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        return await self.ler(lambda conn: conn.execute(sql, params).fetchone(), origem=sys._getframe(1).f_code.co_name)
+
+    async def buscar_todos(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return await self.ler(lambda conn: conn.execute(sql, params).fetchall(), origem=sys._getframe(1).f_code.co_name)
+
+    async def executar(self, sql: str, params: tuple = ()) -> int:
+        """Executa uma única escrita e retorna o `lastrowid`."""
+        return await self.transacao(lambda conn: conn.execute(sql, params).lastrowid, origem=sys._getframe(1).f_code.co_name)
+
+    async def executar_retornando(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        """Executa uma única escrita com `RETURNING` e retorna a primeira linha."""
+        return await self.transacao(lambda conn: conn.execute(sql, params).fetchone(), origem=sys._getframe(1).f_code.co_name)
+
+    def fechar(self):
+        """Grava as escritas pendentes, finaliza as threads e fecha todas as conexões abertas."""
+        if self._escritor is not None:
+            self._fila_escrita.put(None)
+            self._escritor.join()
+            self._escritor = None
+        self._leitura.shutdown(wait=True)
+        with self._trava_conexoes:
+            for conn in self._conexoes:
+                conn.close()
+            self._conexoes.clear()
+
+JANELA_FORMA = 20  # Partidas consideradas na forma recente e na tendência de ELO
+
+def _preencher_agregados(cursor: sqlite3.Cursor):
+    """Calcula os agregados a partir do histórico já gravado (apenas na primeira vez).
+
+    O ELO após cada partida antiga não foi gravado; ele é reconstruído a partir
+    do ELO atual descontando os ganhos e perdas fixos das partidas seguintes.
+    """
+    if cursor.execute("SELECT 1 FROM forma_recente LIMIT 1").fetchone():
+        return
+    if not cursor.execute("SELECT 1 FROM partida_jogadores LIMIT 1").fetchone():
+        return
+    
+    cursor.execute('''
+    INSERT OR IGNORE INTO estatisticas_mapa (jogador_id, mapa, partidas, vitorias, kills, deaths)
+    SELECT pj.jogador_id, COALESCE(p.mapa, 'DESCONHECIDO'), COUNT(*),
+           SUM(pj.resultado = 'VITÓRIA'), SUM(pj.kills), SUM(pj.deaths)
+    FROM partida_jogadores pj
+    JOIN partidas p ON p.id = pj.partida_id
+    GROUP BY pj.jogador_id, COALESCE(p.mapa, 'DESCONHECIDO')
+    ''')
+    
+    janelas: Dict[int, list] = {}
+    for linha in cursor.execute('''
+    SELECT jogador_id, venceu, kills, deaths, elo_apos, CASE venceu WHEN 1 THEN ? ELSE ? END FROM (
+        SELECT pj.jogador_id, pj.partida_id, pj.resultado = 'VITÓRIA' AS venceu, pj.kills, pj.deaths,
+               j.elo - COALESCE(SUM(CASE pj.resultado WHEN 'VITÓRIA' THEN ? ELSE ? END) OVER (
+                   PARTITION BY pj.jogador_id ORDER BY pj.partida_id DESC
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ), 0) AS elo_apos,
+               ROW_NUMBER() OVER (PARTITION BY pj.jogador_id ORDER BY pj.partida_id DESC) AS ordem
+        FROM partida_jogadores pj
+        JOIN jogadores j ON j.id = pj.jogador_id
+    )
+    WHERE ordem <= ?
+    ORDER BY jogador_id, partida_id
+    ''', (ELO_VITORIA, ELO_DERROTA, ELO_VITORIA, ELO_DERROTA, JANELA_FORMA)).fetchall():
+        janelas.setdefault(linha[0], []).append(list(linha[1:]))
+    
+    cursor.executemany(
+        "INSERT INTO forma_recente (jogador_id, janela) VALUES (?, ?)",
+        [(jogador_id, json.dumps(janela)) for jogador_id, janela in janelas.items()]
+    )
+    logger.info(f"Agregados de estatísticas calculados para {len(janelas)} jogador(es).")
+
 def init_db():
     """Inicializa as tabelas do banco de dados."""
     conn = get_db_connection()
@@ -104,7 +557,8 @@ def init_db():
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS jogadores (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        discord_id INTEGER UNIQUE,
+        guild_id INTEGER NOT NULL DEFAULT 0,
+        discord_id INTEGER,
         discord_name TEXT,
         r6_nickname TEXT,
         rank TEXT,
@@ -115,7 +569,8 @@ def init_db():
         kills INTEGER DEFAULT 0,
         deaths INTEGER DEFAULT 0,
         kd_ratio REAL DEFAULT 0.0,
-        data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (guild_id, discord_id)
     )
     ''')
     
@@ -123,10 +578,12 @@ def init_db():
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS partidas (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER NOT NULL DEFAULT 0,
         lobby_id TEXT,
         mapa TEXT,
         time_vencedor INTEGER,
-        data_partida TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        data_partida TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        captura_hash TEXT
     )
     ''')
     
@@ -145,205 +602,1965 @@ def init_db():
     )
     ''')
     
+    # Configurações persistentes do bot (chave/valor)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS configuracoes (
+        chave TEXT PRIMARY KEY,
+        valor TEXT
+    )
+    ''')
+    
+    # Temporizadores pendentes (prazo em timestamp Unix), recarregados ao reiniciar
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS temporizadores (
+        chave TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        prazo REAL NOT NULL,
+        dados TEXT NOT NULL
+    )
+    ''')
+    
+    # Agregados mantidos incrementalmente a cada partida finalizada
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS estatisticas_mapa (
+        jogador_id INTEGER NOT NULL,
+        mapa TEXT NOT NULL,
+        partidas INTEGER NOT NULL DEFAULT 0,
+        vitorias INTEGER NOT NULL DEFAULT 0,
+        kills INTEGER NOT NULL DEFAULT 0,
+        deaths INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (jogador_id, mapa)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Últimas JANELA_FORMA partidas de cada jogador: lista JSON de [venceu, kills, deaths, elo_apos, variacao]
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS forma_recente (
+        jogador_id INTEGER PRIMARY KEY,
+        janela TEXT NOT NULL
+    )
+    ''')
+    
+    # Prints de resultado arquivados localmente, endereçados pelo SHA-256 do arquivo original
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS capturas (
+        hash TEXT PRIMARY KEY,
+        arquivo TEXT NOT NULL,
+        tamanho_original INTEGER NOT NULL,
+        tamanho_arquivo INTEGER NOT NULL,
+        data_captura TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+    ''')
+    
+    # Estado dos lobbies em andamento: snapshot compacto (JSON) mais o diário de eventos posteriores
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lobbies (
+        guild_id INTEGER NOT NULL,
+        numero INTEGER NOT NULL,
+        versao INTEGER NOT NULL,
+        dados TEXT NOT NULL,
+        PRIMARY KEY (guild_id, numero)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lobby_eventos (
+        guild_id INTEGER NOT NULL,
+        numero INTEGER NOT NULL,
+        versao INTEGER NOT NULL,
+        evento TEXT NOT NULL,
+        dados TEXT NOT NULL,
+        PRIMARY KEY (guild_id, numero, versao)
+    ) WITHOUT ROWID
+    ''')
+    
+    _migrar_multiguild(cursor)
+    _migrar_capturas(cursor)
+    _preencher_agregados(cursor)
+    
+    # Índice de cobertura do histórico de cada jogador (paginação por keyset em partida_id)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_partida_jogadores_historico ON partida_jogadores (
+        jogador_id, partida_id DESC, time, kills, deaths, resultado
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_partida_jogadores_partida ON partida_jogadores (partida_id)")
+    
+    # Um mesmo print não pode registrar duas partidas na guilda
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_partidas_captura ON partidas (guild_id, captura_hash)
+    WHERE captura_hash IS NOT NULL
+    ''')
+    
+    # Índice de cobertura para o ranking de cada guilda (parcial: apenas jogadores elegíveis)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_jogadores_ranking_guild ON jogadores (
+        guild_id, elo DESC, kd_ratio DESC, discord_id, r6_nickname, rank, vitorias, partidas_jogadas
+    ) WHERE elo > 0 AND partidas_jogadas > 0
+    ''')
+    
     conn.commit()
     conn.close()
 
-def get_jogador_by_id(discord_id: int) -> Optional[sqlite3.Row]:
-    """Busca um jogador pelo ID do Discord."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jogadores WHERE discord_id = ?", (discord_id,))
-    jogador = cursor.fetchone()
-    conn.close()
+def _migrar_multiguild(cursor: sqlite3.Cursor):
+    """Migra bancos anteriores ao suporte a várias guildas (registros antigos ficam com guild_id 0)."""
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(jogadores)")}
+    if "guild_id" not in colunas:
+        logger.info("Migrando a tabela de jogadores para o formato multi-guilda...")
+        # A unicidade passa de discord_id para (guild_id, discord_id): é preciso recriar a tabela
+        cursor.execute('''
+        CREATE TABLE jogadores_novo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL DEFAULT 0,
+            discord_id INTEGER,
+            discord_name TEXT,
+            r6_nickname TEXT,
+            rank TEXT,
+            elo INTEGER DEFAULT 0,
+            partidas_jogadas INTEGER DEFAULT 0,
+            vitorias INTEGER DEFAULT 0,
+            derrotas INTEGER DEFAULT 0,
+            kills INTEGER DEFAULT 0,
+            deaths INTEGER DEFAULT 0,
+            kd_ratio REAL DEFAULT 0.0,
+            data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (guild_id, discord_id)
+        )
+        ''')
+        cursor.execute('''
+        INSERT INTO jogadores_novo (
+            id, guild_id, discord_id, discord_name, r6_nickname, rank, elo, partidas_jogadas,
+            vitorias, derrotas, kills, deaths, kd_ratio, data_registro
+        )
+        SELECT id, 0, discord_id, discord_name, r6_nickname, rank, elo, partidas_jogadas,
+            vitorias, derrotas, kills, deaths, kd_ratio, data_registro
+        FROM jogadores
+        ''')
+        cursor.execute("DROP TABLE jogadores")
+        cursor.execute("ALTER TABLE jogadores_novo RENAME TO jogadores")
+    
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(partidas)")}
+    if "guild_id" not in colunas:
+        cursor.execute("ALTER TABLE partidas ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0")
+    
+    cursor.execute("DROP INDEX IF EXISTS idx_jogadores_ranking")
+
+def _migrar_capturas(cursor: sqlite3.Cursor):
+    """Adiciona o vínculo entre partidas e prints em bancos criados antes do arquivo de capturas."""
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(partidas)")}
+    if "captura_hash" not in colunas:
+        cursor.execute("ALTER TABLE partidas ADD COLUMN captura_hash TEXT")
+
+async def get_jogador_by_id(guild_id: int, discord_id: int) -> Optional["Jogador"]:
+    """Busca um jogador da guilda pelo ID do Discord (consulta o cache antes do banco)."""
+    cache = estado_shard(shard_da_guild(guild_id)).cache_jogadores
+    chave = (guild_id, discord_id)
+    encontrado, jogador = cache.obter(chave)
+    if encontrado:
+        return jogador
+    versao = cache.versao
+    linha = await db.buscar_um("SELECT * FROM jogadores WHERE guild_id = ? AND discord_id = ?", chave)
+    jogador = Jogador(linha) if linha else None
+    cache.guardar_leitura(chave, jogador, versao)
     return jogador
 
-# Inicializar o banco de dados
-init_db()
+async def obter_configuracao(chave: str) -> Optional[str]:
+    linha = await db.buscar_um("SELECT valor FROM configuracoes WHERE chave = ?", (chave,))
+    return linha["valor"] if linha else None
 
-# --- Classes de Views e Modais ---
+async def salvar_configuracao(chave: str, valor: str):
+    await db.executar(
+        "INSERT INTO configuracoes (chave, valor) VALUES (?, ?) ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor",
+        (chave, valor)
+    )
 
-# View para seleção de rank
-class RankSelectView(View):
-    def __init__(self, user_id):
-        super().__init__(timeout=120)
-        self.user_id = user_id
-        self.rank = None
-    
-    @discord.ui.select(
-        placeholder="Selecione seu rank",
-        options=[
-            discord.SelectOption(label="Cobre", emoji="🥉", value="COBRE"),
-            discord.SelectOption(label="Bronze", emoji="🔶", value="BRONZE"),
-            discord.SelectOption(label="Prata", emoji="🔷", value="PRATA"),
-            discord.SelectOption(label="Ouro", emoji="🥇", value="OURO"),
-            discord.SelectOption(label="Platina", emoji="💠", value="PLATINA"),
-            discord.SelectOption(label="Esmeralda", emoji="💚", value="ESMERALDA"),
-            discord.SelectOption(label="Diamante", emoji="💎", value="DIAMANTE"),
-            discord.SelectOption(label="Champion", emoji="🏆", value="CHAMPION")
-        ]
+# O banco é criado/migrado por `init_db()` na inicialização (veja o fim do arquivo), não na importação:
+# os processos do OCR reimportam este arquivo ao iniciar
+db = BancoDados()
+
+# --- Cache de Jogadores ---
+
+class Jogador:
+    """Registro compacto de um jogador, usado no lugar de `sqlite3.Row` no cache."""
+    __slots__ = (
+        "id", "guild_id", "discord_id", "discord_name", "r6_nickname", "rank", "elo", "partidas_jogadas",
+        "vitorias", "derrotas", "kills", "deaths", "kd_ratio", "data_registro"
     )
-    async def select_rank(self, interaction: discord.Interaction, select: discord.ui.Select):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Este menu não é para você!", ephemeral=True)
+
+    def __init__(self, linha):
+        for campo in self.__slots__:
+            setattr(self, campo, linha[campo])
+
+    def __getitem__(self, campo: str):
+        return getattr(self, campo)
+
+class CacheJogadores:
+    """Cache LRU com TTL dos jogadores, indexado por `(guild_id, discord_id)`.
+
+    Também guarda ausências (jogador não registrado). As escritas no banco
+    atualizam o cache diretamente (write-through). Leituras que começaram antes
+    de uma escrita não são guardadas, para não sobrescrever o dado novo com um antigo.
+    """
+
+    def __init__(self, capacidade: int = 5000, ttl: float = 300.0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens: "OrderedDict[Tuple[int, int], Tuple[float, Optional[Jogador]]]" = OrderedDict()
+        self.versao = 0  # Incrementada a cada escrita
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: Tuple[int, int]) -> Tuple[bool, Optional[Jogador]]:
+        """Retorna `(encontrado, jogador)`; `jogador` pode ser None para ausências em cache."""
+        item = self._itens.get(chave)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._itens[chave]
+            self.falhas += 1
+            return False, None
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return True, item[1]
+
+    def _guardar(self, chave: Tuple[int, int], jogador: Optional[Jogador]):
+        self._itens[chave] = (time.monotonic() + self.ttl, jogador)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def guardar_leitura(self, chave: Tuple[int, int], jogador: Optional[Jogador], versao: int):
+        """Guarda o resultado de uma leitura, se nenhuma escrita ocorreu desde `versao`."""
+        if versao == self.versao:
+            self._guardar(chave, jogador)
+
+    def atualizar(self, jogadores: List[sqlite3.Row]):
+        """Write-through: grava no cache as linhas recém-escritas no banco."""
+        self.versao += 1
+        for linha in jogadores:
+            self._guardar((linha["guild_id"], linha["discord_id"]), Jogador(linha))
+
+    def invalidar(self, chave: Tuple[int, int]):
+        self.versao += 1
+        self._itens.pop(chave, None)
+
+    def limpar(self):
+        """Descarta tudo (usado após reescritas em massa, como o recálculo de ratings)."""
+        self.versao += 1
+        self._itens.clear()
+
+    @property
+    def taxa_acerto(self) -> float:
+        total = self.acertos + self.falhas
+        return self.acertos / total if total else 0.0
+
+# --- Ranking ---
+
+COLUNAS_RANKING = ("discord_id", "r6_nickname", "rank", "elo", "kd_ratio", "vitorias", "partidas_jogadas")
+
+def _linha_ranking(jogador) -> dict:
+    """Projeta uma linha de `jogadores` nas colunas exibidas no ranking."""
+    return {coluna: jogador[coluna] for coluna in COLUNAS_RANKING}
+
+def _chave_ranking(jogador) -> tuple:
+    """Chave de ordenação equivalente a `ORDER BY elo DESC, kd_ratio DESC, discord_id`.
+
+    No SQLite NULL é menor que qualquer número, então no `DESC` o K/D nulo vem por último.
+    """
+    kd = jogador["kd_ratio"]
+    return (-jogador["elo"], kd is None, -(kd or 0.0), jogador["discord_id"])
+
+class PlacarRanking:
+    """Top-N do ranking mantido em memória.
+
+    Há um placar por guilda. É carregado do índice `idx_jogadores_ranking_guild` com uma reserva além do top-N e
+    atualizado incrementalmente com as linhas dos jogadores alterados. Todo jogador
+    fora da reserva tem chave pior que `_limiar`, então a reserva só precisa ser
+    recarregada quando encolhe abaixo do top-N. O embed renderizado fica em cache
+    e só é refeito quando o top-N visível muda. Escritas aplicadas durante uma
+    carga mudam `versao` e fazem a carga ser refeita, como no cache de jogadores.
+    """
+
+    def __init__(self, guild_id: int, tamanho: int = 10, reserva: int = 40):
+        self.guild_id = guild_id
+        self.tamanho = tamanho
+        self.capacidade = tamanho + reserva
+        self._linhas: List[dict] = []
+        self._limiar: Optional[tuple] = None  # None: a reserva contém todos os elegíveis
+        self._carregado = False
+        self.versao = 0  # Incrementada a cada escrita aplicada (ou descartada, se não carregado)
+        self._embed: Optional[discord.Embed] = None
+        self._assinatura: Optional[tuple] = None
+        self._trava: Optional[asyncio.Lock] = None  # Criada dentro do loop do bot
+
+    async def _carregar(self, tentativas: int = 3):
+        """Carrega a reserva do banco; refaz a leitura se alguma escrita chegou enquanto ela rodava.
+
+        A leitura pode ter começado antes do commit de uma escrita cujo `aplicar`
+        foi descartado por ainda não estarmos carregados. Se as escritas não param,
+        fica com a última leitura sem marcar o placar como carregado: a próxima
+        consulta carrega de novo.
+        """
+        self._carregado = False  # As escritas que chegarem durante a leitura só mudam a versão
+        for _ in range(tentativas):
+            versao = self.versao
+            linhas = await db.buscar_todos(
+                f"""SELECT {", ".join(COLUNAS_RANKING)}
+                FROM jogadores WHERE guild_id = ? AND elo > 0 AND partidas_jogadas > 0
+                ORDER BY elo DESC, kd_ratio DESC, discord_id LIMIT ?""",
+                (self.guild_id, self.capacidade)
+            )
+            self._linhas = [_linha_ranking(linha) for linha in linhas]
+            self._limiar = _chave_ranking(self._linhas[-1]) if len(self._linhas) == self.capacidade else None
+            if versao == self.versao:
+                self._carregado = True
+                return
+
+    def invalidar(self):
+        """Força a recarga da reserva na próxima consulta."""
+        self.versao += 1
+        self._carregado = False
+
+    def _valido(self) -> bool:
+        return self._carregado and (self._limiar is None or len(self._linhas) >= self.tamanho)
+
+    def aplicar(self, jogadores: List[sqlite3.Row]):
+        """Atualiza a reserva com as linhas recém-gravadas de jogadores alterados."""
+        self.versao += 1
+        if not self._carregado:
             return
-        
-        self.rank = select.values[0]
-        
-        # Salvar rank no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE jogadores SET rank = ?, elo = ? WHERE discord_id = ?",
-            (self.rank, RANKS[self.rank]["valor"], self.user_id)
-        )
-        
-        conn.commit()
-        conn.close()
-        
-        await interaction.response.send_message(
-            f"Rank {RANKS[self.rank]['emoji']} **{self.rank}** selecionado com sucesso! ✅",
-            ephemeral=True
-        )
-        
-        # Enviar mensagem de boas-vindas ao competitivo
+        alterados = {jogador["discord_id"]: jogador for jogador in jogadores}
+        linhas = [linha for linha in self._linhas if linha["discord_id"] not in alterados]
+        for jogador in alterados.values():
+            elegivel = jogador["elo"] > 0 and jogador["partidas_jogadas"] > 0
+            if elegivel and (self._limiar is None or _chave_ranking(jogador) <= self._limiar):
+                linhas.append(_linha_ranking(jogador))
+        linhas.sort(key=_chave_ranking)
+        if len(linhas) > self.capacidade:
+            linhas = linhas[:self.capacidade]
+            self._limiar = _chave_ranking(linhas[-1])
+        self._linhas = linhas
+
+    def _renderizar(self, top_jogadores: List[dict]) -> discord.Embed:
         embed = discord.Embed(
-            title="🎮 Bem-vindo ao Competitivo de Rainbow Six Siege! 🎮",
-            description="Agora você faz parte da nossa comunidade competitiva!",
+            title=f"🏆 Ranking dos Jogadores (Top {self.tamanho} ELO)",
             color=discord.Color.gold()
         )
         
-        embed.add_field(
-            name="📋 Regras do Lobby",
-            value=(
-                "1. Respeite todos os jogadores\n"
-                "2. Não utilize hacks ou cheats\n"
-                "3. Mantenha a comunicação clara e objetiva\n"
-                "4. Aceite o resultado das partidas com esportividade\n"
-                "5. Reporte problemas para os administradores"
-            ),
-            inline=False
-        )
-        
-        embed.add_field(
-            name="⚙️ Sistema de Rank (ELO)",
-            value=(
-                "Seu progresso será acompanhado através do nosso sistema de ELO:\n"
-                "• Vitórias: **+25 ELO**\n"
-                "• Derrotas: **-10 ELO**\n"
-                "• MVP da partida: **+5 ELO bônus** (A ser implementado)"
-            ),
-            inline=False
-        )
-        
-        embed.set_footer(text="Divirta-se e boa sorte!")
-        
-        await interaction.followup.send(embed=embed, ephemeral=True)
-        self.stop()
+        if not top_jogadores:
+            embed.description = "Nenhum jogador no ranking ainda. Jogue uma partida!"
+        else:
+            for i, jogador in enumerate(top_jogadores):
+                rank_emoji = RANKS.get(jogador["rank"], {}).get("emoji", "")
+                win_rate = (jogador['vitorias']/jogador['partidas_jogadas']*100) if jogador['partidas_jogadas'] > 0 else 0
+                
+                embed.add_field(
+                    name=f"#{i+1}. {jogador['r6_nickname']} {rank_emoji}",
+                    value=f"**ELO:** {jogador['elo']} | **K/D:** {jogador['kd_ratio'] or 0:.2f} | **W/R:** {win_rate:.1f}%",
+                    inline=False
+                )
+        return embed
 
-# Modal para inserir nick do R6
-class NickModal(discord.ui.Modal, title="Registro de Nick do R6"):
-    def __init__(self):
-        super().__init__()
-        self.nickname = None
-    
-    nick = discord.ui.TextInput(
-        label="Seu nick no Rainbow Six Siege",
-        placeholder="Ex: R6_ProPlayer123",
-        min_length=3,
-        max_length=20
-    )
-    
-    async def on_submit(self, interaction: discord.Interaction):
-        self.nickname = self.nick.value
-        await interaction.response.send_message(
-            f"Nick **{self.nickname}** recebido! Prossiga para a seleção de Rank.",
-            ephemeral=True
-        )
-        self.stop()
+    async def embed(self) -> discord.Embed:
+        """Retorna o embed do top-N, reaproveitando o cache se nada visível mudou."""
+        if self._trava is None:
+            self._trava = asyncio.Lock()
+        async with self._trava:
+            if not self._valido():
+                await self._carregar()
+            top_jogadores = self._linhas[:self.tamanho]
+            assinatura = tuple(tuple(jogador.values()) for jogador in top_jogadores)
+            if self._embed is None or assinatura != self._assinatura:
+                self._embed = self._renderizar(top_jogadores)
+                self._assinatura = assinatura
+            return self._embed
 
-# View para registro inicial
-class RegistroView(View):
-    def __init__(self, user_id):
-        super().__init__(timeout=300)
-        self.user_id = user_id
-    
-    @discord.ui.button(label="Competitivo R6", style=discord.ButtonStyle.primary, emoji="🎮")
-    async def registro_competitivo(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("Este menu não é para você!", ephemeral=True)
-            return
-        
-        # Verificar se já está registrado
-        jogador = get_jogador_by_id(self.user_id)
-        
-        if jogador and jogador["r6_nickname"]:
-            await interaction.response.send_message(
-                "Você já está registrado no sistema competitivo!",
-                ephemeral=True
-            )
-            return
-        
-        # Modal para inserir nick do R6
-        modal = NickModal()
-        await interaction.response.send_modal(modal)
-        
-        # Aguarda o modal ser preenchido
-        await modal.wait()
-        
-        if modal.nickname:
-            r6_nickname = modal.nickname
-            
-            # Salvar no banco de dados
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            if jogador:
-                cursor.execute(
-                    "UPDATE jogadores SET r6_nickname = ? WHERE discord_id = ?",
-                    (r6_nickname, self.user_id)
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO jogadores (discord_id, discord_name, r6_nickname) VALUES (?, ?, ?)",
-                    (self.user_id, interaction.user.name, r6_nickname)
-                )
-            
-            conn.commit()
-            conn.close()
-            
-            # Pedir para selecionar o rank
-            view = RankSelectView(self.user_id)
-            await interaction.followup.send(
-                f"Nick **{r6_nickname}** registrado! Agora selecione seu rank:",
-                view=view,
-                ephemeral=True
-            )
-            
-            self.stop()
 
-# Placeholder para o sistema de Ban/Pick de Mapas
-class BanMapaButton(Button):
-    def __init__(self, mapa: str):
-        super().__init__(label=mapa, style=discord.ButtonStyle.secondary)
-        self.mapa = mapa
+# --- Distribuição de ELO ---
 
-    async def callback(self, interaction: discord.Interaction):
-        # Implementação da lógica de banimento (Capitão 1 / Capitão 2)
-        await interaction.response.send_message(f"Mapa **{self.mapa}** banido (lógica a ser implementada).", ephemeral=True)
+ELO_DISTRIBUICAO_MIN = -2000   # ELOs fora da faixa contam no balde da ponta
+ELO_DISTRIBUICAO_MAX = 12000
 
-class BanMapaView(View):
-    def __init__(self, mapas_disponiveis: List[str]):
-        super().__init__(timeout=120)
-        for mapa in mapas_disponiveis:
-            self.add_item(BanMapaButton(mapa))
+class DistribuicaoElo:
+    """Estatística de ordem sobre o ELO dos jogadores ranqueados de uma guilda.
 
-# --- Eventos do Bot ---
+    Uma árvore de Fenwick com um balde por ponto de ELO conta quantos jogadores
+    há em cada faixa, e cada balde guarda os IDs dos seus jogadores. Posição,
+    percentil, vizinhos e histograma saem em O(log n) por consulta, e cada
+    mudança de ELO custa duas atualizações na árvore. Ranqueado = já escolheu
+    o rank (`rank` não nulo).
 
-# Evento quando um membro entra no servidor
-@bot.event
-async def on_member_join(member):
-    if canal_boas_vindas:
+    A árvore é um `array` de inteiros de 32 bits (~56 KB) e só é montada na
+    primeira consulta da guilda (veja `distribuicao_elo`). Antes disso as
+    escritas são ignoradas, pois a carga já lê o ELO atual do banco; durante
+    a carga elas são aplicadas e prevalecem sobre o que a leitura trouxer.
+    """
+    __slots__ = ("guild_id", "_arvore", "_elos", "_baldes", "carregado", "carregando")
+
+    TAMANHO = ELO_DISTRIBUICAO_MAX - ELO_DISTRIBUICAO_MIN + 1
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self._arvore = array("i")  # Alocada no primeiro jogador: guildas sem ranqueados não ocupam memória
+        self._elos: Dict[int, int] = {}  # discord_id -> ELO
+        self._baldes: Dict[int, set] = {}  # índice do balde -> discord_ids
+        self.carregado = False
+        self.carregando = False
+
+    def __len__(self) -> int:
+        return len(self._elos)
+
+    @staticmethod
+    def _indice(elo: int) -> int:
+        return min(max(elo, ELO_DISTRIBUICAO_MIN), ELO_DISTRIBUICAO_MAX) - ELO_DISTRIBUICAO_MIN + 1
+
+    def _somar(self, indice: int, delta: int):
+        arvore = self._arvore
+        while indice <= self.TAMANHO:
+            arvore[indice] += delta
+            indice += indice & -indice
+
+    def _prefixo(self, indice: int) -> int:
+        """Jogadores nos baldes 1..indice."""
+        arvore = self._arvore
+        if not arvore:
+            return 0
+        total = 0
+        while indice > 0:
+            total += arvore[indice]
+            indice -= indice & -indice
+        return total
+
+    def _kesimo(self, k: int) -> int:
+        """Balde do k-ésimo menor ELO (1 <= k <= len)."""
+        indice = 0
+        passo = 1 << self.TAMANHO.bit_length()
+        while passo:
+            proximo = indice + passo
+            if proximo <= self.TAMANHO and self._arvore[proximo] < k:
+                indice = proximo
+                k -= self._arvore[proximo]
+            passo >>= 1
+        return indice + 1
+
+    def _remover(self, discord_id: int):
+        elo = self._elos.pop(discord_id, None)
+        if elo is not None:
+            indice = self._indice(elo)
+            self._somar(indice, -1)
+            self._baldes[indice].discard(discord_id)
+
+    def _inserir(self, discord_id: int, elo: int):
+        if not self._arvore:
+            self._arvore = array("i", bytes(4 * (self.TAMANHO + 1)))
+        indice = self._indice(elo)
+        self._elos[discord_id] = elo
+        self._somar(indice, 1)
+        self._baldes.setdefault(indice, set()).add(discord_id)
+
+    def carregar(self, linhas):
+        """Carga em massa de `(discord_id, elo)`; quem já foi atualizado enquanto isso prevalece."""
+        for discord_id, elo in linhas:
+            if discord_id not in self._elos:
+                self._inserir(discord_id, elo)
+        self.carregado = True
+        self.carregando = False
+
+    def aplicar(self, jogadores: List[sqlite3.Row]):
+        """Atualiza a distribuição com as linhas recém-gravadas de jogadores alterados."""
+        if not (self.carregado or self.carregando):
+            return
+        for jogador in jogadores:
+            discord_id = jogador["discord_id"]
+            if self._elos.get(discord_id) == jogador["elo"] and jogador["rank"] is not None:
+                continue
+            self._remover(discord_id)
+            if jogador["rank"] is not None:
+                self._inserir(discord_id, jogador["elo"])
+
+    def invalidar(self):
+        """Descarta tudo; a próxima consulta recarrega do banco (ex.: após recalcular os ratings)."""
+        self._arvore = array("i")
+        self._elos.clear()
+        self._baldes.clear()
+        self.carregado = False
+
+    def elo(self, discord_id: int) -> Optional[int]:
+        return self._elos.get(discord_id)
+
+    def _posicao_de(self, indice: int, elo: int) -> int:
+        """Posição de quem tem `elo` no balde `indice` (empates dividem a posição)."""
+        posicao = len(self._elos) - self._prefixo(indice) + 1
+        if indice == 1 or indice == self.TAMANHO:
+            # Baldes das pontas acumulam ELOs diferentes: desempata contando os maiores do balde
+            posicao += sum(1 for i in self._baldes[indice] if self._elos[i] > elo)
+        return posicao
+
+    def posicao(self, discord_id: int) -> Optional[int]:
+        """Posição no ranking por ELO (empates dividem a posição), ou None se não ranqueado."""
+        elo = self._elos.get(discord_id)
+        return None if elo is None else self._posicao_de(self._indice(elo), elo)
+
+    def percentil(self, discord_id: int) -> Optional[float]:
+        """Fatia do topo em que o jogador está (1.0 = top 1%)."""
+        posicao = self.posicao(discord_id)
+        return None if posicao is None else posicao / len(self._elos) * 100
+
+    def _membros(self, indice: int, quantidade: int, ignorar: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        ids = heapq.nsmallest(quantidade, (i for i in self._baldes[indice] if i != ignorar))
+        return sorted(
+            ((self._posicao_de(indice, self._elos[i]), i, self._elos[i]) for i in ids),
+            key=lambda item: (item[0], item[1])
+        )
+
+    def vizinhos(self, discord_id: int, quantidade: int = 2) -> List[Tuple[int, int, int]]:
+        """Até `quantidade` jogadores logo acima, os empatados e até `quantidade` logo abaixo.
+
+        Retorna `(posicao, discord_id, elo)` em ordem de posição, incluindo o próprio jogador.
+        """
+        elo = self._elos.get(discord_id)
+        if elo is None:
+            return []
+        indice = self._indice(elo)
+        
+        acima: List[Tuple[int, int, int]] = []
+        k = self._prefixo(indice) + 1
+        while len(acima) < quantidade and k <= len(self._elos):
+            balde = self._kesimo(k)
+            acima = self._membros(balde, quantidade - len(acima)) + acima
+            k += len(self._baldes[balde])
+        
+        abaixo: List[Tuple[int, int, int]] = []
+        k = self._prefixo(indice - 1)
+        while len(abaixo) < quantidade and k >= 1:
+            balde = self._kesimo(k)
+            abaixo += self._membros(balde, quantidade - len(abaixo))
+            k -= len(self._baldes[balde])
+        
+        empatados = self._membros(indice, quantidade, ignorar=discord_id)
+        proprio = (self._posicao_de(indice, elo), discord_id, elo)
+        return acima[-quantidade:] + sorted(empatados + [proprio], key=lambda item: (item[0], item[1])) + abaixo
+
+    def histograma(self, largura: int) -> List[Tuple[int, int]]:
+        """Contagem por faixa de `largura` pontos, do menor ao maior ELO: `(inicio_da_faixa, jogadores)`."""
+        if not self._elos:
+            return []
+        menor = self._kesimo(1) + ELO_DISTRIBUICAO_MIN - 1
+        maior = self._kesimo(len(self._elos)) + ELO_DISTRIBUICAO_MIN - 1
+        faixas = []
+        inicio = menor // largura * largura
+        anterior = 0
+        while inicio <= maior:
+            acumulado = self._prefixo(self._indice(inicio + largura - 1))
+            faixas.append((inicio, acumulado - anterior))
+            anterior = acumulado
+            inicio += largura
+        return faixas
+
+async def distribuicao_elo(guild_id: int) -> DistribuicaoElo:
+    """Distribuição da guilda, carregada do banco na primeira consulta."""
+    distribuicao = estado_guild(guild_id).distribuicao_elo
+    if not distribuicao.carregado:
+        distribuicao.carregando = True
+        try:
+            linhas = await db.buscar_todos(
+                "SELECT discord_id, elo FROM jogadores WHERE guild_id = ? AND rank IS NOT NULL", (guild_id,)
+            )
+        except BaseException:
+            distribuicao.carregando = False
+            raise
+        distribuicao.carregar([tuple(linha) for linha in linhas])
+    return distribuicao
+
+
+# --- Índice de Nicks ---
+
+AUTOCOMPLETAR_LIMITE = 25  # Máximo de opções que o Discord aceita no autocomplete
+
+def normalizar_nick(texto: str) -> str:
+    """Forma usada nas buscas: sem acentos e sem diferença entre maiúsculas e minúsculas."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+class IndiceNicks:
+    """Índice de prefixos dos jogadores registrados de uma guilda.
+
+    Os nicks do R6 e os nomes no Discord, normalizados, ficam em uma lista
+    ordenada de `(termo, discord_id)`. A busca por prefixo é um `bisect` seguido
+    de uma varredura curta, sem tocar no banco, então responde a cada tecla do
+    autocomplete. É carregado na inicialização e atualizado a cada registro.
+    """
+    __slots__ = ("_termos", "_jogadores", "carregado")
+
+    def __init__(self):
+        self._termos: List[Tuple[str, int]] = []
+        self._jogadores: Dict[int, Tuple[str, Optional[str], Tuple[str, ...]]] = {}  # discord_id -> (nick, nome, termos)
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._jogadores)
+
+    @staticmethod
+    def _termos_de(r6_nickname: str, discord_name: Optional[str]) -> Tuple[str, ...]:
+        return tuple({normalizar_nick(texto) for texto in (r6_nickname, discord_name) if texto})
+
+    def carregar(self, linhas):
+        """Carga em massa de `(discord_id, r6_nickname, discord_name)`.
+
+        Registros atualizados enquanto a consulta rodava já estão no índice e
+        prevalecem sobre a linha lida.
+        """
+        for discord_id, r6_nickname, discord_name in linhas:
+            if discord_id in self._jogadores:
+                continue
+            termos = self._termos_de(r6_nickname, discord_name)
+            self._jogadores[discord_id] = (r6_nickname, discord_name, termos)
+            self._termos.extend((termo, discord_id) for termo in termos)
+        self._termos.sort()
+        self.carregado = True
+
+    def atualizar(self, discord_id: int, r6_nickname: str, discord_name: Optional[str]):
+        """Troca os termos de um jogador (registro novo ou nick alterado)."""
+        anterior = self._jogadores.get(discord_id)
+        if anterior:
+            for termo in anterior[2]:
+                posicao = bisect.bisect_left(self._termos, (termo, discord_id))
+                if posicao < len(self._termos) and self._termos[posicao] == (termo, discord_id):
+                    del self._termos[posicao]
+        termos = self._termos_de(r6_nickname, discord_name)
+        self._jogadores[discord_id] = (r6_nickname, discord_name, termos)
+        for termo in termos:
+            bisect.insort(self._termos, (termo, discord_id))
+
+    def buscar(self, prefixo: str, limite: int = AUTOCOMPLETAR_LIMITE) -> List[Tuple[int, str, Optional[str]]]:
+        """Jogadores cujo nick ou nome começa com `prefixo`: `(discord_id, nick, nome)` em ordem alfabética."""
+        prefixo = normalizar_nick(prefixo.strip())
+        encontrados: Dict[int, None] = {}  # dict preserva a ordem e descarta repetidos
+        posicao = bisect.bisect_left(self._termos, (prefixo,))
+        while posicao < len(self._termos) and len(encontrados) < limite:
+            termo, discord_id = self._termos[posicao]
+            if not termo.startswith(prefixo):
+                break
+            encontrados[discord_id] = None
+            posicao += 1
+        return [(discord_id, *self._jogadores[discord_id][:2]) for discord_id in encontrados]
+
+    def resolver(self, valor: str) -> Optional[int]:
+        """Discord ID para o valor recebido: a opção escolhida, um nick exato ou o primeiro prefixo."""
+        if valor.isdigit() and int(valor) in self._jogadores:
+            return int(valor)
+        alvo = normalizar_nick(valor.strip())
+        posicao = bisect.bisect_left(self._termos, (alvo,))
+        if posicao < len(self._termos) and self._termos[posicao][0].startswith(alvo):
+            return self._termos[posicao][1]
+        return None
+
+async def carregar_indices_nicks():
+    """Carrega o índice de nicks de todas as guildas em uma única consulta."""
+    por_guild: Dict[int, list] = {guild.id: [] for guild in bot.guilds}
+    for linha in await db.buscar_todos(
+        "SELECT guild_id, discord_id, r6_nickname, discord_name FROM jogadores WHERE r6_nickname IS NOT NULL"
+    ):
+        if linha["guild_id"] in por_guild:
+            por_guild[linha["guild_id"]].append((linha["discord_id"], linha["r6_nickname"], linha["discord_name"]))
+    for guild_id, linhas in por_guild.items():
+        estado_guild(guild_id).indice_nicks.carregar(linhas)
+    logger.info(f"Índice de nicks carregado para {len(por_guild)} guilda(s).")
+
+async def indice_nicks(guild_id: int) -> IndiceNicks:
+    """Índice da guilda, carregado do banco se ainda não estiver em memória (ex.: guilda nova)."""
+    indice = estado_guild(guild_id).indice_nicks
+    if not indice.carregado:
+        linhas = await db.buscar_todos(
+            "SELECT discord_id, r6_nickname, discord_name FROM jogadores WHERE guild_id = ? AND r6_nickname IS NOT NULL",
+            (guild_id,)
+        )
+        indice.carregar([tuple(linha) for linha in linhas])
+    return indice
+
+
+# --- Lobbies ---
+
+# Estados de um lobby
+LOBBY_AGUARDANDO = "AGUARDANDO"
+LOBBY_VETO = "VETO"
+LOBBY_EM_ANDAMENTO = "EM_ANDAMENTO"
+LOBBY_FINALIZANDO = "FINALIZANDO"
+
+# Transições permitidas da máquina de estados
+TRANSICOES_LOBBY = {
+    LOBBY_AGUARDANDO: {LOBBY_VETO, LOBBY_EM_ANDAMENTO},
+    LOBBY_VETO: {LOBBY_EM_ANDAMENTO, LOBBY_AGUARDANDO},
+    LOBBY_EM_ANDAMENTO: {LOBBY_FINALIZANDO},
+    LOBBY_FINALIZANDO: {LOBBY_EM_ANDAMENTO, LOBBY_AGUARDANDO}
+}
+
+LOBBY_EVENTOS_POR_SNAPSHOT = 8  # Eventos no diário de um lobby antes de gravar um novo snapshot
+
+class MembroAusente:
+    """Jogador de um lobby restaurado que não está no cache de membros: só ID e menção."""
+    __slots__ = ("id", "mention")
+
+    def __init__(self, discord_id: int):
+        self.id = discord_id
+        self.mention = f"<@{discord_id}>"
+
+class Lobby:
+    """Estado de um lobby. Toda alteração deve ser feita com `trava` adquirida."""
+    __slots__ = (
+        "id", "numero", "estado", "trava", "jogadores", "sala_partida",
+        "capitao1", "capitao2", "mapas_banidos", "mapa_escolhido",
+        "ban_view", "ban_message", "edicao_ban", "versao", "eventos"
+    )
+
+    def __init__(self, numero: int):
+        self.trava = asyncio.Lock()
+        self.resetar(numero)
+
+    def resetar(self, numero: int):
+        """Limpa o lobby para reutilização com um novo número."""
+        self.numero = numero
+        self.id = f"lobby_{numero}"
+        self.estado = LOBBY_AGUARDANDO
+        self.jogadores: List[discord.Member] = []
+        self.sala_partida = None
+        self.capitao1 = None
+        self.capitao2 = None
+        self.mapas_banidos: List[str] = []
+        self.mapa_escolhido = None
+        self.ban_view = None
+        self.ban_message = None
+        self.edicao_ban = None
+        self.versao = 0   # Versão persistida (0: o lobby ainda não foi gravado)
+        self.eventos = 0  # Eventos gravados desde o último snapshot
+
+    @property
+    def cheio(self) -> bool:
+        return len(self.jogadores) >= MAX_JOGADORES
+
+    @property
+    def em_andamento(self) -> bool:
+        return self.estado == LOBBY_EM_ANDAMENTO
+
+    def transicionar(self, novo_estado: str):
+        if novo_estado not in TRANSICOES_LOBBY[self.estado]:
+            raise ValueError(f"Transição inválida no {self.id}: {self.estado} -> {novo_estado}")
+        self.estado = novo_estado
+
+    def instantaneo(self) -> dict:
+        """Estado persistível do lobby, com IDs no lugar dos objetos do Discord.
+
+        Uma finalização interrompida, ou um veto já decidido cuja partida não
+        chegou a começar, volta como partida em andamento.
+        """
+        em_andamento = self.estado == LOBBY_FINALIZANDO or (self.estado == LOBBY_VETO and self.mapa_escolhido)
+        return {
+            "e": LOBBY_EM_ANDAMENTO if em_andamento else self.estado,
+            "j": [jogador.id for jogador in self.jogadores],
+            "c": [capitao.id if capitao else None for capitao in (self.capitao1, self.capitao2)],
+            "b": list(self.mapas_banidos),
+            "m": self.mapa_escolhido,
+            "s": self.sala_partida.id if self.sala_partida else None,
+            "v": [self.ban_message.channel.id, self.ban_message.id] if self.ban_message else None,
+        }
+
+def aplicar_evento_lobby(dados: dict, evento: str, valor: Any):
+    """Aplica um evento do diário sobre o estado persistido de um lobby."""
+    if evento == "veto":
+        dados["e"], dados["v"] = LOBBY_VETO, valor
+    elif evento == "ban":
+        dados["b"].append(valor)
+        restantes = [mapa for mapa in mapas if mapa not in dados["b"]]
+        if len(restantes) == 1:
+            # O último banimento fecha o veto mesmo que o evento de início não tenha sido gravado
+            dados["e"], dados["m"] = LOBBY_EM_ANDAMENTO, restantes[0]
+    elif evento == "inicio":
+        dados["e"], dados["s"] = LOBBY_EM_ANDAMENTO, valor
+
+def _gravar_snapshot_lobby(conn: sqlite3.Connection, guild_id: int, numero: int, versao: int, dados: str):
+    conn.execute(
+        "INSERT INTO lobbies (guild_id, numero, versao, dados) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, numero) DO UPDATE SET versao = excluded.versao, dados = excluded.dados",
+        (guild_id, numero, versao, dados)
+    )
+    conn.execute("DELETE FROM lobby_eventos WHERE guild_id = ? AND numero = ? AND versao <= ?", (guild_id, numero, versao))
+
+def _gravar_evento_lobby(conn: sqlite3.Connection, guild_id: int, numero: int, versao: int, evento: str, dados: str):
+    conn.execute(
+        "INSERT INTO lobby_eventos (guild_id, numero, versao, evento, dados) VALUES (?, ?, ?, ?, ?)",
+        (guild_id, numero, versao, evento, dados)
+    )
+
+def _apagar_lobby(conn: sqlite3.Connection, guild_id: int, numero: int):
+    conn.execute("DELETE FROM lobbies WHERE guild_id = ? AND numero = ?", (guild_id, numero))
+    conn.execute("DELETE FROM lobby_eventos WHERE guild_id = ? AND numero = ?", (guild_id, numero))
+
+def _falha_gravacao_lobby(futuro: asyncio.Future):
+    if not futuro.cancelled() and futuro.exception() is not None:
+        logger.error(f"Erro ao gravar o estado de um lobby: {futuro.exception()}")
+
+class GerenciadorLobbies:
+    """Cria, localiza, persiste e recicla lobbies sob demanda.
+
+    Mantém índices para busca em O(1) por ID, por jogador e do próximo lobby
+    com vagas. Lobbies encerrados voltam para um pool e seus números são
+    reaproveitados (sempre o menor número livre).
+
+    A partir do início da partida, cada lobby é gravado como um snapshot
+    compacto seguido de um diário de eventos (veto aberto, mapa banido,
+    partida iniciada); a cada `LOBBY_EVENTOS_POR_SNAPSHOT` eventos o snapshot
+    é regravado e o diário, truncado. As gravações entram na fila de escrita
+    do banco sem aguardar, na ordem das alterações. Ao reiniciar, os lobbies
+    gravados ficam hibernados e só viram objetos (membros e canais resolvidos
+    pelo cache do Discord, sem chamadas à API) quando são usados.
+    """
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self._lobbies: Dict[str, Lobby] = {}
+        self._por_jogador: Dict[int, Lobby] = {}
+        self._abertos: Dict[str, Lobby] = {}  # Lobbies aguardando com vagas, em ordem de criação
+        self._pool: List[Lobby] = []
+        self._numeros_livres: List[int] = []
+        self._proximo_numero = 1
+        self._hibernados: Dict[str, Tuple[int, int, dict]] = {}  # ID -> (número, versão, estado persistido)
+        self._hibernados_por_jogador: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._lobbies) + len(self._hibernados)
+
+    def __iter__(self):
+        for lobby_id in list(self._hibernados):
+            self._despertar(lobby_id)
+        return iter(list(self._lobbies.values()))
+
+    def obter(self, lobby_id: str) -> Optional[Lobby]:
+        lobby = self._lobbies.get(lobby_id)
+        if lobby is None and lobby_id in self._hibernados:
+            lobby = self._despertar(lobby_id)
+        return lobby
+
+    def lobby_do_jogador(self, discord_id: int) -> Optional[Lobby]:
+        lobby = self._por_jogador.get(discord_id)
+        if lobby is None and discord_id in self._hibernados_por_jogador:
+            lobby = self._despertar(self._hibernados_por_jogador[discord_id])
+        return lobby
+
+    def _reservar_numero(self, numero: int):
+        if numero >= self._proximo_numero:
+            for livre in range(self._proximo_numero, numero):
+                heapq.heappush(self._numeros_livres, livre)
+            self._proximo_numero = numero + 1
+        else:
+            self._numeros_livres.remove(numero)
+            heapq.heapify(self._numeros_livres)
+
+    def hibernar(self, numero: int, versao: int, dados: dict):
+        """Registra um lobby restaurado do banco, sem criar o objeto ainda."""
+        lobby_id = f"lobby_{numero}"
+        if lobby_id in self._lobbies or lobby_id in self._hibernados:
+            logger.warning(f"{lobby_id} da guilda {self.guild_id} já está em uso; estado gravado descartado.")
+            return
+        self._reservar_numero(numero)
+        self._hibernados[lobby_id] = (numero, versao, dados)
+        for discord_id in dados["j"]:
+            self._hibernados_por_jogador[discord_id] = lobby_id
+
+    def _despertar(self, lobby_id: str) -> Lobby:
+        """Reconstrói um lobby hibernado a partir do cache de membros e canais do bot."""
+        numero, versao, dados = self._hibernados.pop(lobby_id)
+        for discord_id in dados["j"]:
+            self._hibernados_por_jogador.pop(discord_id, None)
+        guild = bot.get_guild(self.guild_id)
+        
+        lobby = self._pool.pop() if self._pool else Lobby(numero)
+        lobby.resetar(numero)
+        lobby.estado = dados["e"]
+        lobby.jogadores = [(guild and guild.get_member(discord_id)) or MembroAusente(discord_id) for discord_id in dados["j"]]
+        por_id = {jogador.id: jogador for jogador in lobby.jogadores}
+        lobby.capitao1, lobby.capitao2 = (por_id.get(capitao) for capitao in dados["c"])
+        lobby.mapas_banidos = list(dados["b"])
+        lobby.mapa_escolhido = dados["m"]
+        if dados["s"]:
+            lobby.sala_partida = bot.get_channel(dados["s"])
+        if dados["v"]:
+            canal = bot.get_channel(dados["v"][0])
+            if canal is not None and hasattr(canal, "get_partial_message"):
+                lobby.ban_message = canal.get_partial_message(dados["v"][1])
+                lobby.edicao_ban = EdicaoAdiada(lobby.ban_message)
+        lobby.versao = versao
+        
+        self._lobbies[lobby.id] = lobby
+        for jogador in lobby.jogadores:
+            self._por_jogador[jogador.id] = lobby
+        metricas.incrementar("r6_lobbies_restaurados_total")
+        return lobby
+
+    def _gravar(self, func: Callable, *args):
+        db.enfileirar(func, *args).add_done_callback(_falha_gravacao_lobby)
+
+    def registrar(self, lobby: Lobby, evento: str, valor: Any = None):
+        """Grava uma alteração do lobby (já aplicada ao objeto) no diário.
+
+        A primeira gravação de um lobby e cada `LOBBY_EVENTOS_POR_SNAPSHOT`-ésima
+        viram um snapshot completo.
+        """
+        lobby.versao += 1
+        if lobby.versao == 1 or lobby.eventos + 1 >= LOBBY_EVENTOS_POR_SNAPSHOT:
+            lobby.eventos = 0
+            dados = json.dumps(lobby.instantaneo(), separators=(",", ":"))
+            self._gravar(_gravar_snapshot_lobby, self.guild_id, lobby.numero, lobby.versao, dados)
+        else:
+            lobby.eventos += 1
+            dados = json.dumps(valor, separators=(",", ":"))
+            self._gravar(_gravar_evento_lobby, self.guild_id, lobby.numero, lobby.versao, evento, dados)
+
+    def criar(self) -> Lobby:
+        if self._numeros_livres:
+            numero = heapq.heappop(self._numeros_livres)
+        else:
+            numero = self._proximo_numero
+            self._proximo_numero += 1
+        if self._pool:
+            lobby = self._pool.pop()
+            lobby.resetar(numero)
+        else:
+            lobby = Lobby(numero)
+        self._lobbies[lobby.id] = lobby
+        self._abertos[lobby.id] = lobby
+        return lobby
+
+    def adicionar_jogador(self, lobby: Lobby, membro: discord.Member):
+        lobby.jogadores.append(membro)
+        self._por_jogador[membro.id] = lobby
+        if lobby.cheio:
+            self._abertos.pop(lobby.id, None)
+
+    def remover_jogador(self, lobby: Lobby, membro: discord.Member):
+        lobby.jogadores = [j for j in lobby.jogadores if j.id != membro.id]
+        self._por_jogador.pop(membro.id, None)
+        if lobby.estado == LOBBY_AGUARDANDO and not lobby.cheio:
+            self._abertos[lobby.id] = lobby
+
+    def reciclar(self, lobby: Lobby):
+        """Encerra o lobby, liberando seus jogadores, apagando o estado gravado e devolvendo-o ao pool."""
+        if lobby.versao:
+            self._gravar(_apagar_lobby, self.guild_id, lobby.numero)
+        for jogador in lobby.jogadores:
+            if self._por_jogador.get(jogador.id) is lobby:
+                del self._por_jogador[jogador.id]
+        self._lobbies.pop(lobby.id, None)
+        self._abertos.pop(lobby.id, None)
+        heapq.heappush(self._numeros_livres, lobby.numero)
+        lobby.resetar(lobby.numero)
+        self._pool.append(lobby)
+
+# --- Estado por Guilda e por Shard ---
+
+class EstadoGuild:
+    """Estado de uma guilda: canais, lobbies, fila de matchmaking, ranking, distribuição de ELO e índice de nicks."""
+    __slots__ = (
+        "guild_id", "categoria_partidas", "categoria_lobbies",
+        "canal_resultados", "canal_boas_vindas", "lobbies", "fila", "placar", "distribuicao_elo", "indice_nicks"
+    )
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.categoria_partidas = None
+        self.categoria_lobbies = None
+        self.canal_resultados = None
+        self.canal_boas_vindas = None
+        self.lobbies = GerenciadorLobbies(guild_id)
+        self.fila = FilaMatchmaking()
+        self.placar = PlacarRanking(guild_id)
+        self.distribuicao_elo = DistribuicaoElo(guild_id)
+        self.indice_nicks = IndiceNicks()
+
+class EstadoShard:
+    """Estado de um shard: as guildas atendidas por ele e o cache de jogadores delas."""
+    __slots__ = ("shard_id", "guildas", "cache_jogadores")
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.guildas: Dict[int, EstadoGuild] = {}
+        self.cache_jogadores = CacheJogadores()
+
+shards: Dict[int, EstadoShard] = {}
+
+def _taxa_acerto_cache() -> float:
+    acertos = sum(estado.cache_jogadores.acertos for estado in shards.values())
+    total = acertos + sum(estado.cache_jogadores.falhas for estado in shards.values())
+    return acertos / total if total else 0.0
+
+metricas.medidor("r6_cache_jogadores_acerto", _taxa_acerto_cache)
+metricas.medidor("r6_lobbies_ativos", lambda: sum(
+    len(guild.lobbies) for estado in shards.values() for guild in estado.guildas.values()
+))
+metricas.medidor("r6_matchmaking_fila", lambda: sum(
+    len(guild.fila) for estado in shards.values() for guild in estado.guildas.values()
+))
+
+def shard_da_guild(guild_id: int) -> int:
+    """Shard responsável pela guilda: o da guilda em cache, ou a mesma fórmula usada pelo Discord."""
+    guild = bot.get_guild(guild_id)
+    if guild is not None:
+        return guild.shard_id
+    return (guild_id >> 22) % (bot.shard_count or 1)
+
+def estado_shard(shard_id: int) -> EstadoShard:
+    estado = shards.get(shard_id)
+    if estado is None:
+        estado = shards[shard_id] = EstadoShard(shard_id)
+    return estado
+
+def estado_guild(guild_id: int) -> EstadoGuild:
+    """Estado da guilda, criado sob demanda no shard correspondente."""
+    guildas = estado_shard(shard_da_guild(guild_id)).guildas
+    estado = guildas.get(guild_id)
+    if estado is None:
+        estado = guildas[guild_id] = EstadoGuild(guild_id)
+    return estado
+
+def descartar_estado_guild(guild_id: int):
+    estado_shard(shard_da_guild(guild_id)).guildas.pop(guild_id, None)
+
+def _ler_lobbies_gravados(conn: sqlite3.Connection) -> Dict[Tuple[int, int], list]:
+    """Estado de cada lobby gravado: o snapshot com os eventos posteriores já aplicados."""
+    lobbies = {
+        (guild_id, numero): [versao, json.loads(dados)]
+        for guild_id, numero, versao, dados in conn.execute("SELECT guild_id, numero, versao, dados FROM lobbies")
+    }
+    for guild_id, numero, versao, evento, dados in conn.execute(
+        "SELECT guild_id, numero, versao, evento, dados FROM lobby_eventos ORDER BY guild_id, numero, versao"
+    ):
+        gravado = lobbies.get((guild_id, numero))
+        if gravado is None or versao <= gravado[0]:
+            continue  # Evento órfão ou já incorporado ao snapshot
+        gravado[0] = versao
+        aplicar_evento_lobby(gravado[1], evento, json.loads(dados))
+    return lobbies
+
+async def carregar_lobbies():
+    """Restaura os lobbies em andamento gravados antes do reinício (hibernados até o primeiro uso)."""
+    lobbies = await db.ler(_ler_lobbies_gravados)
+    for (guild_id, numero), (versao, dados) in sorted(lobbies.items()):
+        estado_guild(guild_id).lobbies.hibernar(numero, versao, dados)
+    if lobbies:
+        logger.info(f"{len(lobbies)} lobby(s) em andamento restaurado(s).")
+
+# --- Temporizadores ---
+
+class Agendador:
+    """Agendador central de temporizadores persistentes.
+
+    Todos os temporizadores ficam num único heap atendido por uma única tarefa,
+    que dorme até o prazo mais próximo. Agendar e reagendar custam O(log n);
+    cancelar é O(1) (a entrada antiga fica no heap e é descartada ao chegar ao
+    topo). Cada temporizador tem uma chave única, um tipo com tratador
+    registrado e dados em JSON, e é gravado na tabela `temporizadores` para
+    sobreviver a reinícios.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._timers: Dict[str, Tuple[float, int, str, dict]] = {}  # chave -> (prazo, seq, tipo, dados)
+        self._tratadores: Dict[str, Callable] = {}
+        self._seq = 0
+        self._acordar: Optional[asyncio.Event] = None
+        self._tarefa: Optional[asyncio.Task] = None
+        self.disparados = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def tratador(self, tipo: str):
+        """Registra `func(**dados)` como tratador dos temporizadores do tipo."""
+        def decorador(func: Callable) -> Callable:
+            self._tratadores[tipo] = func
+            return func
+        return decorador
+
+    def prazo(self, chave: str) -> Optional[float]:
+        """Timestamp Unix em que o temporizador dispara, ou None se não estiver pendente."""
+        timer = self._timers.get(chave)
+        return timer[0] if timer else None
+
+    async def agendar(self, chave: str, tipo: str, atraso: float, **dados):
+        """Agenda (ou reagenda) o temporizador `chave` para daqui a `atraso` segundos."""
+        prazo = time.time() + atraso
+        self._inserir(chave, tipo, prazo, dados)
+        await db.executar(
+            "INSERT INTO temporizadores (chave, tipo, prazo, dados) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(chave) DO UPDATE SET tipo = excluded.tipo, prazo = excluded.prazo, dados = excluded.dados",
+            (chave, tipo, prazo, json.dumps(dados))
+        )
+
+    async def cancelar(self, *chaves: str):
+        chaves = [chave for chave in chaves if self._timers.pop(chave, None) is not None]
+        if chaves:
+            await db.transacao(
+                lambda conn: conn.executemany("DELETE FROM temporizadores WHERE chave = ?", [(c,) for c in chaves]),
+                origem="cancelar"
+            )
+
+    async def carregar(self):
+        """Recarrega os temporizadores persistidos; os vencidos disparam em seguida."""
+        linhas = await db.buscar_todos("SELECT chave, tipo, prazo, dados FROM temporizadores")
+        for linha in linhas:
+            if linha["chave"] not in self._timers:
+                self._inserir(linha["chave"], linha["tipo"], linha["prazo"], json.loads(linha["dados"]))
+        logger.info(f"{len(linhas)} temporizador(es) recarregado(s).")
+
+    def _inserir(self, chave: str, tipo: str, prazo: float, dados: dict):
+        self._seq += 1
+        self._timers[chave] = (prazo, self._seq, tipo, dados)
+        heapq.heappush(self._heap, (prazo, self._seq, chave))
+        # Compacta o heap quando as entradas canceladas dominam
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._heap = [(p, seq, c) for c, (p, seq, _, _) in self._timers.items()]
+            heapq.heapify(self._heap)
+        
+        if self._tarefa is None:
+            self._acordar = asyncio.Event()
+            self._tarefa = asyncio.create_task(self._executar())
+        if self._heap[0][1] == self._seq:
+            self._acordar.set()
+
+    def _descartar_cancelados(self):
+        while self._heap:
+            _, seq, chave = self._heap[0]
+            timer = self._timers.get(chave)
+            if timer is not None and timer[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    async def _executar(self):
+        while True:
+            self._acordar.clear()
+            self._descartar_cancelados()
+            if not self._heap:
+                await self._acordar.wait()
+                continue
+            
+            espera = self._heap[0][0] - time.time()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._acordar.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            prazo, _, chave = heapq.heappop(self._heap)
+            _, _, tipo, dados = self._timers.pop(chave)
+            asyncio.create_task(self._disparar(chave, tipo, prazo, dados))
+
+    async def _disparar(self, chave: str, tipo: str, prazo: float, dados: dict):
+        self.disparados += 1
+        try:
+            # Só remove a linha se o temporizador não foi reagendado nesse meio tempo
+            await db.executar("DELETE FROM temporizadores WHERE chave = ? AND prazo = ?", (chave, prazo))
+            tratador = self._tratadores.get(tipo)
+            if tratador is None:
+                logger.warning(f"Temporizador {chave} sem tratador para o tipo {tipo}.")
+                return
+            await tratador(**dados)
+        except Exception as e:
+            logger.error(f"Erro ao disparar temporizador {chave}: {e}")
+
+agendador = Agendador()
+metricas.medidor("r6_temporizadores_pendentes", lambda: len(agendador))
+
+# --- Balanceamento de Times ---
+
+DIVISAO_EXAUSTIVA_MAX = 14  # Até este número de jogadores todas as divisões são avaliadas
+
+def _diferenca_times(soma1: float, tamanho1: int, soma2: float, tamanho2: int) -> float:
+    """Diferença entre as médias de ELO dos dois times."""
+    return abs(soma1 / tamanho1 - soma2 / tamanho2)
+
+def _dividir_exaustivo(elos: List[int], separados, juntos) -> Optional[Tuple[List[int], List[int]]]:
+    n = len(elos)
+    total = sum(elos)
+    tamanhos = {n // 2, n - n // 2}
+    
+    # Soma de ELO de todos os subconjuntos (máscaras de bits) numa única passada:
+    # cada máscara reaproveita a soma da máscara sem o seu bit mais baixo.
+    somas = [0] * (1 << n)
+    for mascara in range(1, 1 << n):
+        bit = mascara & -mascara
+        somas[mascara] = somas[mascara ^ bit] + elos[bit.bit_length() - 1]
+    
+    melhor, melhor_mascara = None, None
+    # O jogador 0 fica sempre no Time 1, descartando as divisões espelhadas
+    for mascara in range(1, 1 << n, 2):
+        tamanho1 = bin(mascara).count("1")
+        if tamanho1 not in tamanhos:
+            continue
+        if any((mascara >> a & 1) == (mascara >> b & 1) for a, b in separados):
+            continue
+        if any((mascara >> a & 1) != (mascara >> b & 1) for a, b in juntos):
+            continue
+        diferenca = _diferenca_times(somas[mascara], tamanho1, total - somas[mascara], n - tamanho1)
+        if melhor is None or diferenca < melhor:
+            melhor, melhor_mascara = diferenca, mascara
+    
+    if melhor_mascara is None:
+        return None
+    time1 = [i for i in range(n) if melhor_mascara >> i & 1]
+    time2 = [i for i in range(n) if not melhor_mascara >> i & 1]
+    return time1, time2
+
+def _dividir_heuristico(elos: List[int], separados, juntos) -> Optional[Tuple[List[int], List[int]]]:
+    n = len(elos)
+    capacidade = [n // 2, n - n // 2]
+    
+    # Duos viram grupos indivisíveis (união dos pares de `juntos`)
+    grupo_de = list(range(n))
+    def raiz(i):
+        while grupo_de[i] != i:
+            grupo_de[i] = grupo_de[grupo_de[i]]
+            i = grupo_de[i]
+        return i
+    for a, b in juntos:
+        grupo_de[raiz(a)] = raiz(b)
+    grupos: Dict[int, List[int]] = {}
+    for i in range(n):
+        grupos.setdefault(raiz(i), []).append(i)
+    
+    # Distribuição gulosa: grupos com restrição primeiro, depois maiores grupos/ELOs,
+    # sempre para o time mais fraco que couber
+    restritos = {i for par in separados for i in par}
+    def prioridade(grupo):
+        return (any(i in restritos for i in grupo), len(grupo), sum(elos[i] for i in grupo))
+    times: List[List[int]] = [[], []]
+    somas = [0, 0]
+    for grupo in sorted(grupos.values(), key=prioridade, reverse=True):
+        opcoes = sorted((0, 1), key=lambda t: somas[t])
+        for t in opcoes:
+            conflito = any((a in grupo and b in times[t]) or (b in grupo and a in times[t]) for a, b in separados)
+            if len(times[t]) + len(grupo) <= capacidade[t] and not conflito:
+                times[t].extend(grupo)
+                somas[t] += sum(elos[i] for i in grupo)
+                break
+        else:
+            return None
+    
+    # Busca local: trocas entre jogadores avulsos enquanto reduzirem a diferença
+    avulsos = {i for g in grupos.values() if len(g) == 1 for i in g}
+    def valido(time1):
+        return all((a in time1) != (b in time1) for a, b in separados)
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        atual = _diferenca_times(somas[0], len(times[0]), somas[1], len(times[1]))
+        for i in [x for x in times[0] if x in avulsos]:
+            for j in [x for x in times[1] if x in avulsos]:
+                soma1 = somas[0] - elos[i] + elos[j]
+                soma2 = somas[1] - elos[j] + elos[i]
+                if _diferenca_times(soma1, len(times[0]), soma2, len(times[1])) < atual:
+                    time1 = set(times[0]) - {i} | {j}
+                    if not valido(time1):
+                        continue
+                    times[0].remove(i); times[0].append(j)
+                    times[1].remove(j); times[1].append(i)
+                    somas = [soma1, soma2]
+                    melhorou = True
+                    break
+            if melhorou:
+                break
+    return sorted(times[0]), sorted(times[1])
+
+def dividir_times(
+    elos: List[int],
+    separados: List[Tuple[int, int]] = (),
+    juntos: List[Tuple[int, int]] = ()
+) -> Tuple[List[int], List[int]]:
+    """Divide os jogadores em dois times minimizando a diferença de ELO médio.
+
+    Recebe os ELOs por índice e retorna os índices de cada time. `separados` são
+    pares que devem ficar em times diferentes (ex.: capitães) e `juntos` pares que
+    devem jogar juntos (duos). Se as restrições forem impossíveis, elas são ignoradas.
+    """
+    n = len(elos)
+    if n < 2:
+        return list(range(n)), []
+    dividir = _dividir_exaustivo if n <= DIVISAO_EXAUSTIVA_MAX else _dividir_heuristico
+    times = dividir(elos, separados, juntos)
+    if times is None:
+        logger.warning("Restrições de balanceamento impossíveis; dividindo times sem restrições.")
+        times = dividir(elos, (), ())
+    return times
+
+# --- Rating ---
+
+class MotorRating:
+    """Calcula a variação de rating dos jogadores de uma partida.
+
+    Recebe os ratings atuais de cada time e o time vencedor e retorna a
+    variação de cada jogador, na mesma ordem. Não guarda estado, então o mesmo
+    motor serve para as partidas novas e para o recálculo do histórico.
+    """
+    nome = ""
+
+    def variacoes(self, time1: List[int], time2: List[int], vencedor: int) -> Tuple[List[int], List[int]]:
+        raise NotImplementedError
+
+    def descricao(self) -> str:
+        raise NotImplementedError
+
+class MotorFixo(MotorRating):
+    """Valores fixos por vitória e derrota (regra original do bot)."""
+    nome = "fixo"
+
+    def variacoes(self, time1, time2, vencedor):
+        return (
+            [ELO_VITORIA if vencedor == 1 else ELO_DERROTA] * len(time1),
+            [ELO_VITORIA if vencedor == 2 else ELO_DERROTA] * len(time2)
+        )
+
+    def descricao(self) -> str:
+        return f"• Vitórias: **+{ELO_VITORIA} ELO**\n• Derrotas: **{ELO_DERROTA} ELO**"
+
+class MotorElo(MotorRating):
+    """ELO por placar esperado entre as forças (ELO médio) dos dois times.
+
+    Vencer um time mais forte rende mais pontos e perder para um mais fraco
+    custa mais. `escala` é a diferença de ELO em que o favorito tem 10:1 de
+    chance; com os ranks separados por 1000 pontos, 1000 mantém a curva suave.
+    """
+    nome = "elo"
+
+    def __init__(self, k: float = 40, escala: float = 1000):
+        self.k = k
+        self.escala = escala
+
+    def variacoes(self, time1, time2, vencedor):
+        forca1 = sum(time1) / max(len(time1), 1)
+        forca2 = sum(time2) / max(len(time2), 1)
+        esperado1 = 1 / (1 + 10 ** ((forca2 - forca1) / self.escala))
+        variacao1 = round(self.k * ((1 if vencedor == 1 else 0) - esperado1))
+        return [variacao1] * len(time1), [-variacao1] * len(time2)
+
+    def descricao(self) -> str:
+        return (
+            f"• Até **{self.k:.0f} ELO** por partida\n"
+            "• Vencer times mais fortes rende mais; perder para times mais fracos custa mais"
+        )
+
+MOTORES_RATING = {motor.nome: motor for motor in (MotorFixo, MotorElo)}
+RATING_MOTOR = os.getenv("RATING_MOTOR", "fixo")
+motor_rating: MotorRating = MOTORES_RATING[RATING_MOTOR]()  # Padrão das guildas sem recálculo
+motores_por_guild: Dict[int, MotorRating] = {}
+
+def motor_da_guild(guild_id: int) -> MotorRating:
+    """Motor escolhido no último recálculo da guilda, ou o padrão (`RATING_MOTOR`)."""
+    return motores_por_guild.get(guild_id, motor_rating)
+
+def variacoes_partida(motor: MotorRating, participantes: list, ratings: Dict[int, int], vencedor: int) -> List[int]:
+    """Variação de cada participante `(jogador_id, time, kills, deaths)`, na mesma ordem."""
+    time1 = [ratings[p[0]] for p in participantes if p[1] == 1]
+    time2 = [ratings[p[0]] for p in participantes if p[1] != 1]
+    variacoes1, variacoes2 = (iter(v) for v in motor.variacoes(time1, time2, vencedor))
+    return [next(variacoes1) if p[1] == 1 else next(variacoes2) for p in participantes]
+
+SQL_REPRODUCAO = """
+    SELECT pj.partida_id, p.time_vencedor, pj.jogador_id, pj.time, pj.kills, pj.deaths
+    FROM partida_jogadores pj
+    JOIN partidas p ON p.id = pj.partida_id
+    WHERE p.guild_id = ? AND pj.partida_id > ? AND p.data_partida >= ?
+    ORDER BY pj.partida_id
+"""
+
+def _ratings_iniciais(conn: sqlite3.Connection, guild_id: int, ratings: Dict[int, int]):
+    """ELO inicial (valor do rank escolhido no registro) dos jogadores da guilda ainda fora de `ratings`."""
+    for jogador_id, rank in conn.execute("SELECT id, rank FROM jogadores WHERE guild_id = ?", (guild_id,)):
+        if jogador_id not in ratings:
+            ratings[jogador_id] = RANKS.get(rank, {}).get("valor", 0)
+
+def _reproduzir_partidas(linhas, motor: MotorRating, ratings: Dict[int, int],
+                         janelas: Dict[int, deque], ultima: int) -> int:
+    """Reaplica as partidas em ordem sobre `ratings`; retorna o ID da última partida."""
+    for partida_id, grupo in itertools.groupby(linhas, key=lambda linha: linha[0]):
+        grupo = list(grupo)
+        vencedor = grupo[0][1]
+        participantes = [linha[2:] for linha in grupo if linha[2] in ratings]
+        for (jogador_id, time_jogador, kills, deaths), variacao in zip(
+            participantes, variacoes_partida(motor, participantes, ratings, vencedor)
+        ):
+            elo = ratings[jogador_id] = ratings[jogador_id] + variacao
+            janela = janelas.get(jogador_id)
+            if janela is None:
+                janela = janelas[jogador_id] = deque(maxlen=JANELA_FORMA)
+            janela.append((int(time_jogador == vencedor), kills, deaths, elo, variacao))
+        ultima = partida_id
+    return ultima
+
+def _recalcular_ratings(guild_id: int, nome_motor: str, desde: str) -> Tuple[Dict[int, int], Dict[int, deque], int]:
+    """Recalcula os ratings da guilda a partir do histórico (executado numa thread com conexão própria).
+
+    Lê de um snapshot consistente do banco (WAL), sem bloquear as escritas do bot.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        ratings: Dict[int, int] = {}
+        janelas: Dict[int, deque] = {}
+        _ratings_iniciais(conn, guild_id, ratings)
+        ultima = _reproduzir_partidas(
+            conn.execute(SQL_REPRODUCAO, (guild_id, 0, desde)), MOTORES_RATING[nome_motor](), ratings, janelas, 0
+        )
+        conn.rollback()
+    finally:
+        conn.close()
+    return ratings, janelas, ultima
+
+def _aplicar_recalculo(conn: sqlite3.Connection, guild_id: int, nome_motor: str, desde: str,
+                       ratings: Dict[int, int], janelas: Dict[int, deque], ultima: int) -> int:
+    """Completa o recálculo com o que chegou depois do snapshot e grava tudo (thread de escrita)."""
+    _ratings_iniciais(conn, guild_id, ratings)
+    _reproduzir_partidas(
+        conn.execute(SQL_REPRODUCAO, (guild_id, ultima, desde)), MOTORES_RATING[nome_motor](), ratings, janelas, ultima
+    )
+    conn.executemany(
+        "UPDATE jogadores SET elo = ? WHERE id = ? AND guild_id = ?",
+        [(elo, jogador_id, guild_id) for jogador_id, elo in ratings.items()]
+    )
+    conn.execute("DELETE FROM forma_recente WHERE jogador_id IN (SELECT id FROM jogadores WHERE guild_id = ?)", (guild_id,))
+    conn.executemany(
+        "INSERT INTO forma_recente (jogador_id, janela) VALUES (?, ?)",
+        [(jogador_id, json.dumps(list(janela))) for jogador_id, janela in janelas.items()]
+    )
+    return len(ratings)
+
+_recalculos_em_andamento: Set[int] = set()
+
+async def recalcular_ratings(guild_id: int, nome_motor: str, desde: str) -> int:
+    """Recalcula os ratings da guilda com `nome_motor`, considerando só partidas a partir de `desde`.
+
+    O histórico é reprocessado numa thread com conexão de leitura própria
+    enquanto o bot continua atendendo (sem fork, que poderia herdar travas
+    das threads do banco); depois, numa única transação, as partidas gravadas
+    nesse meio tempo são reaplicadas e os novos ratings substituem os antigos.
+    O motor e o início da temporada ficam gravados para a guilda e passam a
+    valer nas partidas seguintes dela. Retorna o número de jogadores.
+    """
+    if guild_id in _recalculos_em_andamento:
+        raise RuntimeError("Já existe um recálculo de ratings em andamento.")
+    _recalculos_em_andamento.add(guild_id)
+    try:
+        loop = asyncio.get_running_loop()
+        ratings, janelas, ultima = await loop.run_in_executor(None, _recalcular_ratings, guild_id, nome_motor, desde)
+        
+        motores_por_guild[guild_id] = MOTORES_RATING[nome_motor]()
+        total = await db.transacao(_aplicar_recalculo, guild_id, nome_motor, desde, ratings, janelas, ultima)
+        await salvar_configuracao(f"motor_rating:{guild_id}", nome_motor)
+        await salvar_configuracao(f"temporada_inicio:{guild_id}", desde)
+    finally:
+        _recalculos_em_andamento.discard(guild_id)
+    
+    estado_shard(shard_da_guild(guild_id)).cache_jogadores.limpar()
+    estado = estado_guild(guild_id)
+    estado.placar.invalidar()
+    estado.distribuicao_elo.invalidar()
+    return total
+
+async def carregar_motor_rating():
+    """Restaura o motor escolhido no último recálculo de cada guilda."""
+    for linha in await db.buscar_todos("SELECT chave, valor FROM configuracoes WHERE chave LIKE 'motor_rating:%'"):
+        if linha["valor"] in MOTORES_RATING:
+            motores_por_guild[int(linha["chave"].split(":", 1)[1])] = MOTORES_RATING[linha["valor"]]()
+
+# --- Classes de Views e Modais ---
+
+def view_persistente(*itens: discord.ui.Item) -> View:
+    """Monta uma View apenas como contêiner de componentes dinâmicos.
+
+    A view é encerrada antes do envio, então não fica guardada em memória nem
+    tem timer: os cliques são roteados pelos itens dinâmicos registrados uma
+    vez na inicialização e continuam funcionando após reinícios do bot.
+    """
+    view = View(timeout=None)
+    for item in itens:
+        view.add_item(item)
+    view.stop()
+    return view
+
+OPCOES_RANK = [
+    discord.SelectOption(label="Cobre", emoji="🥉", value="COBRE"),
+    discord.SelectOption(label="Bronze", emoji="🔶", value="BRONZE"),
+    discord.SelectOption(label="Prata", emoji="🔷", value="PRATA"),
+    discord.SelectOption(label="Ouro", emoji="🥇", value="OURO"),
+    discord.SelectOption(label="Platina", emoji="💠", value="PLATINA"),
+    discord.SelectOption(label="Esmeralda", emoji="💚", value="ESMERALDA"),
+    discord.SelectOption(label="Diamante", emoji="💎", value="DIAMANTE"),
+    discord.SelectOption(label="Champion", emoji="🏆", value="CHAMPION")
+]
+
+# Menu persistente para seleção de rank (o dono do menu vai no custom_id)
+class SelecaoRank(discord.ui.DynamicItem[discord.ui.Select], template=r"r6:rank:(?P<user_id>\d+)"):
+    def __init__(self, user_id: int):
+        super().__init__(
+            discord.ui.Select(
+                placeholder="Selecione seu rank",
+                options=OPCOES_RANK,
+                custom_id=f"r6:rank:{user_id}"
+            )
+        )
+        self.user_id = user_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match: "re.Match[str]"):
+        return cls(int(match["user_id"]))
+    
+    @cronometrar("r6_interacao_segundos", componente="SelecaoRank")
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("Este menu não é para você!", ephemeral=True)
+            return
+        
+        rank = self.item.values[0]
+        
+        # Salvar rank no banco de dados (só na primeira escolha: o menu continua ativo e o ELO
+        # inicial do rank não pode sobrescrever o ELO já conquistado nas partidas)
+        jogador = await db.executar_retornando(
+            "UPDATE jogadores SET rank = ?, elo = ? WHERE guild_id = ? AND discord_id = ? AND rank IS NULL RETURNING *",
+            (rank, RANKS[rank]["valor"], interaction.guild_id, self.user_id)
+        )
+        if not jogador:
+            await interaction.response.send_message("Seu rank já foi definido!", ephemeral=True)
+            return
+        estado_shard(shard_da_guild(interaction.guild_id)).cache_jogadores.atualizar([jogador])
+        estado_guild(interaction.guild_id).placar.aplicar([jogador])
+        estado_guild(interaction.guild_id).distribuicao_elo.aplicar([jogador])
+        
+        await interaction.response.send_message(
+            f"Rank {RANKS[rank]['emoji']} **{rank}** selecionado com sucesso! ✅",
+            ephemeral=True
+        )
+        
+        # Enviar mensagem de boas-vindas ao competitivo
+        embed = discord.Embed(
+            title="🎮 Bem-vindo ao Competitivo de Rainbow Six Siege! 🎮",
+            description="Agora você faz parte da nossa comunidade competitiva!",
+            color=discord.Color.gold()
+        )
+        
+        embed.add_field(
+            name="📋 Regras do Lobby",
+            value=(
+                "1. Respeite todos os jogadores\n"
+                "2. Não utilize hacks ou cheats\n"
+                "3. Mantenha a comunicação clara e objetiva\n"
+                "4. Aceite o resultado das partidas com esportividade\n"
+                "5. Reporte problemas para os administradores"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="⚙️ Sistema de Rank (ELO)",
+            value=(
+                "Seu progresso será acompanhado através do nosso sistema de ELO:\n"
+                f"{motor_da_guild(interaction.guild_id).descricao()}\n"
+                "• MVP da partida: **+5 ELO bônus** (A ser implementado)"
+            ),
+            inline=False
+        )
+        
+        embed.set_footer(text="Divirta-se e boa sorte!")
+        
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+# Modal para inserir nick do R6 (salva o nick e abre a seleção de rank)
+class NickModal(discord.ui.Modal, title="Registro de Nick do R6"):
+    def __init__(self):
+        super().__init__(timeout=300)
+    
+    nick = discord.ui.TextInput(
+        label="Seu nick no Rainbow Six Siege",
+        placeholder="Ex: R6_ProPlayer123",
+        min_length=3,
+        max_length=20
+    )
+    
+    @cronometrar("r6_interacao_segundos", componente="NickModal")
+    async def on_submit(self, interaction: discord.Interaction):
+        r6_nickname = self.nick.value
+        
+        # Salvar no banco de dados (cria o jogador ou só atualiza o nick)
+        linha = await db.executar_retornando(
+            """INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname) VALUES (?, ?, ?, ?)
+            ON CONFLICT (guild_id, discord_id) DO UPDATE SET r6_nickname = excluded.r6_nickname
+            RETURNING *""",
+            (interaction.guild_id, interaction.user.id, interaction.user.name, r6_nickname)
+        )
+        estado_shard(shard_da_guild(interaction.guild_id)).cache_jogadores.atualizar([linha])
+        estado_guild(interaction.guild_id).indice_nicks.atualizar(linha["discord_id"], linha["r6_nickname"], linha["discord_name"])
+        
+        # Pedir para selecionar o rank
+        await interaction.response.send_message(
+            f"Nick **{r6_nickname}** registrado! Agora selecione seu rank:",
+            view=view_persistente(SelecaoRank(interaction.user.id)),
+            ephemeral=True
+        )
+
+# Botão persistente de registro inicial (o dono do botão vai no custom_id)
+class BotaoRegistro(discord.ui.DynamicItem[discord.ui.Button], template=r"r6:registro:(?P<user_id>\d+)"):
+    def __init__(self, user_id: int, rotulo: str = "Competitivo R6"):
+        super().__init__(
+            discord.ui.Button(
+                label=rotulo[:80],
+                style=discord.ButtonStyle.primary,
+                emoji="🎮",
+                custom_id=f"r6:registro:{user_id}"
+            )
+        )
+        self.user_id = user_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: "re.Match[str]"):
+        return cls(int(match["user_id"]))
+    
+    @cronometrar("r6_interacao_segundos", componente="BotaoRegistro")
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("Este menu não é para você!", ephemeral=True)
+            return
+        
+        # Verificar se já está registrado
+        jogador = await get_jogador_by_id(interaction.guild_id, self.user_id)
+        
+        if jogador and jogador["r6_nickname"]:
+            await interaction.response.send_message(
+                "Você já está registrado no sistema competitivo!",
+                ephemeral=True
+            )
+            return
+        
+        # Modal para inserir nick do R6
+        await interaction.response.send_modal(NickModal())
+
+# --- Veto de Mapas ---
+
+VETO_DEBOUNCE = 0.75  # Segundos em que cliques seguidos são agrupados numa única edição da mensagem
+VETO_TURNO = 60       # Segundos por turno; ao expirar, um mapa aleatório é banido pelo capitão da vez
+
+class EdicaoAdiada:
+    """Agrupa edições rápidas de uma mensagem numa única chamada `message.edit`.
+
+    Cada `agendar` substitui o conteúdo pendente; a edição só é feita após
+    `atraso` segundos sem ser reenviada, sempre com o estado mais recente.
+    """
+
+    def __init__(self, mensagem: discord.Message, atraso: float = VETO_DEBOUNCE):
+        self.mensagem = mensagem
+        self.atraso = atraso
+        self.solicitadas = 0
+        self.edicoes = 0
+        self._pendente: Optional[dict] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def agendar(self, **conteudo):
+        self._pendente = conteudo
+        self.solicitadas += 1
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._executar())
+
+    async def _executar(self):
+        while self._pendente is not None:
+            await asyncio.sleep(self.atraso)
+            conteudo, self._pendente = self._pendente, None
+            try:
+                await self.mensagem.edit(**conteudo)
+                self.edicoes += 1
+            except discord.HTTPException as e:
+                logger.error(f"Erro ao atualizar mensagem {self.mensagem.id}: {e}")
+
+def capitao_da_vez(lobby: Lobby) -> Optional[discord.Member]:
+    """Os capitães banem alternadamente, começando pelo capitão do Time 1."""
+    return lobby.capitao1 if len(lobby.mapas_banidos) % 2 == 0 else lobby.capitao2
+
+def _chave_turno_veto(estado: EstadoGuild, lobby: Lobby) -> str:
+    return f"veto:{estado.guild_id}:{lobby.numero}"
+
+async def agendar_turno_veto(estado: EstadoGuild, lobby: Lobby):
+    await agendador.agendar(
+        _chave_turno_veto(estado, lobby), "turno_veto", VETO_TURNO,
+        guild_id=estado.guild_id, numero=lobby.numero,
+        mensagem_id=lobby.ban_message.id, banidos=len(lobby.mapas_banidos)
+    )
+
+async def banir_mapa(estado: EstadoGuild, lobby: Lobby, mapa: str):
+    """Registra o banimento e avança o veto (chamada com a trava do lobby adquirida).
+
+    No último ban a sala de voz é criada antes de o lobby mudar: se a API falhar,
+    o veto continua aberto com o turno do mesmo capitão reiniciado.
+    """
+    restantes = [m for m in mapas if m not in lobby.mapas_banidos and m != mapa]
+    sala = None
+    if len(restantes) == 1:
+        try:
+            sala = await criar_sala_partida(estado, lobby)
+        except Exception:
+            await agendar_turno_veto(estado, lobby)
+            lobby.edicao_ban.agendar(**renderizar_veto(lobby, agendador.prazo(_chave_turno_veto(estado, lobby))))
+            raise
+        lobby.mapa_escolhido = restantes[0]
+    lobby.mapas_banidos.append(mapa)
+    estado.lobbies.registrar(lobby, "ban", mapa)
+    if lobby.mapa_escolhido:
+        await agendador.cancelar(_chave_turno_veto(estado, lobby))
+        comecar_partida(estado, lobby, sala)
+    else:
+        await agendar_turno_veto(estado, lobby)
+    lobby.edicao_ban.agendar(**renderizar_veto(lobby, agendador.prazo(_chave_turno_veto(estado, lobby))))
+
+@agendador.tratador("turno_veto")
+async def expirar_turno_veto(guild_id: int, numero: int, mensagem_id: int, banidos: int):
+    estado = estado_guild(guild_id)
+    lobby = estado.lobbies.obter(f"lobby_{numero}")
+    if lobby is None:
+        return
+    async with lobby.trava:
+        # Ignora se o veto acabou, é de outra mensagem ou o capitão já jogou
+        if (lobby.estado != LOBBY_VETO or lobby.ban_message is None
+                or lobby.ban_message.id != mensagem_id or len(lobby.mapas_banidos) != banidos):
+            return
+        await banir_mapa(estado, lobby, random.choice([m for m in mapas if m not in lobby.mapas_banidos]))
+
+class BanMapaButton(discord.ui.DynamicItem[discord.ui.Button], template=r"r6:ban:(?P<lobby>\d+):(?P<indice>\d+)"):
+    def __init__(self, numero_lobby: int, indice: int, estilo=discord.ButtonStyle.secondary, desativado: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label=mapas[indice],
+                style=estilo,
+                disabled=desativado,
+                custom_id=f"r6:ban:{numero_lobby}:{indice}"
+            )
+        )
+        self.numero_lobby = numero_lobby
+        self.mapa = mapas[indice]
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: "re.Match[str]"):
+        return cls(int(match["lobby"]), int(match["indice"]))
+
+    @cronometrar("r6_interacao_segundos", componente="BanMapaButton")
+    async def callback(self, interaction: discord.Interaction):
+        # O clique é confirmado logo; a mensagem do veto é editada em lote pelo EdicaoAdiada
+        await interaction.response.defer()
+        estado = estado_guild(interaction.guild_id)
+        lobby = estado.lobbies.obter(f"lobby_{self.numero_lobby}")
+        erro = None
+        
+        if lobby is None:
+            erro = "Este veto não está mais ativo."
+        else:
+            async with lobby.trava:
+                capitao = capitao_da_vez(lobby)
+                # Números de lobby são reaproveitados: só vale o clique na mensagem do veto atual
+                if lobby.estado != LOBBY_VETO or lobby.ban_message is None or lobby.ban_message.id != interaction.message.id:
+                    erro = "Este veto não está mais ativo."
+                elif capitao is None or interaction.user.id != capitao.id:
+                    erro = f"Não é sua vez de banir. Aguarde {capitao.mention if capitao else 'o capitão'}."
+                elif self.mapa in lobby.mapas_banidos:
+                    erro = f"**{self.mapa}** já foi banido."
+                else:
+                    try:
+                        await banir_mapa(estado, lobby, self.mapa)
+                    except Exception as e:
+                        logger.error(f"Erro ao banir {self.mapa} no {lobby.id}: {e}")
+                        erro = "Não foi possível concluir o veto agora. Tente banir novamente."
+        
+        if erro:
+            await interaction.followup.send(erro, ephemeral=True)
+
+def renderizar_veto(lobby: Lobby, prazo: Optional[float] = None) -> dict:
+    """Embed e botões do veto no estado atual do lobby."""
+    if lobby.mapa_escolhido:
+        embed = discord.Embed(
+            title=f"🗺️ Veto do Lobby {lobby.numero} concluído",
+            description=f"Mapa: **{lobby.mapa_escolhido}**\nUse `{lobby.id}` para finalizar a partida.",
+            color=discord.Color.green()
+        )
+    else:
+        capitao = capitao_da_vez(lobby)
+        limite = f" Tempo esgota <t:{int(prazo)}:R>." if prazo else ""
+        embed = discord.Embed(
+            title=f"🗺️ Veto de mapas - Lobby {lobby.numero}",
+            description=f"Vez de {capitao.mention} banir um mapa.{limite}",
+            color=discord.Color.orange()
+        )
+    if lobby.mapas_banidos:
+        embed.add_field(name="Banidos", value=", ".join(f"~~{mapa}~~" for mapa in lobby.mapas_banidos), inline=False)
+    
+    botoes = []
+    for indice, mapa in enumerate(mapas):
+        if mapa == lobby.mapa_escolhido:
+            estilo = discord.ButtonStyle.success
+        elif mapa in lobby.mapas_banidos:
+            estilo = discord.ButtonStyle.danger
+        else:
+            estilo = discord.ButtonStyle.secondary
+        desativado = bool(lobby.mapa_escolhido) or mapa in lobby.mapas_banidos
+        botoes.append(BanMapaButton(lobby.numero, indice, estilo, desativado))
+    
+    lobby.ban_view = view_persistente(*botoes)
+    return {"embed": embed, "view": lobby.ban_view}
+
+# --- Histórico de Partidas ---
+
+HISTORICO_POR_PAGINA = 10
+HISTORICO_INICIO = 2 ** 63 - 1  # Cursor da primeira página (acima de qualquer ID de partida)
+
+def _buscar_pagina_historico(conn: sqlite3.Connection, jogador_id: int, direcao: str, cursor: int) -> List[sqlite3.Row]:
+    """Busca uma página por keyset sobre `partida_id`.
+
+    `direcao` ">" traz as partidas mais antigas que `cursor` e "<" as mais
+    recentes. A busca percorre apenas o índice `idx_partida_jogadores_historico`
+    a partir do cursor, então qualquer página custa o mesmo que a primeira.
+    Retorna até HISTORICO_POR_PAGINA + 1 linhas, da mais recente para a mais antiga;
+    a linha extra indica que há mais partidas naquela direção.
+    """
+    if direcao == ">":
+        filtro, ordem = "pj.partida_id < ?", "DESC"
+    else:
+        filtro, ordem = "pj.partida_id > ?", "ASC"
+    linhas = conn.execute(f"""
+        SELECT pj.partida_id, pj.time, pj.kills, pj.deaths, pj.resultado, p.mapa, p.data_partida
+        FROM partida_jogadores pj
+        JOIN partidas p ON p.id = pj.partida_id
+        WHERE pj.jogador_id = ? AND {filtro}
+        ORDER BY pj.partida_id {ordem}
+        LIMIT ?
+    """, (jogador_id, cursor, HISTORICO_POR_PAGINA + 1)).fetchall()
+    return linhas if direcao == ">" else linhas[::-1]
+
+class PaginasHistorico:
+    """Páginas de histórico buscadas antecipadamente.
+
+    Ao exibir uma página, a seguinte (mais antiga) já é buscada em segundo
+    plano. Só páginas nessa direção são guardadas: partidas novas recebem IDs
+    maiores, então uma página abaixo de um cursor nunca muda.
+    """
+
+    def __init__(self, capacidade: int = 256):
+        self.capacidade = capacidade
+        self._paginas: "OrderedDict[Tuple[int, int], asyncio.Future]" = OrderedDict()
+
+    def _buscar(self, jogador_id: int, cursor: int) -> asyncio.Future:
+        tarefa = asyncio.ensure_future(db.ler(_buscar_pagina_historico, jogador_id, ">", cursor))
+        tarefa.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return tarefa
+
+    def pre_carregar(self, jogador_id: int, cursor: int):
+        chave = (jogador_id, cursor)
+        if chave in self._paginas:
+            self._paginas.move_to_end(chave)
+            return
+        self._paginas[chave] = self._buscar(jogador_id, cursor)
+        while len(self._paginas) > self.capacidade:
+            self._paginas.popitem(last=False)
+
+    async def obter(self, jogador_id: int, direcao: str, cursor: int) -> List[sqlite3.Row]:
+        if direcao != ">":
+            return await db.ler(_buscar_pagina_historico, jogador_id, direcao, cursor)
+        tarefa = self._paginas.pop((jogador_id, cursor), None) or self._buscar(jogador_id, cursor)
+        return await tarefa
+
+paginas_historico = PaginasHistorico()
+
+class BotaoHistorico(discord.ui.DynamicItem[discord.ui.Button], template=r"r6:hist:(?P<autor>\d+):(?P<jogador>\d+):(?P<direcao>[<>]):(?P<cursor>\d+)"):
+    def __init__(self, autor_id: int, jogador_id: int, direcao: str, cursor: int, desativado: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label="Mais antigas" if direcao == ">" else "Mais recentes",
+                emoji="▶️" if direcao == ">" else "◀️",
+                style=discord.ButtonStyle.secondary,
+                disabled=desativado,
+                custom_id=f"r6:hist:{autor_id}:{jogador_id}:{direcao}:{cursor}"
+            )
+        )
+        self.autor_id = autor_id
+        self.jogador_id = jogador_id
+        self.direcao = direcao
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: "re.Match[str]"):
+        return cls(int(match["autor"]), int(match["jogador"]), match["direcao"], int(match["cursor"]))
+
+    @cronometrar("r6_interacao_segundos", componente="BotaoHistorico")
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.autor_id:
+            await interaction.response.send_message("Este menu não é para você!", ephemeral=True)
+            return
+        
+        jogador, linhas = await asyncio.gather(
+            db.buscar_um("SELECT r6_nickname, partidas_jogadas FROM jogadores WHERE id = ?", (self.jogador_id,)),
+            paginas_historico.obter(self.jogador_id, self.direcao, self.cursor)
+        )
+        if not jogador:
+            await interaction.response.send_message("Jogador não encontrado.", ephemeral=True)
+            return
+        await interaction.response.edit_message(
+            **renderizar_historico(self.autor_id, self.jogador_id, jogador, linhas, self.direcao, self.cursor)
+        )
+
+def renderizar_historico(autor_id: int, jogador_id: int, jogador, linhas: List[sqlite3.Row], direcao: str, cursor: int) -> dict:
+    """Embed e botões de uma página do histórico."""
+    # A linha extra de cada busca só indica se há mais partidas naquela direção
+    if direcao == ">":
+        tem_antigas = len(linhas) > HISTORICO_POR_PAGINA
+        tem_recentes = cursor != HISTORICO_INICIO
+        linhas = linhas[:HISTORICO_POR_PAGINA]
+    else:
+        tem_recentes = len(linhas) > HISTORICO_POR_PAGINA
+        tem_antigas = True
+        linhas = linhas[-HISTORICO_POR_PAGINA:]
+    
+    embed = discord.Embed(
+        title=f"📜 Histórico de {jogador['r6_nickname']}",
+        color=discord.Color.blue()
+    )
+    if not linhas:
+        embed.description = "Nenhuma partida registrada."
+        return {"embed": embed, "view": None}
+    
+    descricao = []
+    for linha in linhas:
+        kd = linha["kills"] / linha["deaths"] if linha["deaths"] else float(linha["kills"])
+        resultado = "✅" if linha["resultado"] == "VITÓRIA" else "❌"
+        data = (linha["data_partida"] or "")[:10]
+        descricao.append(
+            f"{resultado} **{linha['mapa']}** • Time {linha['time']} • "
+            f"{linha['kills']}/{linha['deaths']} (K/D {kd:.2f}) • {data}"
+        )
+    embed.description = "\n".join(descricao)
+    embed.set_footer(text=f"{jogador['partidas_jogadas']} partida(s) no total")
+    
+    mais_recente, mais_antiga = linhas[0]["partida_id"], linhas[-1]["partida_id"]
+    if tem_antigas:
+        paginas_historico.pre_carregar(jogador_id, mais_antiga)
+    view = view_persistente(
+        BotaoHistorico(autor_id, jogador_id, "<", mais_recente, desativado=not tem_recentes),
+        BotaoHistorico(autor_id, jogador_id, ">", mais_antiga, desativado=not tem_antigas)
+    )
+    return {"embed": embed, "view": view}
+
+# Componentes persistentes registrados uma única vez para todo o bot
+bot.add_dynamic_items(BotaoRegistro, SelecaoRank, BanMapaButton, BotaoHistorico)
+
+# --- Boas-vindas ---
+
+BOAS_VINDAS_FILA_MAX = 5000     # Entradas aguardando; acima disso novas entradas são descartadas
+BOAS_VINDAS_JANELA = 3.0        # Segundos em que entradas no mesmo canal são agrupadas num resumo
+BOAS_VINDAS_RESUMO_MAX = 25     # Membros por mensagem (um botão de registro por membro)
+BOAS_VINDAS_TRABALHADORES = 2
+BOAS_VINDAS_TENTATIVAS = 5
+
+def montar_boas_vindas(membros: List[discord.Member]) -> dict:
+    """Monta a mensagem de boas-vindas para um membro ou um resumo de vários membros."""
+    if len(membros) == 1:
+        member = membros[0]
         embed = discord.Embed(
             title=f"👋 Bem-vindo(a) ao Servidor, {member.name}!",
             description="Somos uma comunidade dedicada ao **Rainbow Six Siege competitivo**.",
@@ -356,118 +2573,1331 @@ async def on_member_join(member):
             inline=False
         )
         
+        embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
+        botoes = [BotaoRegistro(member.id)]
+    else:
+        embed = discord.Embed(
+            title=f"👋 Bem-vindos(as) ao Servidor, {len(membros)} novos membros!",
+            description="Somos uma comunidade dedicada ao **Rainbow Six Siege competitivo**.",
+            color=discord.Color.blue()
+        )
+        
         embed.add_field(
-            name="📊 Estatísticas e Ranking",
-            value="Seu progresso será acompanhado com nosso sistema de ELO.",
+            name="🎮 Para jogar competitivo",
+            value="Cada um clica no botão com o seu nome para se registrar no sistema competitivo.",
             inline=False
         )
+        botoes = [BotaoRegistro(member.id, rotulo=member.name) for member in membros]
+    
+    embed.add_field(
+        name="📊 Estatísticas e Ranking",
+        value="Seu progresso será acompanhado com nosso sistema de ELO.",
+        inline=False
+    )
+    embed.set_footer(text="Divirta-se e boa sorte nas partidas!")
+    
+    return {
+        "content": " ".join(member.mention for member in membros),
+        "embed": embed,
+        "view": view_persistente(*botoes)
+    }
+
+async def _enviar_no_canal(canal: discord.abc.Messageable, mensagem: dict):
+    await canal.send(**mensagem)
+
+class PipelineBoasVindas:
+    """Pipeline de admissão das mensagens de boas-vindas.
+
+    As entradas vão para uma fila limitada. Um agrupador junta as que chegam
+    ao mesmo canal dentro de `janela` segundos em uma única mensagem de resumo,
+    e um pool de trabalhadores envia os resumos com ritmo adaptativo: o
+    intervalo entre envios dobra a cada 429 e volta a cair aos poucos a cada
+    envio bem-sucedido. Como o discord.py repete os 429 internamente, o ritmo
+    também recua com os avisos do `ColetorRateLimit` (`sinalizar_limitacao`),
+    além de `discord.RateLimited` e do 429 que escapa após as repetições. A função de envio é injetável, o que permite
+    exercitar o pipeline contra um endpoint HTTP local que imite o Discord.
+    """
+
+    def __init__(self, enviar: Callable = _enviar_no_canal, fila_max: int = BOAS_VINDAS_FILA_MAX,
+                 janela: float = BOAS_VINDAS_JANELA, resumo_max: int = BOAS_VINDAS_RESUMO_MAX,
+                 trabalhadores: int = BOAS_VINDAS_TRABALHADORES,
+                 intervalo_min: float = 0.25, intervalo_max: float = 30.0):
+        self.enviar = enviar
+        self.fila_max = fila_max
+        self.janela = janela
+        self.resumo_max = resumo_max
+        self.trabalhadores = trabalhadores
+        self.intervalo_min = intervalo_min
+        self.intervalo_max = intervalo_max
+        self.intervalo = intervalo_min
+        self._proximo_envio = 0.0
+        self._fila: Optional[asyncio.Queue] = None
+        self._lotes: Optional[asyncio.Queue] = None
+        self._tarefas: List[asyncio.Task] = []
+        self._pendentes = 0  # Membros já agrupados aguardando entrega
         
-        embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
-        embed.set_footer(text="Divirta-se e boa sorte nas partidas!")
+        # Métricas
+        self.recebidos = 0
+        self.entregues = 0
+        self.mensagens = 0
+        self.limitacoes = 0
+        self.descartados = 0
+        self.falhas = 0
+        self.atraso_ultimo = 0.0
+        self.atraso_max = 0.0
+
+    def _iniciar(self):
+        if self._fila is None:
+            self._fila = asyncio.Queue(self.fila_max)
+            self._lotes = asyncio.Queue()
+            self._tarefas = [asyncio.create_task(self._agrupador())]
+            self._tarefas += [asyncio.create_task(self._trabalhador()) for _ in range(self.trabalhadores)]
+
+    def enfileirar(self, canal: discord.abc.Messageable, membro: discord.Member) -> bool:
+        """Registra uma entrada sem bloquear o evento; retorna False se a fila estiver cheia."""
+        self._iniciar()
+        try:
+            self._fila.put_nowait((canal, membro, time.monotonic()))
+        except asyncio.QueueFull:
+            self.descartados += 1
+            logger.warning(f"Fila de boas-vindas cheia; entrada de {membro} descartada.")
+            return False
+        self.recebidos += 1
+        return True
+
+    async def _agrupador(self):
+        grupos: Dict[int, list] = {}  # canal.id -> [canal, [(membro, enfileirado_em)], prazo]
+        while True:
+            prazo = min((grupo[2] for grupo in grupos.values()), default=None)
+            espera = None if prazo is None else max(prazo - time.monotonic(), 0)
+            try:
+                canal, membro, enfileirado_em = await asyncio.wait_for(self._fila.get(), espera)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                grupo = grupos.setdefault(canal.id, [canal, [], time.monotonic() + self.janela])
+                grupo[1].append((membro, enfileirado_em))
+                self._pendentes += 1
+                if len(grupo[1]) >= self.resumo_max:
+                    grupo[2] = 0.0
+            
+            agora = time.monotonic()
+            for canal_id in [c for c, grupo in grupos.items() if grupo[2] <= agora]:
+                canal, membros, _ = grupos.pop(canal_id)
+                self._lotes.put_nowait((canal, membros))
+
+    async def _trabalhador(self):
+        while True:
+            canal, membros = await self._lotes.get()
+            try:
+                await self._entregar(canal, membros)
+            finally:
+                self._pendentes -= len(membros)
+
+    async def _aguardar_vez(self):
+        agora = time.monotonic()
+        vez = max(agora, self._proximo_envio)
+        self._proximo_envio = vez + self.intervalo
+        if vez > agora:
+            await asyncio.sleep(vez - agora)
+
+    def _recuar(self, espera: float):
+        """Rate limit: recua o ritmo e respeita a espera informada."""
+        self.limitacoes += 1
+        self.intervalo = min(self.intervalo_max, max(self.intervalo * 2, espera))
+        self._proximo_envio = max(self._proximo_envio, time.monotonic() + espera)
+
+    def sinalizar_limitacao(self, escopo: str, espera: float, rota: Optional[str]):
+        """Ouvinte do `ColetorRateLimit`: 429 global ou num envio de mensagem."""
+        if rota is None or (rota.startswith("POST ") and rota.endswith("/messages")):
+            self._recuar(espera)
+
+    async def _entregar(self, canal: discord.abc.Messageable, membros: list):
+        mensagem = montar_boas_vindas([membro for membro, _ in membros])
+        for _ in range(BOAS_VINDAS_TENTATIVAS):
+            await self._aguardar_vez()
+            try:
+                await self.enviar(canal, mensagem)
+            except Exception as e:
+                # discord.RateLimited não tem `status`, mas traz o retry_after
+                if not isinstance(e, discord.RateLimited) and getattr(e, "status", None) != 429:
+                    self.falhas += 1
+                    logger.error(f"Erro ao enviar boas-vindas: {e}")
+                    return
+                self._recuar(float(getattr(e, "retry_after", None) or self.intervalo * 2))
+                continue
+            
+            self.intervalo = max(self.intervalo_min, self.intervalo * 0.9)
+            self.mensagens += 1
+            self.entregues += len(membros)
+            self.atraso_ultimo = time.monotonic() - membros[0][1]
+            self.atraso_max = max(self.atraso_max, self.atraso_ultimo)
+            return
+        
+        self.falhas += 1
+        logger.error(f"Boas-vindas de {len(membros)} membro(s) abandonadas após {BOAS_VINDAS_TENTATIVAS} tentativas.")
+
+    def metricas(self) -> dict:
+        return {
+            "profundidade_fila": (self._fila.qsize() if self._fila else 0) + self._pendentes,
+            "recebidos": self.recebidos,
+            "entregues": self.entregues,
+            "mensagens": self.mensagens,
+            "limitacoes_429": self.limitacoes,
+            "descartados": self.descartados,
+            "falhas": self.falhas,
+            "intervalo_envio": self.intervalo,
+            "atraso_ultimo": self.atraso_ultimo,
+            "atraso_max": self.atraso_max
+        }
+
+pipeline_boas_vindas = PipelineBoasVindas()
+coletor_rate_limit.ouvintes.append(pipeline_boas_vindas.sinalizar_limitacao)
+metricas.medidor("r6_boas_vindas_fila", lambda: pipeline_boas_vindas.metricas()["profundidade_fila"])
+metricas.medidor("r6_boas_vindas_intervalo_segundos", lambda: pipeline_boas_vindas.intervalo)
+metricas.medidor("r6_boas_vindas_429_total", lambda: pipeline_boas_vindas.limitacoes)
+
+# --- Eventos do Bot ---
+
+# Latência de cada comando de texto (after_invoke roda mesmo quando o comando falha)
+@bot.before_invoke
+async def _iniciar_cronometro(ctx):
+    ctx.inicio_metricas = time.perf_counter()
+
+@bot.after_invoke
+async def _parar_cronometro(ctx):
+    inicio = getattr(ctx, "inicio_metricas", None)
+    if inicio is not None:
+        metricas.observar(
+            "r6_comando_segundos", time.perf_counter() - inicio,
+            comando=ctx.command.qualified_name, falhou=str(ctx.command_failed).lower()
+        )
+
+# Evento quando um membro entra no servidor
+@bot.event
+async def on_member_join(member):
+    canal_boas_vindas = estado_guild(member.guild.id).canal_boas_vindas
+    if canal_boas_vindas:
+        pipeline_boas_vindas.enfileirar(canal_boas_vindas, member)
+
+# Provisionamento e sincronização rodam uma vez por processo; reconexões reaproveitam o resultado
+_provisionamentos: Dict[int, asyncio.Task] = {}
+_sincronizacao: Optional[asyncio.Task] = None
+_carga_inicial: Optional[asyncio.Future] = None
+
+_registros_legados_adotados = False
+
+async def _restaurar_partidas():
+    # Lobbies antes dos temporizadores: turnos de veto vencidos disparam assim que são carregados
+    await carregar_lobbies()
+    await agendador.carregar()
+
+# Evento que confirma que o bot está online (todos os shards conectados)
+@bot.event
+async def on_ready():
+    global _sincronizacao, _carga_inicial
+    logger.info(f"Bot {bot.user.name} está online em {len(bot.guilds)} servidor(es) e {bot.shard_count or 1} shard(s)!")
+    
+    # Garantir que o bot está em pelo menos um servidor
+    if not bot.guilds:
+        logger.error("O bot não está em nenhum servidor.")
+        return
+    
+    await adotar_registros_legados()
+    
+    if _carga_inicial is None:
+        _carga_inicial = asyncio.gather(
+            _restaurar_partidas(), carregar_motor_rating(), carregar_indices_nicks(),
+            iniciar_metricas(), servico_backup.iniciar()
+        )
+    await asyncio.shield(_carga_inicial)
+    
+    # Configurar categorias e canais (guildas já provisionadas pelo on_shard_ready são ignoradas)
+    await provisionar_guildas(bot.guilds)
+    
+    if _sincronizacao is None or (_sincronizacao.done() and _sincronizacao.exception()):
+        _sincronizacao = asyncio.create_task(sincronizar_comandos())
+    await asyncio.shield(_sincronizacao)
+
+# Evento de cada shard pronto: provisiona apenas as guildas daquele shard
+@bot.event
+async def on_shard_ready(shard_id: int):
+    logger.info(f"Shard {shard_id} pronto.")
+    await provisionar_guildas([guild for guild in bot.guilds if guild.shard_id == shard_id])
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    await provisionar_guildas([guild])
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    _provisionamentos.pop(guild.id, None)
+    descartar_estado_guild(guild.id)
+
+async def provisionar_guildas(guildas: List[discord.Guild]):
+    """Provisiona as guildas em blocos paralelos de tamanho limitado."""
+    for bloco in _em_blocos(list(guildas), PROVISIONAMENTO_PARALELO):
+        await asyncio.gather(*(
+            _executar_uma_vez(_provisionamentos, guild.id, lambda guild=guild: configurar_canais(guild))
+            for guild in bloco
+        ))
+
+async def adotar_registros_legados():
+    """Atribui à única guilda os registros anteriores ao suporte multi-guilda (guild_id 0)."""
+    global _registros_legados_adotados
+    if _registros_legados_adotados or len(bot.guilds) != 1:
+        return
+    _registros_legados_adotados = True
+    guild_id = bot.guilds[0].id
+    
+    def adotar(conn: sqlite3.Connection) -> int:
+        total = conn.execute("UPDATE OR IGNORE jogadores SET guild_id = ? WHERE guild_id = 0", (guild_id,)).rowcount
+        conn.execute("UPDATE partidas SET guild_id = ? WHERE guild_id = 0", (guild_id,))
+        return total
+    
+    total = await db.transacao(adotar)
+    if total:
+        logger.info(f"{total} jogador(es) legado(s) atribuído(s) à guilda {guild_id}.")
+
+async def _executar_uma_vez(tarefas: Dict[int, asyncio.Task], chave: int, criar: Callable):
+    """Aguarda a tarefa de `chave`, criando-a só se ainda não existir ou tiver falhado."""
+    tarefa = tarefas.get(chave)
+    if tarefa is None or (tarefa.done() and tarefa.exception()):
+        tarefa = tarefas[chave] = asyncio.create_task(criar())
+    try:
+        await asyncio.shield(tarefa)
+    except Exception as e:
+        logger.error(f"Erro no provisionamento de {chave}: {e}")
+
+def _hash_arvore_comandos() -> str:
+    """Hash estável da árvore de comandos de aplicação (o que seria enviado no sync)."""
+    comandos = sorted(
+        (comando.to_dict(bot.tree) for comando in bot.tree.get_commands()),
+        key=lambda c: (c.get("type", 1), c["name"])
+    )
+    conteudo = json.dumps([bot.application_id, comandos], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+async def sincronizar_comandos():
+    """Sincroniza a árvore de comandos apenas se ela mudou desde o último sync."""
+    hash_atual = _hash_arvore_comandos()
+    if await obter_configuracao("hash_arvore_comandos") == hash_atual:
+        logger.info("Comandos de aplicação inalterados; sincronização ignorada.")
+        return
+    
+    try:
+        await bot.tree.sync()
+    except Exception as e:
+        logger.error(f"Erro ao sincronizar comandos: {e}")
+        return
+    await salvar_configuracao("hash_arvore_comandos", hash_atual)
+    logger.info("Comandos de aplicação sincronizados.")
+
+async def configurar_canais(guild: discord.Guild):
+    """Configura os canais e categorias necessários na Guilda (Servidor).
+
+    Tudo é localizado pelo cache da guilda; apenas o que falta é criado, e as
+    criações independentes são feitas em paralelo.
+    """
+    estado = estado_guild(guild.id)
+    
+    # 1. Encontrar ou criar categorias (as que faltam são criadas em paralelo)
+    categorias = {}
+    for categoria in guild.categories:
+        categorias.setdefault(categoria.name, categoria)
+    
+    faltando = [nome for nome in ("PARTIDAS", "LOBBYS", "RECURSOS") if nome not in categorias]
+    if faltando:
+        criadas = await asyncio.gather(*(guild.create_category(nome) for nome in faltando))
+        categorias.update(zip(faltando, criadas))
+    
+    categoria_partidas = estado.categoria_partidas = categorias["PARTIDAS"]
+    estado.categoria_lobbies = categorias["LOBBYS"]
+    recursos_categoria = categorias["RECURSOS"]
+    
+    # 2. Canal de boas-vindas e 3. canal de resultados, independentes entre si
+    async def garantir_boas_vindas():
+        canal = discord.utils.get(recursos_categoria.text_channels, name="boas-vindas")
+        if canal:
+            return canal
+        
+        canal = await recursos_categoria.create_text_channel("boas-vindas")
+        
+        # Mensagem de boas-vindas inicial (apenas se o canal for novo)
+        embed = discord.Embed(
+            title="🎮 Bem-vindo ao Servidor de Rainbow Six Siege Competitivo!",
+            description="Este é o hub central para competições de R6. Clique no botão de **registro** para participar!",
+            color=discord.Color.gold()
+        )
+        await canal.send(embed=embed)
+        return canal
+    
+    async def garantir_resultados():
+        canal = discord.utils.get(categoria_partidas.text_channels, name="resultados-partidas")
+        if canal:
+            return canal
+        
+        # Permissões do canal de resultados (somente admins/bot podem ver), aplicadas já na criação
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+        }
+        
+        for role in guild.roles:
+            if role.permissions.administrator:
+                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+        
+        return await categoria_partidas.create_text_channel("resultados-partidas", overwrites=overwrites)
+    
+    estado.canal_boas_vindas, estado.canal_resultados = await asyncio.gather(garantir_boas_vindas(), garantir_resultados())
+
+async def montar_times(guild_id: int, lobby: Lobby) -> List[int]:
+    """Balanceia os times do lobby por ELO e define os capitães.
+
+    Os dois maiores ELOs são os capitães e ficam em times opostos. Os jogadores
+    são reordenados como Time 1 seguido do Time 2. Retorna os ELOs na nova ordem.
+    """
+    jogadores_db = await asyncio.gather(*(get_jogador_by_id(guild_id, j.id) for j in lobby.jogadores))
+    elos = [jogador["elo"] if jogador else 0 for jogador in jogadores_db]
+    
+    capitaes = sorted(range(len(elos)), key=lambda i: elos[i], reverse=True)[:2]
+    time1, time2 = dividir_times(elos, separados=[tuple(capitaes)] if len(capitaes) == 2 else [])
+    
+    lobby.capitao1 = next((lobby.jogadores[i] for i in time1 if i in capitaes), None)
+    lobby.capitao2 = next((lobby.jogadores[i] for i in time2 if i in capitaes), None)
+    lobby.jogadores = [lobby.jogadores[i] for i in time1 + time2]
+    return [elos[i] for i in time1 + time2]
+
+async def iniciar_partida(estado: EstadoGuild, lobby: Lobby, canal: discord.abc.Messageable):
+    """Fecha os times de um lobby cheio e abre o veto de mapas (chamada com a trava do lobby adquirida)."""
+    elos = await montar_times(estado.guild_id, lobby)
+    
+    metade = len(lobby.jogadores) // 2
+    embed = discord.Embed(
+        title=f"🎮 Partida {lobby.numero} iniciada",
+        description=f"Use `{lobby.id}` para finalizar a partida.",
+        color=discord.Color.blue()
+    )
+    for numero, inicio, fim, capitao in ((1, 0, metade, lobby.capitao1), (2, metade, len(elos), lobby.capitao2)):
+        media = sum(elos[inicio:fim]) / max(fim - inicio, 1)
+        nomes = [
+            f"{'👑 ' if jogador is capitao else ''}{jogador.mention} ({elo})"
+            for jogador, elo in zip(lobby.jogadores[inicio:fim], elos[inicio:fim])
+        ]
+        embed.add_field(name=f"Time {numero} (ELO médio {media:.0f})", value="\n".join(nomes), inline=True)
+    
+    await canal.send(embed=embed)
+    
+    if lobby.capitao1 is None or lobby.capitao2 is None:
+        comecar_partida(estado, lobby, await criar_sala_partida(estado, lobby))
+        return
+    
+    # As chamadas à API vêm antes da transição: se falharem, o lobby continua aguardando e o matchmaking o recicla
+    ban_message = await canal.send(**renderizar_veto(lobby, time.time() + VETO_TURNO))
+    lobby.transicionar(LOBBY_VETO)
+    lobby.ban_message = ban_message
+    lobby.edicao_ban = EdicaoAdiada(lobby.ban_message)
+    estado.lobbies.registrar(lobby, "veto", [lobby.ban_message.channel.id, lobby.ban_message.id])
+    await agendar_turno_veto(estado, lobby)
+
+async def criar_sala_partida(estado: EstadoGuild, lobby: Lobby) -> Optional[discord.VoiceChannel]:
+    """Cria a sala de voz da partida, se houver categoria. Não altera o lobby."""
+    if estado.categoria_partidas is None:
+        return None
+    return await estado.categoria_partidas.create_voice_channel(f"Partida {lobby.numero}")
+
+def comecar_partida(estado: EstadoGuild, lobby: Lobby, sala: Optional[discord.VoiceChannel]):
+    """Coloca o lobby em andamento com a sala já criada (chamada com a trava do lobby adquirida)."""
+    lobby.transicionar(LOBBY_EM_ANDAMENTO)
+    lobby.sala_partida = sala
+    estado.lobbies.registrar(lobby, "inicio", sala.id if sala else None)
+
+# --- Matchmaking ---
+
+MM_INTERVALO = 1.0          # Segundos entre as rodadas de formação de partidas
+MM_BALDE = 50               # Largura (pontos de ELO) de cada balde do índice da fila
+MM_JANELA_INICIAL = 100     # Diferença de ELO aceita logo ao entrar na fila
+MM_JANELA_POR_SEGUNDO = 10  # Quanto a janela cresce a cada segundo de espera
+MM_JANELA_MAX = 3000
+
+class EntradaFila:
+    """Jogador aguardando partida na fila de matchmaking."""
+    __slots__ = ("membro", "elo", "desde", "canal")
+
+    def __init__(self, membro: discord.Member, elo: int, canal: discord.abc.Messageable, desde: float):
+        self.membro = membro
+        self.elo = elo
+        self.canal = canal
+        self.desde = desde
+
+def janela_matchmaking(espera: float) -> int:
+    """Diferença máxima de ELO aceita após `espera` segundos na fila."""
+    return min(MM_JANELA_INICIAL + int(espera * MM_JANELA_POR_SEGUNDO), MM_JANELA_MAX)
+
+class FilaMatchmaking:
+    """Fila de matchmaking de uma guilda, indexada por faixas de ELO.
+
+    Os jogadores ficam em baldes de `MM_BALDE` pontos (cada balde em ordem de
+    chegada) e as chaves dos baldes não vazios ficam numa lista ordenada. O
+    jogador mais antigo de cada balde é a âncora: a partida é completada com
+    quem está mais perto do ELO dela, visitando os baldes de dentro para fora
+    até o limite da janela, que cresce com o tempo de espera.
+
+    Uma rodada só tenta os baldes cujo resultado pode ter mudado: os marcados
+    por uma entrada ao alcance da âncora ou por troca de âncora, e os que
+    venceram na agenda (momento em que a janela da âncora alcança o próximo
+    jogador que ficou de fora). Assim o custo não cresce com o tamanho da fila.
+    """
+
+    ALCANCE_MAX = MM_JANELA_MAX // MM_BALDE + 1  # Baldes que uma entrada nova pode interessar, para cada lado
+
+    def __init__(self):
+        self._entradas: Dict[int, EntradaFila] = {}
+        self._baldes: Dict[int, Dict[int, EntradaFila]] = {}
+        self._chaves: List[int] = []
+        self._pendentes: set = set()  # Baldes a tentar na próxima rodada
+        self._agenda: List[Tuple[float, int]] = []  # Heap de (momento, balde) para tentar de novo
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def __contains__(self, discord_id: int) -> bool:
+        return discord_id in self._entradas
+
+    def entrada(self, discord_id: int) -> Optional[EntradaFila]:
+        return self._entradas.get(discord_id)
+
+    def entrar(self, membro: discord.Member, elo: int, canal: discord.abc.Messageable, agora: Optional[float] = None) -> bool:
+        """Coloca o jogador na fila; False se ele já estava nela."""
+        if membro.id in self._entradas:
+            return False
+        agora = time.monotonic() if agora is None else agora
+        self._inserir(EntradaFila(membro, elo, canal, agora), agora)
+        return True
+
+    def devolver(self, entradas: List[EntradaFila], agora: Optional[float] = None):
+        """Recoloca entradas tiradas por uma rodada cuja partida não começou, mantendo o tempo de espera."""
+        agora = time.monotonic() if agora is None else agora
+        for entrada in entradas:
+            if entrada.membro.id not in self._entradas:
+                self._inserir(entrada, agora)
+
+    def _inserir(self, entrada: EntradaFila, agora: float):
+        elo = entrada.elo
+        chave = elo // MM_BALDE
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = {}
+            bisect.insort(self._chaves, chave)
+        mais_antiga = balde and entrada.desde < next(reversed(balde.values())).desde
+        balde[entrada.membro.id] = entrada
+        if mais_antiga:
+            # Entrada devolvida: mantém o balde em ordem de chegada (a âncora é a mais antiga)
+            self._baldes[chave] = dict(sorted(balde.items(), key=lambda item: item[1].desde))
+        self._entradas[entrada.membro.id] = entrada
+        
+        # Âncoras que já alcançam o novo jogador podem fechar uma partida agora
+        self._pendentes.add(chave)
+        inicio = bisect.bisect_left(self._chaves, chave - self.ALCANCE_MAX)
+        fim = bisect.bisect_right(self._chaves, chave + self.ALCANCE_MAX)
+        for vizinho in self._chaves[inicio:fim]:
+            ancora = next(iter(self._baldes[vizinho].values()))
+            if abs(ancora.elo - elo) <= janela_matchmaking(agora - ancora.desde):
+                self._pendentes.add(vizinho)
+
+    def sair(self, discord_id: int) -> Optional[EntradaFila]:
+        entrada = self._entradas.pop(discord_id, None)
+        if entrada is None:
+            return None
+        chave = entrada.elo // MM_BALDE
+        balde = self._baldes[chave]
+        era_ancora = next(iter(balde)) == discord_id
+        del balde[discord_id]
+        if not balde:
+            del self._baldes[chave]
+            self._chaves.pop(bisect.bisect_left(self._chaves, chave))
+            self._pendentes.discard(chave)
+        elif era_ancora:
+            self._pendentes.add(chave)
+        return entrada
+
+    def _formar(self, ancora: EntradaFila, janela: int) -> Tuple[Optional[List[EntradaFila]], Optional[int]]:
+        """Âncora e os jogadores mais próximos dela dentro da janela.
+
+        Se não houver jogadores suficientes, retorna `(None, distancia)`: a menor
+        diferença de ELO que ficou de fora (None se não há mais ninguém).
+        """
+        grupo = [ancora]
+        fora: Optional[int] = None
+        direita = bisect.bisect_left(self._chaves, ancora.elo // MM_BALDE)
+        esquerda = direita - 1
+        while len(grupo) < MAX_JOGADORES:
+            # Distância da âncora até a borda mais próxima de cada balde candidato
+            distancia_direita = (
+                max(self._chaves[direita] * MM_BALDE - ancora.elo, 0) if direita < len(self._chaves) else None
+            )
+            distancia_esquerda = (
+                ancora.elo - (self._chaves[esquerda] * MM_BALDE + MM_BALDE - 1) if esquerda >= 0 else None
+            )
+            if distancia_esquerda is None and distancia_direita is None:
+                return None, fora
+            if distancia_esquerda is None or (distancia_direita is not None and distancia_direita <= distancia_esquerda):
+                distancia, chave = distancia_direita, self._chaves[direita]
+                direita += 1
+            else:
+                distancia, chave = distancia_esquerda, self._chaves[esquerda]
+                esquerda -= 1
+            if distancia > janela:
+                return None, distancia if fora is None else min(fora, distancia)
+            for entrada in self._baldes[chave].values():
+                diferenca = abs(entrada.elo - ancora.elo)
+                if entrada is ancora:
+                    continue
+                if diferenca > janela:
+                    fora = diferenca if fora is None else min(fora, diferenca)
+                    continue
+                grupo.append(entrada)
+                if len(grupo) == MAX_JOGADORES:
+                    break
+        return grupo, None
+
+    def rodada(self, agora: Optional[float] = None) -> List[List[EntradaFila]]:
+        """Forma todas as partidas possíveis agora e as retira da fila."""
+        agora = time.monotonic() if agora is None else agora
+        while self._agenda and self._agenda[0][0] <= agora:
+            self._pendentes.add(heapq.heappop(self._agenda)[1])
+        if len(self._entradas) < MAX_JOGADORES:
+            return []
+        
+        # Baldes marcados durante a rodada (troca de âncora) ficam para a próxima
+        pendentes, self._pendentes = self._pendentes, set()
+        partidas = []
+        for chave in sorted(pendentes):
+            while len(self._entradas) >= MAX_JOGADORES and chave in self._baldes:
+                ancora = next(iter(self._baldes[chave].values()))
+                grupo, distancia = self._formar(ancora, janela_matchmaking(agora - ancora.desde))
+                if grupo is None:
+                    if distancia is not None and distancia <= MM_JANELA_MAX:
+                        momento = ancora.desde + max(distancia - MM_JANELA_INICIAL, 0) / MM_JANELA_POR_SEGUNDO
+                        heapq.heappush(self._agenda, (momento, chave))
+                    break
+                for entrada in grupo:
+                    self.sair(entrada.membro.id)
+                partidas.append(grupo)
+            self._pendentes.discard(chave)
+        return partidas
+
+class ServicoMatchmaking:
+    """Roda as filas de todas as guildas em um único laço e leva as partidas formadas para lobbies.
+
+    O laço só existe enquanto houver alguém em alguma fila; é criado de novo na
+    próxima entrada.
+    """
+
+    def __init__(self, intervalo: float = MM_INTERVALO):
+        self.intervalo = intervalo
+        self.partidas_formadas = 0
+        self._guildas: set = set()  # Guildas com jogadores na fila
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def entrar(self, estado: EstadoGuild, membro: discord.Member, elo: int, canal: discord.abc.Messageable) -> bool:
+        if not estado.fila.entrar(membro, elo, canal):
+            return False
+        self._acordar(estado.guild_id)
+        return True
+
+    def _acordar(self, guild_id: int):
+        self._guildas.add(guild_id)
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._executar())
+
+    async def _executar(self):
+        while self._guildas:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.rodada()
+            except Exception as e:
+                logger.error(f"Erro na rodada de matchmaking: {e}")
+
+    async def rodada(self, agora: Optional[float] = None) -> int:
+        """Uma rodada em todas as guildas; retorna quantas partidas foram formadas."""
+        formadas = []
+        for guild_id in list(self._guildas):
+            estado = estado_guild(guild_id)
+            inicio = time.perf_counter()
+            for grupo in estado.fila.rodada(agora):
+                lobby = estado.lobbies.criar()
+                for entrada in grupo:
+                    estado.lobbies.adicionar_jogador(lobby, entrada.membro)
+                formadas.append((estado, lobby, grupo))
+            metricas.observar("r6_matchmaking_rodada_segundos", time.perf_counter() - inicio)
+            if not estado.fila:
+                self._guildas.discard(guild_id)
+        
+        for estado, lobby, grupo in formadas:
+            await self._iniciar(estado, lobby, grupo)
+        self.partidas_formadas += len(formadas)
+        return len(formadas)
+
+    async def _iniciar(self, estado: EstadoGuild, lobby: Lobby, grupo: List[EntradaFila]):
+        canal = grupo[0].canal  # Canal onde a âncora, a mais antiga da fila, entrou
+        try:
+            async with lobby.trava:
+                elos = [entrada.elo for entrada in grupo]
+                await canal.send(
+                    f"🎯 Partida encontrada no **Lobby {lobby.numero}** (ELO {min(elos)}–{max(elos)}): "
+                    + " ".join(entrada.membro.mention for entrada in grupo)
+                )
+                await iniciar_partida(estado, lobby, canal)
+        except Exception as e:
+            logger.error(f"Erro ao iniciar o {lobby.id} formado pelo matchmaking: {e}")
+            async with lobby.trava:
+                devolver = lobby.estado == LOBBY_AGUARDANDO
+                if devolver:
+                    # A partida não começou: os jogadores voltam para a fila com o tempo de espera que já tinham
+                    estado.lobbies.reciclar(lobby)
+                    estado.fila.devolver(grupo)
+            if devolver:
+                # Os temporizadores de espera continuam valendo para quem voltou à fila
+                self._acordar(estado.guild_id)
+                return
+        await agendador.cancelar(*(_chave_espera(estado.guild_id, entrada.membro.id) for entrada in grupo))
+
+matchmaking = ServicoMatchmaking()
+
+# --- Arquivo de Prints ---
+
+CAPTURAS_DIR = os.getenv("R6_CAPTURAS_DIR", "capturas")
+CAPTURA_LADO_MAX = 1920    # Maior lado (px) da cópia arquivada; ainda legível para reprocessar o OCR
+CAPTURA_QUALIDADE = 85     # Qualidade WebP da cópia arquivada
+CAPTURA_TAMANHO_MAX = 10 * 1024 * 1024
+
+EXTENSOES_IMAGEM = {b"\x89PNG": "png", b"\xff\xd8\xff": "jpg", b"RIFF": "webp", b"GIF8": "gif"}
+
+class Captura:
+    """Print de resultado baixado uma única vez: bytes originais e o registro no arquivo."""
+    __slots__ = ("dados", "nome", "hash", "arquivo", "tamanho_original", "tamanho_arquivo", "comprimido")
+
+    def __init__(self, dados: bytes, nome_original: str):
+        self.dados = dados
+        self.hash = hashlib.sha256(dados).hexdigest()
+        # Nome seguro para `attachment://` no embed do resultado
+        self.nome = f"resultado_{self.hash[:12]}{os.path.splitext(nome_original)[1].lower() or '.png'}"
+        self.arquivo: Optional[str] = None
+        self.tamanho_original = len(dados)
+        self.tamanho_arquivo = 0
+        self.comprimido: Optional[bytes] = None  # Cópia preparada que ainda não foi gravada no disco
+
+    def arquivo_discord(self) -> discord.File:
+        """Reenvia os bytes já em memória, sem baixar o anexo de novo."""
+        return discord.File(BytesIO(self.dados), filename=self.nome)
+
+async def baixar_captura(anexo: discord.Attachment) -> Captura:
+    """Baixa o anexo para a memória (o único download do print)."""
+    if anexo.size > CAPTURA_TAMANHO_MAX:
+        raise ValueError("O print é grande demais para ser processado.")
+    return Captura(await anexo.read(), anexo.filename)
+
+def _comprimir_captura(dados: bytes) -> Tuple[bytes, str]:
+    """Reduz o print para WebP com no máximo `CAPTURA_LADO_MAX` px (sem Pillow, mantém o original)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        try:
+            imagem = Image.open(BytesIO(dados))
+            imagem.thumbnail((CAPTURA_LADO_MAX, CAPTURA_LADO_MAX))
+            saida = BytesIO()
+            imagem.convert("RGB").save(saida, "WEBP", quality=CAPTURA_QUALIDADE, method=4)
+            if saida.tell() < len(dados):
+                return saida.getvalue(), "webp"
+        except Exception as e:
+            logger.warning(f"Não foi possível comprimir o print, arquivando o original: {e}")
+    extensao = next((ext for assinatura, ext in EXTENSOES_IMAGEM.items() if dados.startswith(assinatura)), "bin")
+    return dados, extensao
+
+class ArquivoCapturas:
+    """Armazém local de prints endereçado pelo conteúdo.
+
+    O nome de cada arquivo é o SHA-256 dos bytes originais, então o mesmo print
+    é gravado uma única vez e pode ser reprocessado depois sem acessar o
+    Discord. A compressão e a escrita atômica rodam fora do loop.
+
+    O print é preparado (nome e cópia comprimida em memória) antes de a partida
+    ser gravada e só vai para o disco depois: um print recusado pelo OCR ou pelo
+    banco não deixa arquivo órfão.
+    """
+
+    def __init__(self, diretorio: str = CAPTURAS_DIR):
+        self.diretorio = diretorio
+
+    def _caminho(self, arquivo: str) -> str:
+        return os.path.join(self.diretorio, arquivo)
+
+    def _gravar(self, arquivo: str, dados: bytes):
+        caminho = self._caminho(arquivo)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as saida:
+                saida.write(dados)
+            os.replace(temporario, caminho)
+
+    async def preparar(self, captura: Captura) -> Captura:
+        """Preenche `arquivo`/`tamanho_arquivo` (reaproveitando a cópia existente) sem gravar no disco."""
+        linha = await db.buscar_um("SELECT arquivo, tamanho_arquivo FROM capturas WHERE hash = ?", (captura.hash,))
+        if linha and os.path.exists(self._caminho(linha["arquivo"])):
+            captura.arquivo, captura.tamanho_arquivo = linha["arquivo"], linha["tamanho_arquivo"]
+        else:
+            loop = asyncio.get_running_loop()
+            dados, extensao = await loop.run_in_executor(None, _comprimir_captura, captura.dados)
+            captura.arquivo = os.path.join(captura.hash[:2], f"{captura.hash}.{extensao}")
+            captura.tamanho_arquivo = len(dados)
+            captura.comprimido = dados
+        return captura
+
+    async def guardar(self, captura: Captura):
+        """Grava a cópia preparada (chamada depois de a partida ser gravada)."""
+        if captura.comprimido is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._gravar, captura.arquivo, captura.comprimido)
+        captura.comprimido = None
+
+    async def ler(self, arquivo: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._ler_arquivo, self._caminho(arquivo))
+
+    @staticmethod
+    def _ler_arquivo(caminho: str) -> bytes:
+        with open(caminho, "rb") as entrada:
+            return entrada.read()
+
+arquivo_capturas = ArquivoCapturas()
+
+async def partida_com_captura(guild_id: int, hash_captura: str) -> Optional[sqlite3.Row]:
+    """Partida da guilda já registrada com este print, se houver."""
+    return await db.buscar_um(
+        "SELECT id, lobby_id, data_partida FROM partidas WHERE guild_id = ? AND captura_hash = ?",
+        (guild_id, hash_captura)
+    )
+
+# --- Processamento de Resultados (OCR) ---
+
+OCR_BACKEND = os.getenv("OCR_BACKEND", "simulado")
+OCR_PROCESSOS = 2          # Processos dedicados ao OCR
+OCR_FILA_MAX = 6           # Jobs em execução ou aguardando; acima disso novos envios são recusados
+OCR_TIMEOUT = 60           # Segundos por job
+
+class PipelineOcupado(Exception):
+    """A fila de processamento de resultados está cheia."""
+
+class PipelineResultados:
+    """Pipeline de extração de resultados fora do loop de eventos.
+
+    Recebe os bytes já baixados do print (veja `baixar_captura`). As etapas de
+    pré-processamento, OCR e mapeamento dos nomes para os jogadores do lobby
+    rodam em um `ProcessPoolExecutor` limitado, com processos iniciados por
+    "spawn" (um fork herdaria as travas das threads do banco) que executam os
+    backends do módulo `ocr`. Envios acima de `fila_max` são recusados com
+    `PipelineOcupado`. Um job que estoura o
+    timeout está com o processo preso: o pool é descartado e seus processos
+    encerrados, liberando as vagas; os outros jobs que estavam nele são
+    reenviados ao pool novo.
+    """
+
+    def __init__(self, backend: str = OCR_BACKEND, processos: int = OCR_PROCESSOS,
+                 fila_max: int = OCR_FILA_MAX, timeout: float = OCR_TIMEOUT):
+        if backend not in BACKENDS_OCR:
+            raise ValueError(f"Backend de OCR desconhecido: {backend}")
+        self.backend = backend
+        self.processos = processos
+        self.fila_max = fila_max
+        self.timeout = timeout
+        self.ocupados = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _descartar(self, executor: ProcessPoolExecutor):
+        """Encerra os processos de `executor`; o próximo job cria um pool novo."""
+        if executor is self._executor:
+            self._executor = None
+        for processo in list((executor._processes or {}).values()):
+            processo.terminate()
+        executor.shutdown(wait=False)
+
+    def aquecer(self):
+        """Inicia os processos do pool antes do primeiro print (cada um sobe um interpretador novo)."""
+        executor = self._obter_executor()
+        for _ in range(self.processos):
+            executor.submit(aquecer)
+
+    async def processar(self, dados: bytes, nicknames: List[str]) -> dict:
+        if self.ocupados >= self.fila_max:
+            raise PipelineOcupado("Muitos resultados sendo processados. Tente novamente em instantes.")
+        
+        self.ocupados += 1
+        try:
+            while True:
+                executor = self._obter_executor()
+                futuro = executor.submit(executar_ocr, self.backend, dados, nicknames)
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+                except asyncio.TimeoutError:
+                    self._descartar(executor)
+                    metricas.incrementar("r6_ocr_pool_reiniciado_total")
+                    raise TimeoutError("O processamento do print excedeu o tempo limite.")
+                except BrokenProcessPool:
+                    if executor is self._executor:
+                        # Um processo morreu sozinho: o pool não serve mais
+                        self._descartar(executor)
+                        raise
+                    # O pool foi descartado pelo timeout de outro job; tenta no novo
+        finally:
+            self.ocupados -= 1
+
+    def fechar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+pipeline_resultados = PipelineResultados()
+metricas.medidor("r6_ocr_ocupados", lambda: pipeline_resultados.ocupados)
+
+# --- Backup e Exportação ---
+
+BACKUP_DIR = os.getenv("R6_BACKUP_DIR", "backups")
+BACKUP_INTERVALO = float(os.getenv("R6_BACKUP_INTERVALO_HORAS", "6")) * 3600  # 0 desativa o backup agendado
+BACKUP_MANTER = 7                 # Cópias mantidas no diretório; as mais antigas são apagadas
+BACKUP_PAGINAS_POR_PASSO = 1024   # Páginas copiadas por passo da API de backup (4 MiB com páginas de 4 KiB)
+BACKUP_PAUSA = 0.005              # Segundos entre passos, para não disputar o disco com a thread de escrita
+
+def _copiar_banco(destino: str) -> Tuple[int, int]:
+    """Copia o banco para `destino` com a API de backup do SQLite, em passos (roda numa thread).
+
+    A cópia parte de um snapshot de leitura (WAL): o bot continua gravando
+    durante o backup e essas escritas não fazem a cópia recomeçar. A cópia é
+    verificada com `quick_check` antes de substituir o destino. Retorna
+    (páginas, passos).
+    """
+    temporario = f"{destino}.tmp"
+    passos = 0
+    
+    def progresso(status, restantes, total):
+        nonlocal passos
+        passos += 1
+        time.sleep(BACKUP_PAUSA)
+    
+    origem = get_db_connection()
+    try:
+        origem.execute("BEGIN")
+        origem.execute("SELECT 1 FROM sqlite_master").fetchone()  # Fixa o snapshot de leitura
+        copia = sqlite3.connect(temporario)
+        try:
+            origem.backup(copia, pages=BACKUP_PAGINAS_POR_PASSO, progress=progresso)
+            verificacao = copia.execute("PRAGMA quick_check").fetchone()[0]
+            paginas = copia.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            copia.close()
+        if verificacao != "ok":
+            raise sqlite3.DatabaseError(f"A cópia não passou na verificação: {verificacao}")
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    finally:
+        origem.close()
+    return paginas, passos
+
+def _rotacionar_backups(diretorio: str, prefixo: str, manter: int):
+    """Apaga as cópias mais antigas, mantendo as `manter` mais recentes (o nome tem a data)."""
+    copias = sorted(nome for nome in os.listdir(diretorio) if nome.startswith(prefixo) and nome.endswith(".db"))
+    for nome in copias[:-manter]:
+        os.remove(os.path.join(diretorio, nome))
+
+class ServicoBackup:
+    """Backups online do banco, agendados e sob demanda.
+
+    A cópia roda numa thread e o loop só aguarda o resultado. O horário do
+    último backup fica nas configurações, então reiniciar o bot não adianta
+    nem atrasa o próximo.
+    """
+
+    def __init__(self, diretorio: str = BACKUP_DIR, intervalo: float = BACKUP_INTERVALO, manter: int = BACKUP_MANTER):
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.manter = manter
+        self.prefixo = os.path.splitext(os.path.basename(DB_PATH))[0] + "-"
+        self._em_andamento = False
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def _executar(self, destino: str) -> Tuple[int, int]:
+        os.makedirs(self.diretorio, exist_ok=True)
+        resultado = _copiar_banco(destino)
+        _rotacionar_backups(self.diretorio, self.prefixo, self.manter)
+        return resultado
+
+    async def executar(self) -> Tuple[str, int, float]:
+        """Faz um backup agora; retorna (caminho, bytes, segundos)."""
+        if self._em_andamento:
+            raise RuntimeError("Já existe um backup em andamento.")
+        self._em_andamento = True
+        try:
+            destino = os.path.join(self.diretorio, f"{self.prefixo}{time.strftime('%Y%m%d-%H%M%S')}.db")
+            loop = asyncio.get_running_loop()
+            inicio = time.perf_counter()
+            try:
+                paginas, passos = await loop.run_in_executor(None, self._executar, destino)
+            except Exception:
+                metricas.incrementar("r6_backups_total", resultado="erro")
+                raise
+            duracao = time.perf_counter() - inicio
+        finally:
+            self._em_andamento = False
         
-        view = RegistroView(member.id)
-        await canal_boas_vindas.send(f"{member.mention}", embed=embed, view=view)
+        metricas.incrementar("r6_backups_total", resultado="ok")
+        metricas.observar("r6_backup_segundos", duracao)
+        await salvar_configuracao("backup_ultimo", str(time.time()))
+        tamanho = os.path.getsize(destino)
+        logger.info(f"Backup gravado em {destino}: {tamanho / 1024 ** 2:.1f} MiB em {passos} passo(s), {duracao:.1f}s.")
+        return destino, tamanho, duracao
+
+    async def _agendar(self, espera: float):
+        while True:
+            await asyncio.sleep(espera)
+            espera = self.intervalo
+            try:
+                await self.executar()
+            except Exception as e:
+                logger.error(f"Erro no backup agendado: {e}")
+
+    async def iniciar(self):
+        """Agenda os backups periódicos a partir do último registrado (uma vez por processo)."""
+        if self.intervalo <= 0 or self._tarefa is not None:
+            return
+        ultimo = float(await obter_configuracao("backup_ultimo") or 0)
+        self._tarefa = asyncio.create_task(self._agendar(max(0.0, ultimo + self.intervalo - time.time())))
+
+servico_backup = ServicoBackup()
+
+EXPORTACAO_DIR = os.getenv("R6_EXPORTACAO_DIR", "exportacoes")
+EXPORTACAO_LOTE = 5000  # Linhas lidas do cursor por vez; é o que limita a memória da exportação
+EXPORTACAO_COMPRESSAO = 6  # Nível do gzip; o 9 (padrão) custa o dobro do tempo para poucos % a menos
+FORMATOS_EXPORTACAO = {"csv": "csv.gz", "parquet": "parquet"}
+
+# Consultas de cada tabela exportada, filtradas pela guilda e sem ordenação em memória
+EXPORTACOES = {
+    "jogadores": "SELECT * FROM jogadores WHERE guild_id = ? ORDER BY discord_id",
+    "partidas": "SELECT * FROM partidas WHERE guild_id = ? ORDER BY id",
+    "partida_jogadores": '''
+    SELECT pj.* FROM partidas p
+    JOIN partida_jogadores pj ON pj.partida_id = p.id
+    WHERE p.guild_id = ?
+    ORDER BY p.id, pj.id
+    ''',
+}
+
+def _lotes(cursor: sqlite3.Cursor):
+    """Gera as linhas do cursor em lotes de `EXPORTACAO_LOTE`."""
+    while True:
+        lote = cursor.fetchmany(EXPORTACAO_LOTE)
+        if not lote:
+            return
+        yield lote
+
+def _escrever_csv(caminho: str, colunas: List[str], tipos: Dict[str, str], lotes) -> int:
+    linhas = 0
+    with gzip.open(caminho, "wt", compresslevel=EXPORTACAO_COMPRESSAO, encoding="utf-8", newline="") as saida:
+        escritor = csv.writer(saida)
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+            linhas += len(lote)
+    return linhas
+
+def _escrever_parquet(caminho: str, colunas: List[str], tipos: Dict[str, str], lotes) -> int:
+    """Cada lote vira um row group; os tipos vêm das colunas declaradas na tabela."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    tipos_arrow = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+    esquema = pa.schema([(coluna, tipos_arrow.get(tipos.get(coluna, ""), pa.string())) for coluna in colunas])
+    linhas = 0
+    with pq.ParquetWriter(caminho, esquema, compression="zstd") as escritor:
+        for lote in lotes:
+            arrays = [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*lote), esquema)]
+            escritor.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+            linhas += len(lote)
+    return linhas
+
+ESCRITORES_EXPORTACAO = {"csv": _escrever_csv, "parquet": _escrever_parquet}
+
+def _exportar_tabelas(guild_id: int, tabelas: List[str], formato: str, diretorio: str) -> List[Tuple[str, str, int]]:
+    """Exporta as tabelas da guilda para arquivos em `diretorio` (executado numa thread).
+
+    Todas as tabelas saem do mesmo snapshot de leitura (WAL). As linhas vão do
+    cursor para o arquivo comprimido lote a lote, então a memória não cresce
+    com o tamanho da tabela. Retorna (tabela, caminho, linhas) de cada arquivo.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    carimbo = time.strftime("%Y%m%d-%H%M%S")
+    escrever = ESCRITORES_EXPORTACAO[formato]
+    gerados: List[Tuple[str, str, int]] = []
+    caminho = None
+    conn = get_db_connection()
+    conn.row_factory = None  # Tuplas simples: menos objetos por linha
+    try:
+        conn.execute("BEGIN")
+        for tabela in tabelas:
+            cursor = conn.execute(EXPORTACOES[tabela], (guild_id,))
+            colunas = [descricao[0] for descricao in cursor.description]
+            tipos = {linha[1]: linha[2].upper() for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+            caminho = os.path.join(diretorio, f"{guild_id}-{carimbo}-{tabela}.{FORMATOS_EXPORTACAO[formato]}")
+            gerados.append((tabela, caminho, escrever(caminho, colunas, tipos, _lotes(cursor))))
+            caminho = None
+        conn.rollback()
+    except BaseException:
+        for arquivo in [arquivo for _, arquivo, _ in gerados] + ([caminho] if caminho else []):
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+        raise
+    finally:
+        conn.close()
+    return gerados
+
+_exportacao_em_andamento = False
+
+async def exportar_estatisticas(guild_id: int, tabelas: List[str], formato: str) -> List[Tuple[str, str, int]]:
+    """Exporta as tabelas numa thread com conexão própria, sem ocupar as conexões de leitura do bot.
+
+    Não usa um processo separado: um fork com as threads do banco em atividade
+    pode herdar travas já adquiridas e travar o processo filho.
+    """
+    global _exportacao_em_andamento
+    if _exportacao_em_andamento:
+        raise RuntimeError("Já existe uma exportação em andamento.")
+    _exportacao_em_andamento = True
+    try:
+        loop = asyncio.get_running_loop()
+        inicio = time.perf_counter()
+        gerados = await loop.run_in_executor(None, _exportar_tabelas, guild_id, tabelas, formato, EXPORTACAO_DIR)
+    finally:
+        _exportacao_em_andamento = False
+    metricas.observar("r6_exportacao_segundos", time.perf_counter() - inicio, formato=formato)
+    metricas.incrementar("r6_exportacao_linhas_total", sum(linhas for _, _, linhas in gerados), formato=formato)
+    return gerados
+
+# --- Comandos do Bot ---
+
+# Comando para registro manual
+@bot.command(name='registrar')
+@commands.guild_only()
+async def registrar(ctx):
+    """Comando para se registrar no sistema competitivo"""
+    view = view_persistente(BotaoRegistro(ctx.author.id))
+    await ctx.send(
+        f"{ctx.author.mention}, clique para se registrar no sistema competitivo:",
+        view=view
+    )
 
-# Evento que confirma que o bot está online
-@bot.event
-async def on_ready():
-    logger.info(f"Bot {bot.user.name} está online!")
+# Comando para entrar em um lobby
+@bot.command(name='entrar')
+@commands.guild_only()
+async def entrar(ctx):
+    """Entra na fila de partidas (os times são formados por proximidade de ELO)"""
+    membro = ctx.author
+    estado = estado_guild(ctx.guild.id)
+    jogador = await get_jogador_by_id(ctx.guild.id, membro.id)
     
-    # Garantir que o bot está em pelo menos um servidor
-    if not bot.guilds:
-        logger.error("O bot não está em nenhum servidor.")
+    if not jogador or not jogador["r6_nickname"]:
+        await ctx.send(f"{membro.mention}, registre-se primeiro com `!registrar`!")
         return
-        
-    # Configurar categorias e canais
-    await configurar_canais(bot.guilds[0])
-    
-    try:
-        await bot.tree.sync()
-        logger.info("Comandos de aplicação sincronizados.")
-    except Exception as e:
-        logger.error(f"Erro ao sincronizar comandos: {e}")
-
-
-async def configurar_canais(guild: discord.Guild):
-    """Configura os canais e categorias necessários na Guilda (Servidor)."""
-    global categoria_partidas, categoria_lobbies, canal_resultados, canal_boas_vindas
     
-    # 1. Encontrar ou criar categorias
-    for categoria in guild.categories:
-        if categoria.name == "PARTIDAS":
-            categoria_partidas = categoria
-        elif categoria.name == "LOBBYS":
-            categoria_lobbies = categoria
+    suspensao = agendador.prazo(_chave_suspensao(ctx.guild.id, membro.id))
+    if suspensao:
+        await ctx.send(f"{membro.mention}, você está suspenso das partidas. A suspensão termina <t:{int(suspensao)}:R>.")
+        return
     
-    if not categoria_partidas:
-        categoria_partidas = await guild.create_category("PARTIDAS")
+    if estado.lobbies.lobby_do_jogador(membro.id):
+        await ctx.send(f"{membro.mention}, você já está em um lobby!")
+        return
     
-    if not categoria_lobbies:
-        categoria_lobbies = await guild.create_category("LOBBYS")
+    if not matchmaking.entrar(estado, membro, jogador["elo"], ctx.channel):
+        # Usar o comando de novo renova a vaga na fila
+        await agendar_espera(ctx)
+        await ctx.send(f"{membro.mention}, você já está na fila! ({len(estado.fila)} aguardando)")
+        return
     
-    # 2. Configurar ou criar a categoria RECURSOS e canal de boas-vindas
-    recursos_categoria = discord.utils.get(guild.categories, name="RECURSOS")
+    await agendar_espera(ctx)
+    await ctx.send(
+        f"{membro.mention} entrou na fila de partidas (ELO {jogador['elo']}) • {len(estado.fila)} aguardando"
+    )
+
+def _chave_espera(guild_id: int, discord_id: int) -> str:
+    return f"espera:{guild_id}:{discord_id}"
+
+def _chave_suspensao(guild_id: int, discord_id: int) -> str:
+    return f"suspensao:{guild_id}:{discord_id}"
+
+async def agendar_espera(ctx):
+    """Tira o autor da fila se ele não entrar em uma partida em TIMEOUT_DURATION segundos."""
+    await agendador.agendar(
+        _chave_espera(ctx.guild.id, ctx.author.id), "espera_lobby", TIMEOUT_DURATION,
+        guild_id=ctx.guild.id, discord_id=ctx.author.id, canal_id=ctx.channel.id
+    )
+
+async def remover_do_lobby(estado: EstadoGuild, discord_id: int, numero: Optional[int] = None) -> Optional[Tuple[Lobby, discord.Member]]:
+    """Tira o jogador do lobby em espera em que ele está, reciclando o lobby se esvaziar."""
+    lobby = estado.lobbies.lobby_do_jogador(discord_id)
+    if lobby is None or (numero is not None and lobby.numero != numero):
+        return None
+    async with lobby.trava:
+        if lobby.estado != LOBBY_AGUARDANDO or estado.lobbies.lobby_do_jogador(discord_id) is not lobby:
+            return None
+        membro = next(j for j in lobby.jogadores if j.id == discord_id)
+        estado.lobbies.remover_jogador(lobby, membro)
+        if not lobby.jogadores:
+            estado.lobbies.reciclar(lobby)
+    return lobby, membro
+
+@agendador.tratador("espera_lobby")
+async def expirar_espera(guild_id: int, discord_id: int, canal_id: int, numero: Optional[int] = None):
+    canal = bot.get_channel(canal_id)
+    if numero is None:
+        entrada = estado_guild(guild_id).fila.sair(discord_id)
+        if entrada and canal:
+            await canal.send(f"{entrada.membro.mention} foi removido da fila de partidas por inatividade.")
+        return
+    # Temporizadores gravados antes do matchmaking apontam para um lobby em espera
+    removido = await remover_do_lobby(estado_guild(guild_id), discord_id, numero)
+    if removido and canal:
+        await canal.send(f"{removido[1].mention} foi removido do **Lobby {numero}** por inatividade.")
+
+@agendador.tratador("suspensao")
+async def expirar_suspensao(guild_id: int, discord_id: int):
+    logger.info(f"Suspensão de {discord_id} na guilda {guild_id} encerrada.")
+
+# Comando para sair do lobby
+@bot.command(name='sair')
+@commands.guild_only()
+async def sair(ctx):
+    """Sai da fila de partidas ou do lobby atual (apenas antes da partida começar)"""
+    membro = ctx.author
+    estado = estado_guild(ctx.guild.id)
+    if estado.fila.sair(membro.id):
+        await agendador.cancelar(_chave_espera(ctx.guild.id, membro.id))
+        await ctx.send(f"{membro.mention} saiu da fila de partidas.")
+        return
     
-    if not recursos_categoria:
-        recursos_categoria = await guild.create_category("RECURSOS")
-        
-    canal_boas_vindas = discord.utils.get(recursos_categoria.text_channels, name="boas-vindas")
+    gerenciador_lobbies = estado.lobbies
+    lobby = gerenciador_lobbies.lobby_do_jogador(membro.id)
     
-    if not canal_boas_vindas:
-        canal_boas_vindas = await recursos_categoria.create_text_channel("boas-vindas")
-        
-        # Mensagem de boas-vindas inicial (apenas se o canal for novo)
-        embed = discord.Embed(
-            title="🎮 Bem-vindo ao Servidor de Rainbow Six Siege Competitivo!",
-            description="Este é o hub central para competições de R6. Clique no botão de **registro** para participar!",
-            color=discord.Color.gold()
-        )
-        await canal_boas_vindas.send(embed=embed)
+    if not lobby:
+        await ctx.send(f"{membro.mention}, você não está em nenhum lobby!")
+        return
     
-    # 3. Encontrar ou criar canal de resultados
-    canal_resultados = discord.utils.get(categoria_partidas.text_channels, name="resultados-partidas")
+    async with lobby.trava:
+        if lobby.estado != LOBBY_AGUARDANDO:
+            await ctx.send(f"{membro.mention}, a partida do Lobby {lobby.numero} já começou!")
+            return
+        gerenciador_lobbies.remover_jogador(lobby, membro)
+        if not lobby.jogadores:
+            gerenciador_lobbies.reciclar(lobby)
     
-    if not canal_resultados:
-        canal_resultados = await categoria_partidas.create_text_channel("resultados-partidas")
-        
-        # Configurar permissões do canal de resultados (somente admins/bot podem ver)
-        overwrites = {
-            guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        }
-        
-        for role in guild.roles:
-            if role.permissions.administrator:
-                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        
-        await canal_resultados.edit(overwrites=overwrites)
+    await agendador.cancelar(_chave_espera(ctx.guild.id, membro.id))
+    await ctx.send(f"{membro.mention} saiu do **Lobby {lobby.numero}**.")
 
-# --- Comandos do Bot ---
+# Comando para ver a fila de partidas
+@bot.command(name='fila')
+@commands.guild_only()
+async def fila(ctx):
+    """Mostra quantos jogadores aguardam partida e a sua janela de ELO atual"""
+    fila_guild = estado_guild(ctx.guild.id).fila
+    entrada = fila_guild.entrada(ctx.author.id)
+    mensagem = f"**{len(fila_guild)}** jogador(es) na fila de partidas."
+    if entrada:
+        espera = time.monotonic() - entrada.desde
+        mensagem += (
+            f"\nVocê aguarda há **{int(espera // 60)}min {int(espera % 60)}s** • "
+            f"aceitando ELO entre **{entrada.elo - janela_matchmaking(espera)}** e **{entrada.elo + janela_matchmaking(espera)}**."
+        )
+    await ctx.send(mensagem)
 
-# Comando para registro manual
-@bot.command(name='registrar')
-async def registrar(ctx):
-    """Comando para se registrar no sistema competitivo"""
-    view = RegistroView(ctx.author.id)
-    await ctx.send(
-        f"{ctx.author.mention}, clique para se registrar no sistema competitivo:",
-        view=view
+# Comandos de suspensão temporária
+@bot.command(name='suspender')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def suspender(ctx, membro: discord.Member, minutos: int):
+    """Impede um jogador de entrar em lobbies por alguns minutos"""
+    if minutos <= 0:
+        await ctx.send("Informe a duração da suspensão em minutos.")
+        return
+    
+    await agendador.agendar(
+        _chave_suspensao(ctx.guild.id, membro.id), "suspensao", minutos * 60,
+        guild_id=ctx.guild.id, discord_id=membro.id
     )
+    estado = estado_guild(ctx.guild.id)
+    if estado.fila.sair(membro.id) or await remover_do_lobby(estado, membro.id):
+        await agendador.cancelar(_chave_espera(ctx.guild.id, membro.id))
+    await ctx.send(f"{membro.mention} está suspenso das partidas por {minutos} minuto(s).")
 
-# Comando para ver estatísticas
-@bot.command(name='estatisticas')
-async def estatisticas(ctx, membro: Optional[discord.Member] = None):
-    """Mostra as estatísticas de um jogador"""
+@bot.command(name='liberar')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def liberar(ctx, membro: discord.Member):
+    """Encerra a suspensão de um jogador"""
+    await agendador.cancelar(_chave_suspensao(ctx.guild.id, membro.id))
+    await ctx.send(f"{membro.mention} pode voltar a entrar em lobbies.")
+
+# Comando para ver o histórico de partidas
+@bot.command(name='historico')
+@commands.guild_only()
+async def historico(ctx, membro: Optional[discord.Member] = None):
+    """Mostra as últimas partidas de um jogador"""
     target = membro or ctx.author
-    
-    jogador = get_jogador_by_id(target.id)
+    jogador = await get_jogador_by_id(ctx.guild.id, target.id)
     
     if not jogador or not jogador["r6_nickname"]:
         await ctx.send(f"{target.mention} não está registrado no sistema competitivo!")
         return
     
+    linhas = await paginas_historico.obter(jogador["id"], ">", HISTORICO_INICIO)
+    await ctx.send(**renderizar_historico(ctx.author.id, jogador["id"], jogador, linhas, ">", HISTORICO_INICIO))
+
+def _estatisticas_agregadas(conn: sqlite3.Connection, jogador_id: int) -> Tuple[list, List[sqlite3.Row]]:
+    """Forma recente e vitórias por mapa, lidas dos agregados (uma linha por jogador e por mapa)."""
+    linha = conn.execute("SELECT janela FROM forma_recente WHERE jogador_id = ?", (jogador_id,)).fetchone()
+    marcadores = ",".join("?" * len(mapas))
+    por_mapa = conn.execute(
+        f"""SELECT mapa, partidas, vitorias FROM estatisticas_mapa
+        WHERE jogador_id = ? AND mapa IN ({marcadores}) ORDER BY partidas DESC, mapa""",
+        (jogador_id, *mapas)
+    ).fetchall()
+    return (json.loads(linha["janela"]) if linha else []), por_mapa
+
+def _sparkline(valores: List[int]) -> str:
+    blocos = "▁▂▃▄▅▆▇█"
+    menor, maior = min(valores), max(valores)
+    if maior == menor:
+        return blocos[3] * len(valores)
+    return "".join(blocos[(v - menor) * (len(blocos) - 1) // (maior - menor)] for v in valores)
+
+def _formatar_percentual(valor: float) -> str:
+    return f"{valor:.0f}%" if valor >= 10 else f"{max(valor, 0.1):.1f}%"
+
+async def montar_estatisticas(jogador: "Jogador", membro: Optional[discord.abc.User]) -> discord.Embed:
+    """Embed de estatísticas de um jogador registrado (usado pelo comando de prefixo e pelo slash)."""
     # Calcular KD ratio e Win Rate
-    kd = jogador["kd_ratio"]
+    kd = jogador["kd_ratio"] or 0.0
     partidas = jogador["partidas_jogadas"]
     win_rate = (jogador["vitorias"] / partidas * 100) if partidas > 0 else 0
     
@@ -490,62 +3920,484 @@ async def estatisticas(ctx, membro: Optional[discord.Member] = None):
     embed.add_field(name="Deaths", value=str(jogador["deaths"]), inline=True)
     embed.add_field(name="K/D Ratio", value=f"**{kd:.2f}**", inline=True)
     
-    embed.set_thumbnail(url=target.avatar.url if target.avatar else target.default_avatar.url)
-    await ctx.send(embed=embed)
+    distribuicao = await distribuicao_elo(jogador["guild_id"])
+    posicao = distribuicao.posicao(jogador["discord_id"])
+    if posicao is not None:
+        embed.add_field(
+            name="Posição",
+            value=f"**#{posicao}** de {len(distribuicao)} • top {_formatar_percentual(distribuicao.percentil(jogador['discord_id']))}",
+            inline=False
+        )
+        vizinhos = distribuicao.vizinhos(jogador["discord_id"])
+        if len(vizinhos) > 1:
+            embed.add_field(
+                name="Perto de você",
+                value="\n".join(
+                    f"{'**' if discord_id == jogador['discord_id'] else ''}#{pos} <@{discord_id}> — {elo}"
+                    f"{'**' if discord_id == jogador['discord_id'] else ''}"
+                    for pos, discord_id, elo in vizinhos
+                ),
+                inline=False
+            )
+    
+    janela, por_mapa = await db.ler(_estatisticas_agregadas, jogador["id"])
+    if janela:
+        vitorias = sum(partida[0] for partida in janela)
+        kills = sum(partida[1] for partida in janela)
+        deaths = sum(partida[2] for partida in janela)
+        resultados = "".join("🟩" if partida[0] else "🟥" for partida in janela)
+        embed.add_field(
+            name=f"Forma (últimas {len(janela)})",
+            value=f"{resultados}\n**{vitorias / len(janela) * 100:.0f}%** de vitórias • K/D **{kills / max(deaths, 1):.2f}**",
+            inline=False
+        )
+        elos = [partida[3] for partida in janela]
+        variacao = elos[-1] - (elos[0] - janela[0][4])
+        embed.add_field(name="Tendência de ELO", value=f"`{_sparkline(elos)}` **{variacao:+d}**", inline=False)
+    
+    if por_mapa:
+        linhas_mapa = [
+            f"**{linha['mapa']}**: {linha['vitorias']}/{linha['partidas']} ({linha['vitorias'] / linha['partidas'] * 100:.0f}%)"
+            for linha in por_mapa
+        ]
+        embed.add_field(name="Vitórias por mapa", value="\n".join(linhas_mapa), inline=False)
+    
+    if membro is not None:
+        embed.set_thumbnail(url=membro.avatar.url if membro.avatar else membro.default_avatar.url)
+    return embed
+
+# Comando para ver estatísticas
+@bot.command(name='estatisticas')
+@commands.guild_only()
+async def estatisticas(ctx, membro: Optional[discord.Member] = None):
+    """Mostra as estatísticas de um jogador"""
+    target = membro or ctx.author
+    
+    jogador = await get_jogador_by_id(ctx.guild.id, target.id)
+    
+    if not jogador or not jogador["r6_nickname"]:
+        await ctx.send(f"{target.mention} não está registrado no sistema competitivo!")
+        return
+    
+    await ctx.send(embed=await montar_estatisticas(jogador, target))
+
+# --- Comandos de Barra (slash) ---
+
+async def autocompletar_jogador(interaction: discord.Interaction, atual: str) -> List[app_commands.Choice[str]]:
+    """Sugere jogadores registrados da guilda pelo prefixo do nick do R6 ou do nome no Discord."""
+    indice = await indice_nicks(interaction.guild_id)
+    return [
+        app_commands.Choice(name=(f"{nick} ({nome})" if nome and nome != nick else nick)[:100], value=str(discord_id))
+        for discord_id, nick, nome in indice.buscar(atual)
+    ]
+
+async def _jogador_escolhido(interaction: discord.Interaction, valor: Optional[str]) -> Tuple[Optional[int], Optional["Jogador"]]:
+    """Resolve a opção do autocomplete (ou o texto digitado) para o jogador registrado."""
+    if valor is None:
+        discord_id = interaction.user.id
+    else:
+        discord_id = (await indice_nicks(interaction.guild_id)).resolver(valor)
+        if discord_id is None:
+            return None, None
+    jogador = await get_jogador_by_id(interaction.guild_id, discord_id)
+    if not jogador or not jogador["r6_nickname"]:
+        return discord_id, None
+    return discord_id, jogador
+
+async def _responder_nao_registrado(interaction: discord.Interaction, discord_id: Optional[int], valor: Optional[str]):
+    if discord_id is None:
+        mensagem = f"Nenhum jogador registrado encontrado para **{discord.utils.escape_markdown(valor or '')}**."
+    else:
+        mensagem = f"<@{discord_id}> não está registrado no sistema competitivo!"
+    await interaction.response.send_message(mensagem, ephemeral=True)
+
+@bot.tree.command(name="estatisticas", description="Mostra as estatísticas de um jogador")
+@app_commands.guild_only()
+@app_commands.describe(jogador="Nick do R6 ou nome no Discord (vazio para ver as suas)")
+@app_commands.autocomplete(jogador=autocompletar_jogador)
+async def estatisticas_slash(interaction: discord.Interaction, jogador: Optional[str] = None):
+    discord_id, registro = await _jogador_escolhido(interaction, jogador)
+    if registro is None:
+        await _responder_nao_registrado(interaction, discord_id, jogador)
+        return
+    membro = interaction.guild.get_member(discord_id) if interaction.guild else None
+    await interaction.response.send_message(embed=await montar_estatisticas(registro, membro))
+
+@bot.tree.command(name="historico", description="Mostra as últimas partidas de um jogador")
+@app_commands.guild_only()
+@app_commands.describe(jogador="Nick do R6 ou nome no Discord (vazio para ver o seu)")
+@app_commands.autocomplete(jogador=autocompletar_jogador)
+async def historico_slash(interaction: discord.Interaction, jogador: Optional[str] = None):
+    discord_id, registro = await _jogador_escolhido(interaction, jogador)
+    if registro is None:
+        await _responder_nao_registrado(interaction, discord_id, jogador)
+        return
+    linhas = await paginas_historico.obter(registro["id"], ">", HISTORICO_INICIO)
+    conteudo = renderizar_historico(interaction.user.id, registro["id"], registro, linhas, ">", HISTORICO_INICIO)
+    await interaction.response.send_message(**{chave: valor for chave, valor in conteudo.items() if valor is not None})
 
 # Comando para ver ranking
 @bot.command(name='ranking')
+@commands.guild_only()
 async def ranking(ctx):
     """Mostra o ranking dos jogadores"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jogadores WHERE elo > 0 AND partidas_jogadas > 0 ORDER BY elo DESC, kd_ratio DESC LIMIT 10")
-    top_jogadores = cursor.fetchall()
-    conn.close()
+    embed = await estado_guild(ctx.guild.id).placar.embed()
+    await ctx.send(embed=embed)
+
+DISTRIBUICAO_FAIXAS_MAX = 20  # Linhas do histograma; a largura da faixa é aumentada para caber
+
+# Comando para ver a distribuição de ELO
+@bot.command(name='distribuicao')
+@commands.guild_only()
+async def distribuicao(ctx, largura: int = 250):
+    """Mostra o histograma de ELO dos jogadores ranqueados"""
+    dados = await distribuicao_elo(ctx.guild.id)
+    if not len(dados):
+        await ctx.send("Nenhum jogador ranqueado ainda.")
+        return
+    
+    largura = max(largura, 1)
+    faixas = dados.histograma(largura)
+    while len(faixas) > DISTRIBUICAO_FAIXAS_MAX:
+        largura *= 2
+        faixas = dados.histograma(largura)
+    
+    minha_posicao = dados.posicao(ctx.author.id)
+    meu_elo = dados.elo(ctx.author.id)
+    maior = max(contagem for _, contagem in faixas)
+    linhas = []
+    for inicio, contagem in faixas:
+        barra = "█" * round(contagem / maior * 20) if contagem else ""
+        marca = " ◀ você" if meu_elo is not None and inicio <= meu_elo < inicio + largura else ""
+        linhas.append(f"{inicio:>6} │{barra:<20} {contagem}{marca}")
     
     embed = discord.Embed(
-        title="🏆 Ranking dos Jogadores (Top 10 ELO)",
-        color=discord.Color.gold()
+        title="📊 Distribuição de ELO",
+        description="```\n" + "\n".join(linhas) + "\n```",
+        color=discord.Color.blue()
     )
+    rodape = f"{len(dados)} jogador(es) ranqueado(s) • faixas de {largura} pontos"
+    if minha_posicao is not None:
+        rodape += f" • você: #{minha_posicao} (top {_formatar_percentual(dados.percentil(ctx.author.id))})"
+    embed.set_footer(text=rodape)
+    await ctx.send(embed=embed)
+
+# Função para processar imagem de resultados
+async def processar_resultado_imagem(dados: bytes, lobby_id: str, nicknames: List[str]) -> dict:
+    """Extrai vencedor, kills e deaths do print de resultado, na ordem de `nicknames`."""
+    logger.info(f"Processando imagem de resultados do {lobby_id} (backend {pipeline_resultados.backend})...")
+    return await pipeline_resultados.processar(dados, nicknames)
+
+SQLITE_MAX_VARIAVEIS = 900  # Margem segura abaixo do limite de parâmetros por comando do SQLite
+
+def _em_blocos(itens: list, tamanho: int):
+    """Divide uma lista em blocos de no máximo `tamanho` itens."""
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+def _finalizar_partidas_lote(conn: sqlite3.Connection, partidas: List[dict]) -> Tuple[List[int], List[sqlite3.Row]]:
+    """Grava um lote de partidas e aplica as estatísticas com operações em conjunto.
+
+    Cada partida é um dict com `guild_id`, `lobby_id`, `mapa`, `time_vencedor` e `jogadores`,
+    uma lista de tuplas `(discord_id, time, kills, deaths)`, e opcionalmente
+    `captura` (o print já arquivado) e `lobby_numero` (o lobby cujo estado
+    gravado é apagado junto com o registro). Roda na thread de escrita, dentro de uma
+    única transação para todo o lote. Retorna os IDs das partidas e as linhas
+    atualizadas dos jogadores.
+    """
+    # 1. Resolver os IDs de todos os jogadores do lote de uma só vez (uma consulta por guilda)
+    discord_ids_por_guild: Dict[int, set] = {}
+    for partida in partidas:
+        discord_ids_por_guild.setdefault(partida["guild_id"], set()).update(j[0] for j in partida["jogadores"])
+    ids_por_discord = {}  # (guild_id, discord_id) -> id
+    elo_corrente: Dict[int, int] = {}  # id -> ELO após a última partida processada do lote
+    for guild_id, discord_ids in discord_ids_por_guild.items():
+        for bloco in _em_blocos(list(discord_ids), SQLITE_MAX_VARIAVEIS - 1):
+            marcadores = ",".join("?" * len(bloco))
+            for linha in conn.execute(
+                f"SELECT id, discord_id, elo FROM jogadores WHERE guild_id = ? AND discord_id IN ({marcadores})",
+                [guild_id, *bloco]
+            ):
+                ids_por_discord[(guild_id, linha["discord_id"])] = linha["id"]
+                elo_corrente[linha["id"]] = linha["elo"]
     
-    if not top_jogadores:
-        embed.description = "Nenhum jogador no ranking ainda. Jogue uma partida!"
-    else:
-        for i, jogador in enumerate(top_jogadores):
-            rank_emoji = RANKS.get(jogador["rank"], {}).get("emoji", "")
-            win_rate = (jogador['vitorias']/jogador['partidas_jogadas']*100) if jogador['partidas_jogadas'] > 0 else 0
-            
-            embed.add_field(
-                name=f"#{i+1}. {jogador['r6_nickname']} {rank_emoji}",
-                value=f"**ELO:** {jogador['elo']} | **K/D:** {jogador['kd_ratio']:.2f} | **W/R:** {win_rate:.1f}%",
-                inline=False
+    # 2. Inserir as partidas e montar as linhas de partida_jogadores e os deltas por jogador
+    partida_ids = []
+    linhas_partida = []
+    deltas: Dict[int, List[int]] = {}  # id -> [vitorias, derrotas, elo, kills, deaths, partidas]
+    deltas_mapa: Dict[Tuple[int, str], List[int]] = {}  # (id, mapa) -> [partidas, vitorias, kills, deaths]
+    novas_forma: Dict[int, list] = {}  # id -> [[venceu, kills, deaths, elo_apos, variacao], ...] em ordem
+    for partida in partidas:
+        captura = partida.get("captura")
+        if captura:
+            conn.execute(
+                "INSERT OR IGNORE INTO capturas (hash, arquivo, tamanho_original, tamanho_arquivo) VALUES (?, ?, ?, ?)",
+                (captura.hash, captura.arquivo, captura.tamanho_original, captura.tamanho_arquivo)
+            )
+        partida_id = conn.execute(
+            "INSERT INTO partidas (guild_id, lobby_id, mapa, time_vencedor, captura_hash) VALUES (?, ?, ?, ?, ?)",
+            (partida["guild_id"], partida["lobby_id"], partida["mapa"], partida["time_vencedor"],
+             captura.hash if captura else None)
+        ).lastrowid
+        partida_ids.append(partida_id)
+        if partida.get("lobby_numero") is not None:
+            _apagar_lobby(conn, partida["guild_id"], partida["lobby_numero"])
+        
+        participantes = [
+            (ids_por_discord[(partida["guild_id"], discord_id)], time_jogador, kills, deaths)
+            for discord_id, time_jogador, kills, deaths in partida["jogadores"]
+            if (partida["guild_id"], discord_id) in ids_por_discord
+        ]
+        variacoes = variacoes_partida(motor_da_guild(partida["guild_id"]), participantes, elo_corrente, partida["time_vencedor"])
+        
+        for (jogador_id, time_jogador, kills, deaths), variacao in zip(participantes, variacoes):
+            venceu = time_jogador == partida["time_vencedor"]
+            linhas_partida.append(
+                (partida_id, jogador_id, time_jogador, kills, deaths, "VITÓRIA" if venceu else "DERROTA")
             )
+            delta = deltas.setdefault(jogador_id, [0, 0, 0, 0, 0, 0])
+            delta[0] += 1 if venceu else 0
+            delta[1] += 0 if venceu else 1
+            delta[2] += variacao
+            delta[3] += kills
+            delta[4] += deaths
+            delta[5] += 1
+            
+            delta_mapa = deltas_mapa.setdefault((jogador_id, partida["mapa"]), [0, 0, 0, 0])
+            delta_mapa[0] += 1
+            delta_mapa[1] += 1 if venceu else 0
+            delta_mapa[2] += kills
+            delta_mapa[3] += deaths
+            elo_corrente[jogador_id] += variacao
+            novas_forma.setdefault(jogador_id, []).append([int(venceu), kills, deaths, elo_corrente[jogador_id], variacao])
     
-    await ctx.send(embed=embed)
+    # 3. Uma inserção em lote para todos os jogadores de todas as partidas
+    conn.executemany(
+        """INSERT INTO partida_jogadores 
+        (partida_id, jogador_id, time, kills, deaths, resultado) 
+        VALUES (?, ?, ?, ?, ?, ?)""",
+        linhas_partida
+    )
+    
+    # 4. Um único UPDATE em conjunto por bloco de jogadores
+    linhas_delta = [(jogador_id, *delta) for jogador_id, delta in deltas.items()]
+    jogadores_atualizados = []
+    for bloco in _em_blocos(linhas_delta, SQLITE_MAX_VARIAVEIS // 7):
+        valores = ",".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(bloco))
+        cursor = conn.execute(
+            f"""WITH d (id, vitorias, derrotas, elo, kills, deaths, partidas) AS (VALUES {valores})
+            UPDATE jogadores 
+            SET vitorias = jogadores.vitorias + d.vitorias, 
+            derrotas = jogadores.derrotas + d.derrotas, 
+            elo = jogadores.elo + d.elo,
+            kills = jogadores.kills + d.kills, 
+            deaths = jogadores.deaths + d.deaths, 
+            kd_ratio = CAST(jogadores.kills + d.kills AS REAL) / NULLIF(jogadores.deaths + d.deaths, 0),
+            partidas_jogadas = jogadores.partidas_jogadas + d.partidas 
+            FROM d WHERE jogadores.id = d.id
+            RETURNING *""",
+            [valor for linha in bloco for valor in linha]
+        )
+        jogadores_atualizados.extend(cursor.fetchall())
+    
+    # 5. Agregados incrementais: por mapa e janela das últimas partidas
+    conn.executemany(
+        """INSERT INTO estatisticas_mapa (jogador_id, mapa, partidas, vitorias, kills, deaths)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(jogador_id, mapa) DO UPDATE SET
+        partidas = partidas + excluded.partidas,
+        vitorias = vitorias + excluded.vitorias,
+        kills = kills + excluded.kills,
+        deaths = deaths + excluded.deaths""",
+        [(jogador_id, mapa, *delta) for (jogador_id, mapa), delta in deltas_mapa.items()]
+    )
+    
+    janelas: Dict[int, list] = {}
+    for bloco in _em_blocos(list(novas_forma), SQLITE_MAX_VARIAVEIS):
+        marcadores = ",".join("?" * len(bloco))
+        for linha in conn.execute(f"SELECT jogador_id, janela FROM forma_recente WHERE jogador_id IN ({marcadores})", bloco):
+            janelas[linha["jogador_id"]] = json.loads(linha["janela"])
+    conn.executemany(
+        "INSERT INTO forma_recente (jogador_id, janela) VALUES (?, ?) "
+        "ON CONFLICT(jogador_id) DO UPDATE SET janela = excluded.janela",
+        [
+            (jogador_id, json.dumps((janelas.get(jogador_id, []) + novas)[-JANELA_FORMA:]))
+            for jogador_id, novas in novas_forma.items()
+        ]
+    )
+    
+    return partida_ids, jogadores_atualizados
+
+async def finalizar_partidas_em_lote(partidas: List[dict]) -> List[int]:
+    """Grava um lote de partidas (veja `FilaFinalizacoes`) em uma única transação e atualiza os caches."""
+    partida_ids, jogadores_atualizados = await db.transacao(_finalizar_partidas_lote, partidas)
+    por_guild: Dict[int, List[sqlite3.Row]] = {}
+    for linha in jogadores_atualizados:
+        por_guild.setdefault(linha["guild_id"], []).append(linha)
+    for guild_id, linhas in por_guild.items():
+        estado_shard(shard_da_guild(guild_id)).cache_jogadores.atualizar(linhas)
+        estado_guild(guild_id).placar.aplicar(linhas)
+        estado_guild(guild_id).distribuicao_elo.aplicar(linhas)
+    return partida_ids
+
+FINALIZACAO_LOTE_MAX = 50  # Partidas gravadas por transação
+
+class FilaFinalizacoes:
+    """Agrupa as finalizações de partidas que chegam juntas em uma única transação.
+
+    A primeira finalização é gravada sem espera. As que chegam enquanto um lote
+    está sendo gravado se acumulam e seguem todas no próximo lote, com os
+    `UPDATE`s em conjunto de `_finalizar_partidas_lote`. Se um lote falha, cada
+    partida dele é regravada sozinha, para que o erro de uma não derrube as outras.
+    """
 
-# Função para processar imagem de resultados (simulado)
-async def processar_resultado_imagem(anexo, lobby_id):
-    """Função simulada para processar imagem de resultados e extrair dados."""
+    def __init__(self, lote_max: int = FINALIZACAO_LOTE_MAX):
+        self.lote_max = lote_max
+        self._pendentes: List[Tuple[dict, asyncio.Future]] = []
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def finalizar(self, partida: dict) -> int:
+        """Enfileira a partida e retorna o ID dela depois do commit."""
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes.append((partida, futuro))
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._consumir())
+        return await futuro
+
+    async def _consumir(self):
+        while self._pendentes:
+            lote = self._pendentes[:self.lote_max]
+            del self._pendentes[:self.lote_max]
+            metricas.incrementar("r6_finalizacao_lotes_total")
+            metricas.incrementar("r6_finalizacao_partidas_total", len(lote))
+            try:
+                partida_ids = await finalizar_partidas_em_lote([partida for partida, _ in lote])
+            except Exception as e:
+                if len(lote) == 1:
+                    self._entregar(lote[0][1], erro=e)
+                    continue
+                logger.warning(f"Lote de {len(lote)} finalizações falhou ({e}); gravando uma a uma.")
+                for partida, futuro in lote:
+                    try:
+                        (partida_id,) = await finalizar_partidas_em_lote([partida])
+                    except Exception as erro:
+                        self._entregar(futuro, erro=erro)
+                    else:
+                        self._entregar(futuro, partida_id)
+                continue
+            for (_, futuro), partida_id in zip(lote, partida_ids):
+                self._entregar(futuro, partida_id)
+
+    @staticmethod
+    def _entregar(futuro: asyncio.Future, partida_id: Optional[int] = None, erro: Optional[Exception] = None):
+        if futuro.done():
+            return  # Quem finalizou desistiu de esperar; a partida foi gravada mesmo assim
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(partida_id)
+
+fila_finalizacoes = FilaFinalizacoes()
+
+def _resumo_latencias(series: Dict[tuple, Histograma], rotulo: str, limite: int = 10) -> str:
+    """Linhas `nome: n • p50/p95/p99`, agregando as séries pelo rótulo informado."""
+    por_nome: Dict[str, Histograma] = {}
+    for chave, histograma in series.items():
+        nome = dict(chave).get(rotulo, "?")
+        agregado = por_nome.setdefault(nome, Histograma())
+        agregado.contagens = [a + b for a, b in zip(agregado.contagens, histograma.contagens)]
+        agregado.soma += histograma.soma
+        agregado.total += histograma.total
     
-    # Em um cenário real, você usaria OCR (Tesseract) ou uma API de visão.
-    # A implementação abaixo é um placeholder.
+    def ms(segundos: float) -> str:
+        return "∞" if segundos == float("inf") else f"{segundos * 1000:g}"
     
-    logger.info(f"Simulando processamento da imagem de resultados do {lobby_id}...")
-    await asyncio.sleep(2)
+    linhas = [
+        f"`{nome}`: {h.total}× • ≤{ms(h.percentil(50))}/{ms(h.percentil(95))}/{ms(h.percentil(99))} ms"
+        for nome, h in sorted(por_nome.items(), key=lambda item: item[1].soma, reverse=True)[:limite]
+    ]
+    return "\n".join(linhas) or "Sem dados ainda."
+
+# Comando para ver as métricas de desempenho
+@bot.command(name='metrics')
+@commands.is_owner()
+async def metrics(ctx):
+    """Mostra latências, tempo de SQL, atraso do event loop e rate limits do processo (apenas o dono do bot)"""
+    embed = discord.Embed(title="📈 Métricas do Bot", description="Percentis p50/p95/p99 (limite do balde)", color=discord.Color.blue())
+    embed.add_field(name="Comandos", value=_resumo_latencias(metricas.histogramas("r6_comando_segundos"), "comando"), inline=False)
+    embed.add_field(name="Interações", value=_resumo_latencias(metricas.histogramas("r6_interacao_segundos"), "componente"), inline=False)
+    embed.add_field(name="SQL por origem (maior tempo total)", value=_resumo_latencias(metricas.histogramas("r6_sql_segundos"), "origem", 8), inline=False)
     
-    # Retorna dados simulados
-    return {
-        "time_vencedor": random.randint(1, 2),
-        "kills": [random.randint(0, 15) for _ in range(10)], # 10 jogadores
-        "deaths": [random.randint(0, 15) for _ in range(10)] # 10 jogadores
-    }
+    lotes = metricas.contadores("r6_sql_lotes_total").get((), 0)
+    escritas = metricas.contadores("r6_sql_escritas_total").get((), 0)
+    commits = metricas.histogramas("r6_sql_commit_segundos").get((), Histograma())
+    embed.add_field(
+        name="Escritas em lote",
+        value=f"{escritas:.0f} escrita(s) em {lotes:.0f} commit(s) • média **{escritas / lotes:.1f}** por lote • "
+              f"commit p99 ≤{commits.percentil(99) * 1000:g} ms" if lotes else "Nenhuma escrita registrada.",
+        inline=False
+    )
+    
+    atraso = metricas.histogramas("r6_loop_atraso_segundos").get((), Histograma())
+    embed.add_field(
+        name="Event loop",
+        value=f"Atraso atual **{_atraso_loop * 1000:.1f} ms** • p99 ≤{atraso.percentil(99) * 1000:g} ms",
+        inline=False
+    )
+    
+    esperas = metricas.histogramas("r6_discord_rate_limit_espera_segundos")
+    embed.add_field(
+        name="Rate limit do Discord",
+        value="\n".join(f"{dict(chave)['escopo']}: {h.total} espera(s), {h.soma:.1f}s no total" for chave, h in esperas.items())
+        or "Nenhuma espera registrada.",
+        inline=False
+    )
+    embed.add_field(
+        name="Estado",
+        value=(
+            f"Cache de jogadores: **{_taxa_acerto_cache():.0%}** de acerto • "
+            f"Lobbies: **{metricas.valor_medidor('r6_lobbies_ativos'):.0f}** • "
+            f"Na fila: **{metricas.valor_medidor('r6_matchmaking_fila'):.0f}** • "
+            f"Temporizadores: **{len(agendador)}** • OCR ocupados: **{pipeline_resultados.ocupados}**"
+        ),
+        inline=False
+    )
+    await ctx.send(embed=embed)
+
+# Comando para recalcular os ratings a partir do histórico
+@bot.command(name='recalcular_ratings')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def recalcular_ratings_cmd(ctx, motor: Optional[str] = None, desde: Optional[str] = None):
+    """Recalcula o ELO da guilda a partir do histórico (motor: fixo/elo; desde: AAAA-MM-DD inicia uma temporada)"""
+    motor = motor or motor_da_guild(ctx.guild.id).nome
+    if motor not in MOTORES_RATING:
+        await ctx.send(f"Motor desconhecido. Opções: {', '.join(MOTORES_RATING)}")
+        return
+    if desde is None:
+        desde = await obter_configuracao(f"temporada_inicio:{ctx.guild.id}") or "0000-00-00"
+    elif not re.fullmatch(r"\d{4}-\d{2}-\d{2}", desde):
+        await ctx.send("Use a data no formato AAAA-MM-DD.")
+        return
+    
+    await ctx.send(f"⏳ Recalculando os ratings com o motor **{motor}**...")
+    inicio = time.monotonic()
+    try:
+        total = await recalcular_ratings(ctx.guild.id, motor, desde)
+    except RuntimeError as e:
+        await ctx.send(str(e))
+        return
+    await ctx.send(f"✅ Ratings de {total} jogador(es) recalculados em {time.monotonic() - inicio:.1f}s.")
 
 # Comando para finalizar partida com processamento de imagem
 @bot.command()
+@commands.guild_only()
 @commands.has_permissions(administrator=True)
 async def finalizar_partida(ctx, lobby_id: str):
     """Finaliza uma partida e atualiza as estatísticas com base no print do resultado."""
-    if lobby_id not in lobbies or not lobbies[lobby_id]["em_andamento"]:
+    estado = estado_guild(ctx.guild.id)
+    lobby = estado.lobbies.obter(lobby_id)
+    if not lobby or not lobby.em_andamento:
         await ctx.send("Partida não encontrada ou não está em andamento!")
         return
     
@@ -553,152 +4405,239 @@ async def finalizar_partida(ctx, lobby_id: str):
         await ctx.send("Por favor, anexe o print do resultado da partida!")
         return
     
-    lobby_data = lobbies[lobby_id]
     anexo = ctx.message.attachments[0]
     
-    # Verificar se o lobby está cheio (10 jogadores) para garantir a correta distribuição dos dados simulados.
-    if len(lobby_data["jogadores"]) != MAX_JOGADORES:
-        await ctx.send(f"Erro: O lobby não tem {MAX_JOGADORES} jogadores. Impossível processar o resultado simulado.")
-        return
+    # Reservar o lobby: outra finalização concorrente encontrará o estado FINALIZANDO
+    async with lobby.trava:
+        if not lobby.em_andamento:
+            await ctx.send("Partida não encontrada ou não está em andamento!")
+            return
+        
+        # Verificar se o lobby está cheio (10 jogadores) para garantir a correta distribuição dos dados.
+        if len(lobby.jogadores) != MAX_JOGADORES:
+            await ctx.send(f"Erro: O lobby não tem {MAX_JOGADORES} jogadores. Impossível processar o resultado.")
+            return
+        
+        lobby.transicionar(LOBBY_FINALIZANDO)
+        jogadores = list(lobby.jogadores)
+        mapa_escolhido = lobby.mapa_escolhido
 
     # Processar imagem
-    await ctx.send("📊 Processando resultado da partida (Simulado)...")
-    resultado = await processar_resultado_imagem(anexo, lobby_id)
-    
-    # Registrar partida no banco de dados
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    await ctx.send("📊 Processando resultado da partida...")
+    try:
+        # Download único: os mesmos bytes vão para o OCR, para o arquivo local e para o canal de resultados
+        captura = await baixar_captura(anexo)
+        duplicada = await partida_com_captura(ctx.guild.id, captura.hash)
+        if duplicada:
+            raise ValueError(
+                f"este print já foi usado na partida #{duplicada['id']} "
+                f"({duplicada['lobby_id']}, {duplicada['data_partida']})."
+            )
+        jogadores_db = await asyncio.gather(*(get_jogador_by_id(ctx.guild.id, j.id) for j in jogadores))
+        nicknames = [jogador["r6_nickname"] if jogador else None for jogador in jogadores_db]
+        resultado, _ = await asyncio.gather(
+            processar_resultado_imagem(captura.dados, lobby_id, nicknames),
+            arquivo_capturas.preparar(captura)
+        )
+    except Exception as e:
+        async with lobby.trava:
+            lobby.transicionar(LOBBY_EM_ANDAMENTO)
+        await ctx.send(f"Não foi possível processar o print do resultado: {e}")
+        logger.error(f"Erro no processamento do resultado do {lobby_id}: {e}")
+        return
     
     try:
-        # Inserir partida
-        cursor.execute(
-            "INSERT INTO partidas (lobby_id, mapa, time_vencedor) VALUES (?, ?, ?)",
-            (lobby_id, lobby_info[lobby_id]["mapa_escolhido"] or "DESCONHECIDO", resultado["time_vencedor"])
-        )
-        partida_id = cursor.lastrowid
-        
-        # Atualizar estatísticas dos jogadores
-        for i, jogador in enumerate(lobby_data["jogadores"]):
-            # Buscar ID do jogador no banco
-            cursor.execute("SELECT id, kills, deaths FROM jogadores WHERE discord_id = ?", (jogador.id,))
-            jogador_db = cursor.fetchone()
-            
-            if jogador_db:
-                # Dados da partida (índices 0-4 = Time 1, 5-9 = Time 2)
-                kills = resultado["kills"][i]
-                deaths = resultado["deaths"][i]
-                time_jogador = 1 if i < 5 else 2
-                resultado_jogador = "VITÓRIA" if time_jogador == resultado["time_vencedor"] else "DERROTA"
-                
-                # Inserir jogador na partida
-                cursor.execute(
-                    """INSERT INTO partida_jogadores 
-                    (partida_id, jogador_id, time, kills, deaths, resultado) 
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (partida_id, jogador_db["id"], time_jogador, kills, deaths, resultado_jogador)
-                )
-                
-                # Calcular novos valores
-                elo_change = 0
-                if resultado_jogador == "VITÓRIA":
-                    elo_change = 25
-                else:
-                    elo_change = -10
-                
-                total_kills = jogador_db["kills"] + kills
-                total_deaths = jogador_db["deaths"] + deaths
-                
-                # Atualizar estatísticas do jogador
-                cursor.execute(
-                    """UPDATE jogadores 
-                    SET vitorias = vitorias + ?, 
-                    derrotas = derrotas + ?, 
-                    elo = elo + ?,
-                    kills = kills + ?, 
-                    deaths = deaths + ?, 
-                    kd_ratio = CAST(? AS REAL) / NULLIF(?, 0),
-                    partidas_jogadas = partidas_jogadas + 1 
-                    WHERE id = ?""",
-                    (
-                        1 if resultado_jogador == "VITÓRIA" else 0,
-                        1 if resultado_jogador == "DERROTA" else 0,
-                        elo_change,
-                        kills,
-                        deaths,
-                        total_kills,
-                        total_deaths,
-                        jogador_db["id"]
-                    )
-                )
-        
-        conn.commit()
+        # Registrar partida no banco de dados (primeira metade = Time 1, segunda = Time 2)
+        metade = len(jogadores) // 2
+        partida = {
+            "guild_id": ctx.guild.id,
+            "lobby_id": lobby_id,
+            "mapa": mapa_escolhido or "DESCONHECIDO",
+            "time_vencedor": resultado["time_vencedor"],
+            "jogadores": [
+                (jogador.id, 1 if i < metade else 2, resultado["kills"][i], resultado["deaths"][i])
+                for i, jogador in enumerate(jogadores)
+            ],
+            "captura": captura,
+            "lobby_numero": lobby.numero
+        }
+        await fila_finalizacoes.finalizar(partida)
     except Exception as e:
-        conn.rollback()
+        async with lobby.trava:
+            lobby.transicionar(LOBBY_EM_ANDAMENTO)
         await ctx.send(f"Ocorreu um erro ao registrar no banco de dados: {e}")
         logger.error(f"Erro no banco de dados: {e}")
         return
+    
+    # A partida já está gravada: falhas do Discord daqui em diante não podem deixar o lobby preso em FINALIZANDO
+    try:
+        try:
+            await arquivo_capturas.guardar(captura)
+        except OSError as e:
+            logger.error(f"Erro ao arquivar o print do {lobby_id}: {e}")
+        
+        # Salvar print no canal de resultados
+        mapa_info = mapa_escolhido or "Não Definido"
+        embed = discord.Embed(
+            title=f"📋 Resultado da Partida {lobby.numero}",
+            description=f"Partida finalizada em **{datetime.now().strftime('%d/%m/%Y %H:%M')}**\n\n**Mapa:** {mapa_info}",
+            color=discord.Color.green()
+        )
+        
+        # Exibir jogadores com resultados
+        jogadores_list = []
+        for i, jogador in enumerate(jogadores):
+            time_jogador = 1 if i < metade else 2
+            resultado_jogador = "🏆 VITÓRIA" if time_jogador == resultado["time_vencedor"] else "❌ DERROTA"
+            kills = resultado["kills"][i]
+            deaths = resultado["deaths"][i]
+            jogadores_list.append(f"{jogador.mention} (Time {time_jogador}): {resultado_jogador} | Kills: {kills}, Deaths: {deaths}")
+        
+        embed.add_field(
+            name="Jogadores e Desempenho",
+            value="\n".join(jogadores_list),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="Time Vencedor",
+            value=f"**Time {resultado['time_vencedor']}**",
+            inline=True
+        )
+        
+        if estado.canal_resultados:
+            embed.set_image(url=f"attachment://{captura.nome}")
+            try:
+                await estado.canal_resultados.send(embed=embed, file=captura.arquivo_discord())
+            except discord.HTTPException as e:
+                logger.error(f"Erro ao publicar o resultado do {lobby_id}: {e}")
+                await ctx.send("Não foi possível publicar no canal de resultados, mas as estatísticas foram salvas.")
+        else:
+            await ctx.send("Canal de resultados não configurado, mas as estatísticas foram salvas.")
     finally:
-        conn.close()
+        # Fechar sala de partida e devolver o lobby ao pool
+        async with lobby.trava:
+            if lobby.sala_partida:
+                try:
+                    await lobby.sala_partida.delete()
+                except discord.HTTPException as e:
+                    logger.error(f"Erro ao apagar a sala da partida do {lobby_id}: {e}")
+            lobby.transicionar(LOBBY_AGUARDANDO)
+            estado.lobbies.reciclar(lobby)
     
-    # Salvar print no canal de resultados
-    mapa_info = lobby_info[lobby_id]["mapa_escolhido"] or "Não Definido"
-    embed = discord.Embed(
-        title=f"📋 Resultado da Partida {lobby_id.split('_')[1]}",
-        description=f"Partida finalizada em **{datetime.now().strftime('%d/%m/%Y %H:%M')}**\n\n**Mapa:** {mapa_info}",
-        color=discord.Color.green()
-    )
+    await ctx.send(f"✅ Partida {lobby_id.split('_')[1]} finalizada e estatísticas atualizadas!")
+
+# Comando para reprocessar o print arquivado de uma partida
+@bot.command(name='reprocessar')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def reprocessar(ctx, partida_id: int):
+    """Roda o OCR de novo sobre o print arquivado de uma partida e compara com o que foi registrado"""
+    partida = await db.buscar_um('''
+    SELECT p.lobby_id, p.time_vencedor, c.arquivo
+    FROM partidas p
+    JOIN capturas c ON c.hash = p.captura_hash
+    WHERE p.id = ? AND p.guild_id = ?
+    ''', (partida_id, ctx.guild.id))
+    if not partida:
+        await ctx.send("Partida não encontrada ou sem print arquivado.")
+        return
     
-    # Exibir jogadores com resultados simulados
-    jogadores_list = []
-    for i, jogador in enumerate(lobby_data["jogadores"]):
-        time_jogador = 1 if i < 5 else 2
-        resultado_jogador = "🏆 VITÓRIA" if time_jogador == resultado["time_vencedor"] else "❌ DERROTA"
-        kills = resultado["kills"][i]
-        deaths = resultado["deaths"][i]
-        jogadores_list.append(f"{jogador.mention} (Time {time_jogador}): {resultado_jogador} | Kills: {kills}, Deaths: {deaths}")
-        
-    embed.add_field(
-        name="Jogadores e Desempenho",
-        value="\n".join(jogadores_list),
-        inline=False
-    )
+    jogadores = await db.buscar_todos('''
+    SELECT j.discord_id, j.r6_nickname, pj.kills, pj.deaths
+    FROM partida_jogadores pj
+    JOIN jogadores j ON j.id = pj.jogador_id
+    WHERE pj.partida_id = ?
+    ORDER BY pj.id
+    ''', (partida_id,))
+    try:
+        dados = await arquivo_capturas.ler(partida["arquivo"])
+        resultado = await processar_resultado_imagem(dados, partida["lobby_id"], [j["r6_nickname"] for j in jogadores])
+    except Exception as e:
+        await ctx.send(f"Não foi possível reprocessar o print: {e}")
+        return
     
-    embed.add_field(
-        name="Time Vencedor",
-        value=f"**Time {resultado['time_vencedor']}**",
-        inline=True
+    linhas = []
+    for i, jogador in enumerate(jogadores):
+        lido = (resultado["kills"][i], resultado["deaths"][i])
+        marca = "✅" if lido == (jogador["kills"], jogador["deaths"]) else "⚠️"
+        linhas.append(
+            f"{marca} <@{jogador['discord_id']}>: registrado {jogador['kills']}/{jogador['deaths']} • lido {lido[0]}/{lido[1]}"
+        )
+    embed = discord.Embed(
+        title=f"🔁 Reprocessamento da Partida #{partida_id}",
+        description=f"Time vencedor registrado: **{partida['time_vencedor']}** • lido: **{resultado['time_vencedor']}**",
+        color=discord.Color.blue()
     )
+    embed.add_field(name="Kills/Deaths", value="\n".join(linhas) or "Nenhum jogador registrado.", inline=False)
+    await ctx.send(embed=embed)
+
+# Comando para fazer um backup do banco sem parar o bot
+@bot.command(name='backup')
+@commands.is_owner()
+async def backup(ctx):
+    """Faz agora um backup online do banco de todas as guildas (apenas o dono do bot)"""
+    await ctx.send("⏳ Copiando o banco de dados...")
+    try:
+        destino, tamanho, duracao = await servico_backup.executar()
+    except RuntimeError as e:
+        await ctx.send(str(e))
+        return
+    except (OSError, sqlite3.Error) as e:
+        await ctx.send(f"Não foi possível fazer o backup: {e}")
+        return
+    await ctx.send(f"✅ Backup `{os.path.basename(destino)}` gravado: {tamanho / 1024 ** 2:.1f} MiB em {duracao:.1f}s.")
+
+# Comando para exportar as estatísticas da guilda
+@bot.command(name='exportar')
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def exportar(ctx, tabela: str = "tudo", formato: str = "csv"):
+    """Exporta as tabelas da guilda (tabela: tudo/jogadores/partidas/partida_jogadores; formato: csv/parquet)"""
+    tabelas = list(EXPORTACOES) if tabela == "tudo" else [tabela]
+    if tabela != "tudo" and tabela not in EXPORTACOES:
+        await ctx.send(f"Tabela desconhecida. Opções: tudo, {', '.join(EXPORTACOES)}")
+        return
+    if formato not in FORMATOS_EXPORTACAO:
+        await ctx.send(f"Formato desconhecido. Opções: {', '.join(FORMATOS_EXPORTACAO)}")
+        return
     
-    if canal_resultados:
-        await canal_resultados.send(embed=embed)
-        await canal_resultados.send(file=await anexo.to_file())
-    else:
-        await ctx.send("Canal de resultados não configurado, mas as estatísticas foram salvas.")
-    
-    # Fechar sala de partida
-    if lobby_data["sala_partida"]:
-        await lobby_data["sala_partida"].delete()
-    
-    # Limpar dados do lobby
-    lobby_data["jogadores"] = []
-    lobby_data["em_andamento"] = False
-    lobby_data["sala_partida"] = None
-    
-    lobby_info[lobby_id] = {
-        "capitao1": None,
-        "capitao2": None,
-        "mapas_banidos": [],
-        "mapa_escolhido": None,
-        "ban_view": None,
-        "ban_message": None,
-        "jogadores_timeout": set()
-    }
+    await ctx.send(f"⏳ Exportando {', '.join(f'**{t}**' for t in tabelas)} em {formato}...")
+    inicio = time.monotonic()
+    try:
+        gerados = await exportar_estatisticas(ctx.guild.id, tabelas, formato)
+    except RuntimeError as e:
+        await ctx.send(str(e))
+        return
+    except ImportError:
+        await ctx.send("A exportação em parquet precisa do pacote `pyarrow` instalado.")
+        return
+    except (OSError, sqlite3.Error) as e:
+        await ctx.send(f"Não foi possível exportar: {e}")
+        return
     
-    await ctx.send(f"✅ Partida {lobby_id.split('_')[1]} finalizada e estatísticas atualizadas!")
+    tamanhos = [os.path.getsize(caminho) for _, caminho, _ in gerados]
+    resumo = "\n".join(
+        f"`{tabela}`: {linhas} linha(s) • {tamanho / 1024:.0f} KB"
+        for (tabela, _, linhas), tamanho in zip(gerados, tamanhos)
+    )
+    cabecalho = f"✅ Exportação concluída em {time.monotonic() - inicio:.1f}s."
+    if sum(tamanhos) > ctx.guild.filesize_limit:
+        await ctx.send(f"{cabecalho} Os arquivos passam do limite de upload e ficaram em `{EXPORTACAO_DIR}` no servidor.\n{resumo}")
+        return
+    await ctx.send(f"{cabecalho}\n{resumo}", files=[discord.File(caminho) for _, caminho, _ in gerados])
+    for _, caminho, _ in gerados:
+        os.remove(caminho)
 
 # Inicia o bot
 if __name__ == "__main__":
     if not TOKEN:
         logger.error("Token do bot não encontrado! O bot não pode ser iniciado.")
     else:
-        bot.run(TOKEN)
+        init_db()
+        pipeline_resultados.aquecer()
+        try:
+            bot.run(TOKEN)
+        finally:
+            pipeline_resultados.fechar()
+            db.fechar()
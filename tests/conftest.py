@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# O banco e os diretórios do bot têm caminhos relativos ao diretório atual: os testes rodam num diretório temporário
+os.chdir(tempfile.mkdtemp(prefix="r6_testes_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import r6_bot  # noqa: E402
+
+r6_bot.init_db()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _fechar_banco():
+    yield
+    r6_bot.db.fechar()
+
+
+class MembroFalso:
+    def __init__(self, discord_id: int):
+        self.id = discord_id
+        self.mention = f"<@{discord_id}>"
+
+
+@pytest.fixture
+def membro():
+    return MembroFalso
@@ -0,0 +1,67 @@
+import asyncio
+
+import r6_bot
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+async def _temporizadores_gravados(prefixo):
+    linhas = await r6_bot.db.buscar_todos("SELECT chave FROM temporizadores WHERE chave LIKE ?", (f"{prefixo}%",))
+    return sorted(linha["chave"] for linha in linhas)
+
+
+def test_dispara_na_ordem_dos_prazos_e_apaga_do_banco():
+    async def cenario():
+        agendador = r6_bot.Agendador()
+        disparados = []
+
+        @agendador.tratador("teste")
+        async def tratar(valor):
+            disparados.append(valor)
+
+        await agendador.agendar("ordem:b", "teste", 0.06, valor="b")
+        await agendador.agendar("ordem:a", "teste", 0.02, valor="a")
+        assert len(agendador) == 2
+        assert await _temporizadores_gravados("ordem:") == ["ordem:a", "ordem:b"]
+        await asyncio.sleep(0.2)
+        assert disparados == ["a", "b"]
+        assert len(agendador) == 0
+        assert await _temporizadores_gravados("ordem:") == []
+
+    _rodar(cenario())
+
+
+def test_cancelar_e_reagendar():
+    async def cenario():
+        agendador = r6_bot.Agendador()
+        disparados = []
+
+        @agendador.tratador("teste")
+        async def tratar(valor):
+            disparados.append(valor)
+
+        await agendador.agendar("cancelar:x", "teste", 0.02, valor="x")
+        await agendador.cancelar("cancelar:x")
+        await agendador.agendar("cancelar:y", "teste", 0.02, valor="y1")
+        await agendador.agendar("cancelar:y", "teste", 0.05, valor="y2")
+        assert agendador.prazo("cancelar:x") is None
+        await asyncio.sleep(0.15)
+        assert disparados == ["y2"]
+        assert await _temporizadores_gravados("cancelar:") == []
+
+    _rodar(cenario())
+
+
+def test_carregar_restaura_os_gravados():
+    async def cenario():
+        anterior = r6_bot.Agendador()
+        await anterior.agendar("carregar:z", "teste", 60, valor="z")
+
+        agendador = r6_bot.Agendador()
+        await agendador.carregar()
+        assert agendador.prazo("carregar:z") == anterior.prazo("carregar:z")
+        await agendador.cancelar("carregar:z")
+
+    _rodar(cenario())
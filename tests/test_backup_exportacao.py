@@ -0,0 +1,84 @@
+import asyncio
+import csv
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+import r6_bot
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+@pytest.fixture(autouse=True)
+def _duas_guildas():
+    """Jogadores e uma partida em cada uma de duas guildas."""
+    async def preparar():
+        for tabela in ("partida_jogadores", "partidas", "jogadores"):
+            await r6_bot.db.executar(f"DELETE FROM {tabela}")
+        for guild_id in (1, 2):
+            partida_id = await r6_bot.db.executar(
+                "INSERT INTO partidas (guild_id, lobby_id, mapa, time_vencedor) VALUES (?, '1', 'Banco', 1)", (guild_id,)
+            )
+            for discord_id in range(1, 4):
+                jogador_id = await r6_bot.db.executar(
+                    "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo) VALUES (?, ?, ?, ?, 'OURO', 3000)",
+                    (guild_id, discord_id, f"nome{discord_id}", f"nick{guild_id}-{discord_id}")
+                )
+                await r6_bot.db.executar(
+                    "INSERT INTO partida_jogadores (partida_id, jogador_id, time, kills, deaths, resultado) VALUES (?, ?, 1, 5, 2, 'VITÓRIA')",
+                    (partida_id, jogador_id)
+                )
+    _rodar(preparar())
+
+
+def _ler_csv(caminho):
+    with gzip.open(caminho, "rt", encoding="utf-8", newline="") as entrada:
+        return list(csv.DictReader(entrada))
+
+
+def test_copia_do_banco_e_integra_e_completa(tmp_path):
+    destino = str(tmp_path / "copia.db")
+    paginas, passos = r6_bot._copiar_banco(destino)
+    assert paginas > 0 and passos > 0
+    assert os.listdir(tmp_path) == ["copia.db"]
+    copia = sqlite3.connect(destino)
+    try:
+        assert copia.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+        assert copia.execute("SELECT COUNT(*) FROM jogadores").fetchone()[0] == 6
+    finally:
+        copia.close()
+
+
+def test_rotacao_mantem_as_copias_mais_recentes(tmp_path):
+    for dia in range(1, 6):
+        (tmp_path / f"r6-2026010{dia}.db").write_bytes(b"")
+    (tmp_path / "outro.db").write_bytes(b"")
+    r6_bot._rotacionar_backups(str(tmp_path), "r6-", manter=2)
+    assert sorted(os.listdir(tmp_path)) == ["outro.db", "r6-20260104.db", "r6-20260105.db"]
+
+
+def test_exportacao_csv_traz_so_a_guilda(tmp_path):
+    gerados = r6_bot._exportar_tabelas(2, ["jogadores", "partida_jogadores"], "csv", str(tmp_path))
+    assert [(tabela, linhas) for tabela, _, linhas in gerados] == [("jogadores", 3), ("partida_jogadores", 3)]
+    jogadores = _ler_csv(gerados[0][1])
+    assert [linha["r6_nickname"] for linha in jogadores] == ["nick2-1", "nick2-2", "nick2-3"]
+    ids = {linha["id"] for linha in jogadores}
+    assert {linha["jogador_id"] for linha in _ler_csv(gerados[1][1])} == ids
+
+
+def test_falha_na_exportacao_nao_deixa_arquivos(tmp_path, monkeypatch):
+    escrever_csv = r6_bot._escrever_csv
+
+    def falhar_na_segunda(caminho, colunas, tipos, lotes):
+        if "partidas" in caminho:
+            raise OSError("disco cheio")
+        return escrever_csv(caminho, colunas, tipos, lotes)
+
+    monkeypatch.setitem(r6_bot.ESCRITORES_EXPORTACAO, "csv", falhar_na_segunda)
+    with pytest.raises(OSError):
+        r6_bot._exportar_tabelas(1, ["jogadores", "partidas"], "csv", str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import pytest
+
+import r6_bot
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+@pytest.fixture(autouse=True)
+def _tabela_de_teste():
+    async def preparar():
+        await r6_bot.db.executar("CREATE TABLE IF NOT EXISTS teste_escritas (n INTEGER)")
+        await r6_bot.db.executar("DELETE FROM teste_escritas")
+    _rodar(preparar())
+
+
+def _inserir(conn, n):
+    conn.execute("INSERT INTO teste_escritas (n) VALUES (?)", (n,))
+    return n
+
+
+def _valores():
+    linhas = _rodar(r6_bot.db.buscar_todos("SELECT n FROM teste_escritas ORDER BY rowid"))
+    return [linha["n"] for linha in linhas]
+
+
+def _lotes():
+    return sum(r6_bot.metricas.contadores("r6_sql_lotes_total").values())
+
+
+def _segurar_escritor(liberar: threading.Event, entrou: threading.Event):
+    """Operação que ocupa a thread de escrita até `liberar`, para as seguintes se acumularem na fila."""
+    def operacao(conn):
+        entrou.set()
+        liberar.wait(5)
+    return operacao
+
+
+async def _com_escritor_ocupado(*operacoes):
+    """Enfileira `operacoes` enquanto a thread de escrita está ocupada; retorna os resultados de cada uma."""
+    liberar, entrou = threading.Event(), threading.Event()
+    bloqueio = asyncio.ensure_future(r6_bot.db.transacao(_segurar_escritor(liberar, entrou)))
+    await asyncio.get_running_loop().run_in_executor(None, entrou.wait, 5)
+    tarefas = [asyncio.ensure_future(r6_bot.db.transacao(func, *args)) for func, args in operacoes]
+    await asyncio.sleep(0)
+    liberar.set()
+    await bloqueio
+    return await asyncio.gather(*tarefas, return_exceptions=True)
+
+
+def test_escritas_acumuladas_sao_gravadas_em_ordem_num_unico_lote():
+    antes = _lotes()
+    resultados = _rodar(_com_escritor_ocupado(*[(_inserir, (n,)) for n in range(50)]))
+    assert resultados == list(range(50))
+    assert _valores() == list(range(50))
+    assert _lotes() - antes == 2  # A operação que segurou o escritor e o lote com as 50
+
+
+def test_falha_desfaz_so_a_propria_operacao():
+    def falhar(conn):
+        conn.execute("INSERT INTO teste_escritas (n) VALUES (-1)")
+        raise ValueError("falhou")
+
+    resultados = _rodar(_com_escritor_ocupado((_inserir, (1,)), (falhar, ()), (_inserir, (2,))))
+    assert resultados[0] == 1 and resultados[2] == 2
+    assert isinstance(resultados[1], ValueError)
+    assert _valores() == [1, 2]
+
+
+def test_chamador_so_e_liberado_apos_o_commit():
+    async def cenario():
+        await r6_bot.db.transacao(_inserir, 7)
+        # Uma conexão de leitura já enxerga a escrita assim que a espera termina
+        return await r6_bot.db.buscar_um("SELECT COUNT(*) AS total FROM teste_escritas")
+
+    assert _rodar(cenario())["total"] == 1
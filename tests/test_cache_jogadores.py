@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import r6_bot
+
+GUILD = 1
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+def _linha(discord_id, elo=1000):
+    linha = {campo: None for campo in r6_bot.Jogador.__slots__}
+    linha.update(guild_id=GUILD, discord_id=discord_id, r6_nickname=f"nick{discord_id}", elo=elo)
+    return linha
+
+
+@pytest.fixture(autouse=True)
+def _cache_limpo(monkeypatch):
+    _rodar(r6_bot.db.executar("DELETE FROM jogadores"))
+    estado = r6_bot.estado_shard(r6_bot.shard_da_guild(GUILD))
+    monkeypatch.setattr(estado, "cache_jogadores", r6_bot.CacheJogadores())
+
+
+def test_descarta_o_menos_usado_ao_passar_da_capacidade():
+    cache = r6_bot.CacheJogadores(capacidade=2)
+    cache.atualizar([_linha(1), _linha(2)])
+    cache.obter((GUILD, 1))
+    cache.atualizar([_linha(3)])
+    assert cache.obter((GUILD, 1))[0]
+    assert not cache.obter((GUILD, 2))[0]
+    assert cache.obter((GUILD, 3))[0]
+
+
+def test_itens_expiram_apos_o_ttl():
+    cache = r6_bot.CacheJogadores(ttl=-1)
+    cache.atualizar([_linha(1)])
+    assert cache.obter((GUILD, 1)) == (False, None)
+
+
+def test_guarda_ausencias():
+    cache = r6_bot.CacheJogadores()
+    cache.guardar_leitura((GUILD, 1), None, cache.versao)
+    assert cache.obter((GUILD, 1)) == (True, None)
+
+
+def test_leitura_antiga_nao_sobrescreve_escrita():
+    cache = r6_bot.CacheJogadores()
+    versao = cache.versao
+    cache.atualizar([_linha(1, elo=1500)])
+    cache.guardar_leitura((GUILD, 1), r6_bot.Jogador(_linha(1, elo=1000)), versao)
+    assert cache.obter((GUILD, 1))[1].elo == 1500
+
+
+def test_invalidar_remove_o_item():
+    cache = r6_bot.CacheJogadores()
+    cache.atualizar([_linha(1)])
+    cache.invalidar((GUILD, 1))
+    assert not cache.obter((GUILD, 1))[0]
+
+
+def test_taxa_de_acerto():
+    cache = r6_bot.CacheJogadores()
+    assert cache.taxa_acerto == 0.0
+    cache.atualizar([_linha(1)])
+    cache.obter((GUILD, 1))
+    cache.obter((GUILD, 2))
+    assert cache.taxa_acerto == 0.5
+
+
+def test_get_jogador_by_id_consulta_o_banco_uma_vez():
+    _rodar(r6_bot.db.executar(
+        "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo) VALUES (?, 1, 'nome', 'nick1', 'OURO', 1200)",
+        (GUILD,)
+    ))
+    assert _rodar(r6_bot.get_jogador_by_id(GUILD, 1)).r6_nickname == "nick1"
+    assert _rodar(r6_bot.get_jogador_by_id(GUILD, 2)) is None
+    cache = r6_bot.estado_shard(r6_bot.shard_da_guild(GUILD)).cache_jogadores
+    assert cache.falhas == 2
+    _rodar(r6_bot.db.executar("DELETE FROM jogadores"))
+    # As duas consultas seguintes vêm do cache, inclusive a ausência
+    assert _rodar(r6_bot.get_jogador_by_id(GUILD, 1)).elo == 1200
+    assert _rodar(r6_bot.get_jogador_by_id(GUILD, 2)) is None
+    assert cache.acertos == 2
@@ -0,0 +1,32 @@
+import asyncio
+import os
+
+import r6_bot
+
+
+def _captura(conteudo: bytes) -> r6_bot.Captura:
+    return r6_bot.Captura(b"\x89PNG" + conteudo, "resultado.PNG")
+
+
+def test_preparar_nao_grava_no_disco(tmp_path):
+    arquivo = r6_bot.ArquivoCapturas(str(tmp_path))
+    captura = asyncio.run(arquivo.preparar(_captura(b"recusado")))
+    assert captura.arquivo == os.path.join(captura.hash[:2], f"{captura.hash}.png")
+    assert captura.tamanho_arquivo == captura.tamanho_original
+    # Um print recusado depois daqui (OCR ou banco) não deixa nada no diretório
+    assert os.listdir(tmp_path) == []
+
+
+def test_guardar_grava_a_copia_preparada_uma_vez(tmp_path):
+    arquivo = r6_bot.ArquivoCapturas(str(tmp_path))
+    captura = _captura(b"aceito")
+
+    async def cenario():
+        await arquivo.preparar(captura)
+        await arquivo.guardar(captura)
+        assert captura.comprimido is None
+        await arquivo.guardar(captura)
+        return await arquivo.ler(captura.arquivo)
+
+    assert asyncio.run(cenario()) == captura.dados
+    assert captura.nome == f"resultado_{captura.hash[:12]}.png"
@@ -0,0 +1,61 @@
+import r6_bot
+
+
+def _distribuicao(elos):
+    distribuicao = r6_bot.DistribuicaoElo(guild_id=1)
+    distribuicao.carregar(list(elos.items()))
+    return distribuicao
+
+
+def test_posicao_e_percentil():
+    distribuicao = _distribuicao({1: 1000, 2: 3000, 3: 2000, 4: 4000})
+    assert [distribuicao.posicao(i) for i in (4, 2, 3, 1)] == [1, 2, 3, 4]
+    assert distribuicao.percentil(4) == 25.0
+    assert distribuicao.posicao(99) is None
+
+
+def test_empates_dividem_a_posicao():
+    distribuicao = _distribuicao({1: 2000, 2: 2000, 3: 3000})
+    assert distribuicao.posicao(1) == distribuicao.posicao(2) == 2
+
+
+def test_elos_fora_da_faixa_contam_nas_pontas():
+    distribuicao = _distribuicao({1: r6_bot.ELO_DISTRIBUICAO_MAX + 500, 2: r6_bot.ELO_DISTRIBUICAO_MAX + 100, 3: 0})
+    assert distribuicao.posicao(1) == 1
+    assert distribuicao.posicao(2) == 2
+    assert distribuicao.posicao(3) == 3
+
+
+def test_aplicar_move_e_remove_jogadores():
+    distribuicao = _distribuicao({1: 1000, 2: 2000})
+    distribuicao.aplicar([{"discord_id": 1, "elo": 2500, "rank": "OURO"}])
+    assert distribuicao.posicao(1) == 1
+    distribuicao.aplicar([{"discord_id": 2, "elo": 2000, "rank": None}])
+    assert distribuicao.posicao(2) is None
+    assert len(distribuicao) == 1
+
+
+def test_carregar_nao_sobrescreve_atualizacoes():
+    distribuicao = r6_bot.DistribuicaoElo(guild_id=1)
+    distribuicao.carregando = True
+    distribuicao.aplicar([{"discord_id": 1, "elo": 5000, "rank": "OURO"}])
+    distribuicao.carregar([(1, 1000)])
+    assert distribuicao.elo(1) == 5000
+
+
+def test_escritas_antes_da_primeira_consulta_nao_alocam_a_arvore():
+    distribuicao = r6_bot.DistribuicaoElo(guild_id=1)
+    distribuicao.aplicar([{"discord_id": 1, "elo": 5000, "rank": "OURO"}])
+    assert len(distribuicao) == 0
+    assert len(distribuicao._arvore) == 0
+
+
+def test_vizinhos():
+    distribuicao = _distribuicao({i: 1000 * i for i in range(1, 8)})
+    assert [discord_id for _, discord_id, _ in distribuicao.vizinhos(4)] == [6, 5, 4, 3, 2]
+    assert [posicao for posicao, _, _ in distribuicao.vizinhos(7, quantidade=1)] == [1, 2]
+
+
+def test_histograma():
+    distribuicao = _distribuicao({1: 1010, 2: 1020, 3: 1300, 4: 1800})
+    assert distribuicao.histograma(500) == [(1000, 3), (1500, 1)]
@@ -0,0 +1,56 @@
+import asyncio
+
+import r6_bot
+
+
+def _gravador(monkeypatch, falhar=()):
+    """Substitui a gravação em lote; retorna a lista dos lotes recebidos (IDs das partidas)."""
+    lotes = []
+
+    async def finalizar_partidas_em_lote(partidas):
+        lotes.append([partida["id"] for partida in partidas])
+        await asyncio.sleep(0.01)
+        if any(partida["id"] in falhar for partida in partidas):
+            raise ValueError("falhou")
+        return [partida["id"] * 10 for partida in partidas]
+
+    monkeypatch.setattr(r6_bot, "finalizar_partidas_em_lote", finalizar_partidas_em_lote)
+    return lotes
+
+
+def test_finalizacoes_simultaneas_viram_um_lote(monkeypatch):
+    lotes = _gravador(monkeypatch)
+    fila = r6_bot.FilaFinalizacoes()
+
+    async def cenario():
+        return await asyncio.gather(*(fila.finalizar({"id": i}) for i in range(1, 6)))
+
+    assert asyncio.run(cenario()) == [10, 20, 30, 40, 50]
+    assert lotes == [[1, 2, 3, 4, 5]]
+
+
+def test_chegadas_durante_a_gravacao_seguem_no_proximo_lote(monkeypatch):
+    lotes = _gravador(monkeypatch)
+    fila = r6_bot.FilaFinalizacoes(lote_max=2)
+
+    async def cenario():
+        primeira = asyncio.ensure_future(fila.finalizar({"id": 1}))
+        await asyncio.sleep(0.001)
+        seguintes = [asyncio.ensure_future(fila.finalizar({"id": i})) for i in range(2, 5)]
+        return await asyncio.gather(primeira, *seguintes)
+
+    assert asyncio.run(cenario()) == [10, 20, 30, 40]
+    assert lotes == [[1], [2, 3], [4]]
+
+
+def test_falha_no_lote_regrava_uma_a_uma(monkeypatch):
+    lotes = _gravador(monkeypatch, falhar={2})
+    fila = r6_bot.FilaFinalizacoes()
+
+    async def cenario():
+        return await asyncio.gather(*(fila.finalizar({"id": i}) for i in range(1, 4)), return_exceptions=True)
+
+    resultados = asyncio.run(cenario())
+    assert resultados[0] == 10 and resultados[2] == 30
+    assert isinstance(resultados[1], ValueError)
+    assert lotes == [[1, 2, 3], [1], [2], [3]]
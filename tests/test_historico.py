@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import r6_bot
+
+POR_PAGINA = r6_bot.HISTORICO_POR_PAGINA
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+def _inserir_partidas(conn, quantidade):
+    """Insere partidas alternando entre os jogadores 1 e 2; retorna os IDs das do jogador 1."""
+    ids = []
+    for numero in range(quantidade):
+        partida_id = conn.execute(
+            "INSERT INTO partidas (lobby_id, mapa, time_vencedor) VALUES ('1', 'Banco', 1)"
+        ).lastrowid
+        for jogador_id in (1, 2):
+            conn.execute(
+                "INSERT INTO partida_jogadores (partida_id, jogador_id, time, kills, deaths, resultado) "
+                "VALUES (?, ?, 1, ?, 5, 'VITÓRIA')",
+                (partida_id, jogador_id, numero)
+            )
+        ids.append(partida_id)
+    return ids
+
+
+@pytest.fixture
+def partidas():
+    async def preparar():
+        await r6_bot.db.executar("DELETE FROM partida_jogadores")
+        await r6_bot.db.executar("DELETE FROM partidas")
+        return await r6_bot.db.transacao(_inserir_partidas, 2 * POR_PAGINA + 5)
+    return _rodar(preparar())
+
+
+def _pagina(direcao, cursor):
+    return _rodar(r6_bot.db.ler(r6_bot._buscar_pagina_historico, 1, direcao, cursor))
+
+
+def test_paginas_mais_antigas_cobrem_o_historico_sem_repetir(partidas):
+    vistas = []
+    cursor = r6_bot.HISTORICO_INICIO
+    while True:
+        linhas = _pagina(">", cursor)
+        vistas += [linha["partida_id"] for linha in linhas[:POR_PAGINA]]
+        if len(linhas) <= POR_PAGINA:
+            break
+        cursor = linhas[POR_PAGINA - 1]["partida_id"]
+    assert vistas == partidas[::-1]
+
+
+def test_voltar_traz_a_pagina_anterior_na_mesma_ordem(partidas):
+    primeira = _pagina(">", r6_bot.HISTORICO_INICIO)[:POR_PAGINA]
+    segunda = _pagina(">", primeira[-1]["partida_id"])[:POR_PAGINA]
+    volta = _pagina("<", segunda[0]["partida_id"])
+    assert [linha["partida_id"] for linha in volta] == [linha["partida_id"] for linha in primeira]
+
+
+def test_primeira_pagina_desativa_recentes_e_pre_carrega_a_seguinte(partidas):
+    async def cenario():
+        linhas = await r6_bot.paginas_historico.obter(1, ">", r6_bot.HISTORICO_INICIO)
+        jogador = {"r6_nickname": "nick1", "partidas_jogadas": len(partidas)}
+        pagina = r6_bot.renderizar_historico(10, 1, jogador, linhas, ">", r6_bot.HISTORICO_INICIO)
+        recentes, antigas = pagina["view"].children
+        seguinte = await r6_bot.paginas_historico.obter(1, ">", linhas[POR_PAGINA - 1]["partida_id"])
+        return recentes.item.disabled, antigas.item.disabled, pagina["embed"].description.count("\n") + 1, seguinte
+
+    recentes_desativado, antigas_desativado, exibidas, seguinte = _rodar(cenario())
+    assert recentes_desativado and not antigas_desativado
+    assert exibidas == POR_PAGINA
+    assert seguinte[0]["partida_id"] == partidas[-POR_PAGINA - 1]
@@ -0,0 +1,35 @@
+import r6_bot
+
+
+def _indice():
+    indice = r6_bot.IndiceNicks()
+    indice.carregar([(1, "Ângelo", "angelo_br"), (2, "Ash", "cinza"), (3, "Ashley", None)])
+    return indice
+
+
+def test_busca_por_prefixo_sem_acentos_nem_caixa():
+    indice = _indice()
+    assert [discord_id for discord_id, _, _ in indice.buscar("ANGE")] == [1]
+    assert [discord_id for discord_id, _, _ in indice.buscar("as")] == [2, 3]
+    assert indice.buscar("cin") == [(2, "Ash", "cinza")]
+    assert indice.buscar("zz") == []
+
+
+def test_busca_respeita_o_limite():
+    assert len(_indice().buscar("a", limite=1)) == 1
+
+
+def test_atualizar_troca_os_termos():
+    indice = _indice()
+    indice.atualizar(2, "Thermite", "cinza")
+    assert [discord_id for discord_id, _, _ in indice.buscar("as")] == [3]
+    assert indice.buscar("therm")[0][0] == 2
+    assert len(indice) == 3
+
+
+def test_resolver():
+    indice = _indice()
+    assert indice.resolver("2") == 2
+    assert indice.resolver("ashley") == 3
+    assert indice.resolver("ângel") == 1
+    assert indice.resolver("ninguém") is None
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import pytest
+
+import r6_bot
+
+
+def _dados():
+    return {"e": r6_bot.LOBBY_AGUARDANDO, "j": list(range(10)), "c": [0, 5], "b": [], "m": None, "s": None, "v": None}
+
+
+def test_eventos_levam_do_veto_ao_inicio():
+    dados = _dados()
+    r6_bot.aplicar_evento_lobby(dados, "veto", [10, 20])
+    assert dados["e"] == r6_bot.LOBBY_VETO and dados["v"] == [10, 20]
+    r6_bot.aplicar_evento_lobby(dados, "ban", r6_bot.mapas[0])
+    assert dados["e"] == r6_bot.LOBBY_VETO and dados["b"] == [r6_bot.mapas[0]]
+    r6_bot.aplicar_evento_lobby(dados, "inicio", 30)
+    assert dados["e"] == r6_bot.LOBBY_EM_ANDAMENTO and dados["s"] == 30
+
+
+def test_ultimo_banimento_fecha_o_veto():
+    dados = _dados()
+    r6_bot.aplicar_evento_lobby(dados, "veto", [10, 20])
+    for mapa in r6_bot.mapas[:-1]:
+        r6_bot.aplicar_evento_lobby(dados, "ban", mapa)
+    assert dados["e"] == r6_bot.LOBBY_EM_ANDAMENTO
+    assert dados["m"] == r6_bot.mapas[-1]
+
+
+@pytest.fixture
+def conexao():
+    conn = r6_bot.get_db_connection()
+    conn.execute("BEGIN")
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def _evento(conn, guild_id, numero, versao, evento, valor):
+    r6_bot._gravar_evento_lobby(conn, guild_id, numero, versao, evento, json.dumps(valor))
+
+
+def test_ler_lobbies_aplica_so_os_eventos_posteriores_ao_snapshot(conexao):
+    dados = _dados()
+    dados["e"], dados["v"], dados["b"] = r6_bot.LOBBY_VETO, [10, 20], [r6_bot.mapas[0]]
+    r6_bot._gravar_snapshot_lobby(conexao, 1, 3, 2, json.dumps(dados))
+    _evento(conexao, 1, 3, 2, "ban", r6_bot.mapas[0])  # Já incorporado ao snapshot
+    _evento(conexao, 1, 3, 3, "ban", r6_bot.mapas[1])
+    _evento(conexao, 1, 3, 4, "inicio", 30)
+    _evento(conexao, 1, 4, 1, "veto", [10, 21])  # Órfão: o lobby 4 não tem snapshot
+
+    lobbies = r6_bot._ler_lobbies_gravados(conexao)
+    assert set(lobbies) == {(1, 3)}
+    versao, restaurado = lobbies[(1, 3)]
+    assert versao == 4
+    assert restaurado["b"] == r6_bot.mapas[:2]
+    assert restaurado["e"] == r6_bot.LOBBY_EM_ANDAMENTO and restaurado["s"] == 30
+
+
+def test_snapshot_novo_trunca_o_diario(conexao):
+    r6_bot._gravar_snapshot_lobby(conexao, 1, 5, 1, json.dumps(_dados()))
+    _evento(conexao, 1, 5, 2, "veto", [10, 20])
+    dados = _dados()
+    r6_bot.aplicar_evento_lobby(dados, "veto", [10, 20])
+    r6_bot._gravar_snapshot_lobby(conexao, 1, 5, 2, json.dumps(dados))
+    assert conexao.execute("SELECT COUNT(*) FROM lobby_eventos WHERE guild_id = 1 AND numero = 5").fetchone()[0] == 0
+
+    r6_bot._apagar_lobby(conexao, 1, 5)
+    assert (1, 5) not in r6_bot._ler_lobbies_gravados(conexao)
+
+
+class _AgendadorFalso:
+    def __init__(self):
+        self.agendados = []
+        self.cancelados = []
+
+    async def agendar(self, chave, tipo, atraso, **dados):
+        self.agendados.append((chave, dados["banidos"]))
+
+    async def cancelar(self, *chaves):
+        self.cancelados.extend(chaves)
+
+    def prazo(self, chave):
+        return None
+
+
+class _CategoriaFalsa:
+    def __init__(self, falhar):
+        self.falhar = falhar
+
+    async def create_voice_channel(self, nome):
+        if self.falhar:
+            raise RuntimeError("API indisponível")
+        return type("Sala", (), {"id": 30, "name": nome})()
+
+
+class _Edicao:
+    def __init__(self):
+        self.conteudos = []
+
+    def agendar(self, **conteudo):
+        self.conteudos.append(conteudo)
+
+
+def _veto_no_ultimo_ban(monkeypatch, membro, falhar):
+    agendador = _AgendadorFalso()
+    monkeypatch.setattr(r6_bot, "agendador", agendador)
+    estado = r6_bot.EstadoGuild(guild_id=1)
+    estado.categoria_partidas = _CategoriaFalsa(falhar)
+    eventos = []
+    monkeypatch.setattr(estado.lobbies, "registrar", lambda lobby, evento, valor=None: eventos.append((evento, valor)))
+    lobby = r6_bot.Lobby(7)
+    lobby.jogadores = [membro(i) for i in range(10)]
+    lobby.capitao1, lobby.capitao2 = lobby.jogadores[0], lobby.jogadores[5]
+    lobby.estado = r6_bot.LOBBY_VETO
+    lobby.mapas_banidos = list(r6_bot.mapas[:-2])
+    lobby.ban_message = type("Mensagem", (), {"id": 20})()
+    lobby.edicao_ban = _Edicao()
+    return estado, lobby, agendador, eventos
+
+
+def test_falha_ao_criar_a_sala_mantem_o_veto_aberto(monkeypatch, membro):
+    estado, lobby, agendador, eventos = _veto_no_ultimo_ban(monkeypatch, membro, falhar=True)
+    banidos = list(lobby.mapas_banidos)
+
+    async def cenario():
+        with pytest.raises(RuntimeError):
+            await r6_bot.banir_mapa(estado, lobby, r6_bot.mapas[-2])
+
+    asyncio.run(cenario())
+    assert lobby.estado == r6_bot.LOBBY_VETO
+    assert lobby.mapas_banidos == banidos and lobby.mapa_escolhido is None
+    assert eventos == [] and agendador.cancelados == []
+    # O turno do mesmo capitão é reiniciado para o tempo esgotado tentar de novo
+    assert agendador.agendados == [("veto:1:7", len(banidos))]
+
+
+def test_ultimo_ban_comeca_a_partida(monkeypatch, membro):
+    estado, lobby, agendador, eventos = _veto_no_ultimo_ban(monkeypatch, membro, falhar=False)
+    asyncio.run(r6_bot.banir_mapa(estado, lobby, r6_bot.mapas[-2]))
+    assert lobby.estado == r6_bot.LOBBY_EM_ANDAMENTO
+    assert lobby.mapa_escolhido == r6_bot.mapas[-1] and lobby.sala_partida.id == 30
+    assert eventos == [("ban", r6_bot.mapas[-2]), ("inicio", 30)]
+    assert agendador.cancelados == ["veto:1:7"]
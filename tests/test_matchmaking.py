@@ -0,0 +1,58 @@
+import r6_bot
+
+
+def _fila(membro, elos, agora=0.0):
+    fila = r6_bot.FilaMatchmaking()
+    for discord_id, elo in enumerate(elos):
+        fila.entrar(membro(discord_id), elo, canal=None, agora=agora + discord_id * 0.001)
+    return fila
+
+
+def _ids(grupo):
+    return sorted(entrada.membro.id for entrada in grupo)
+
+
+def test_sem_jogadores_suficientes(membro):
+    fila = _fila(membro, [1000] * (r6_bot.MAX_JOGADORES - 1))
+    assert fila.rodada(agora=10.0) == []
+    assert len(fila) == r6_bot.MAX_JOGADORES - 1
+
+
+def test_forma_partida_com_os_mais_proximos_da_ancora(membro):
+    elos = [1000 + 10 * i for i in range(r6_bot.MAX_JOGADORES)] + [1095, 2500]
+    fila = _fila(membro, elos)
+    partidas = fila.rodada(agora=0.1)
+    assert len(partidas) == 1
+    assert _ids(partidas[0]) == list(range(r6_bot.MAX_JOGADORES))
+    assert len(fila) == 2
+    assert 0 not in fila
+
+
+def test_janela_cresce_com_a_espera(membro):
+    distancia = r6_bot.MM_JANELA_INICIAL + 200
+    elos = [1000] * (r6_bot.MAX_JOGADORES - 1) + [1000 + distancia]
+    fila = _fila(membro, elos)
+    assert fila.rodada(agora=1.0) == []
+    espera = (distancia - r6_bot.MM_JANELA_INICIAL) / r6_bot.MM_JANELA_POR_SEGUNDO
+    partidas = fila.rodada(agora=espera + 1.0)
+    assert len(partidas) == 1
+    assert len(fila) == 0
+
+
+def test_sair_tira_da_fila(membro):
+    fila = _fila(membro, [1000] * r6_bot.MAX_JOGADORES)
+    assert fila.sair(3).membro.id == 3
+    assert fila.sair(3) is None
+    assert fila.rodada(agora=1.0) == []
+
+
+def test_devolver_mantem_o_tempo_de_espera_e_a_ancora(membro):
+    fila = _fila(membro, [1000] * r6_bot.MAX_JOGADORES)
+    grupo = fila.rodada(agora=1.0)[0]
+    fila.entrar(membro(99), 1000, canal=None, agora=2.0)
+    fila.devolver(grupo, agora=3.0)
+    assert len(fila) == r6_bot.MAX_JOGADORES + 1
+    assert fila.entrada(0).desde == 0.0
+    partidas = fila.rodada(agora=4.0)
+    assert _ids(partidas[0]) == list(range(r6_bot.MAX_JOGADORES))
+    assert 99 in fila
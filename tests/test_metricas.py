@@ -0,0 +1,15 @@
+import r6_bot
+
+
+def test_rotulos_sao_escapados():
+    metricas = r6_bot.Metricas()
+    metricas.incrementar("r6_teste_total", comando='a\\b"c\nd')
+    assert 'r6_teste_total{comando="a\\\\b\\"c\\nd"} 1' in metricas.prometheus().splitlines()
+
+
+def test_histograma_tem_baldes_acumulados():
+    metricas = r6_bot.Metricas()
+    metricas.observar("r6_teste_segundos", 0.0001, comando="fila")
+    linhas = metricas.prometheus().splitlines()
+    assert 'r6_teste_segundos_bucket{comando="fila",le="+Inf"} 1' in linhas
+    assert 'r6_teste_segundos_count{comando="fila"} 1' in linhas
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import ocr
+import r6_bot
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_mapeia_nomes_lidos_para_o_nick_mais_parecido():
+    linhas = [("Ash_R6", 7, 3), ("thermlte", 2, 5)]
+    kills, deaths = ocr.BackendOCR._mapear_jogadores(linhas, ["ash_r6", "Thermite", "Sledge"])
+    assert kills == [7, 2, 0]
+    assert deaths == [3, 5, 0]
+
+
+def test_pipeline_roda_o_backend_num_processo_separado(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipeline = r6_bot.PipelineResultados(backend="simulado", processos=1)
+    try:
+        resultado = asyncio.run(pipeline.processar(b"print", ["a", "b"]))
+    finally:
+        pipeline.fechar()
+    assert resultado == ocr.BackendSimulado().extrair(b"print", ["a", "b"])
+    assert os.listdir(tmp_path) == []
+
+
+def test_importar_o_bot_nao_cria_o_banco(tmp_path):
+    # Os processos do OCR reimportam o arquivo principal ao iniciar
+    ambiente = {**os.environ, "PYTHONPATH": RAIZ}
+    ambiente.pop("R6_DB_PATH", None)
+    subprocess.run([sys.executable, "-c", "import r6_bot"], cwd=tmp_path, env=ambiente, check=True)
+    assert not (tmp_path / "r6_stats.db").exists()
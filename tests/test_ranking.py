@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+import r6_bot
+
+GUILD = 1
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+@pytest.fixture(autouse=True)
+def _sem_jogadores():
+    _rodar(r6_bot.db.executar("DELETE FROM jogadores"))
+
+
+def _registrar(discord_id, elo, partidas=1, kd=1.0):
+    _rodar(r6_bot.db.executar(
+        "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo, partidas_jogadas, vitorias, kd_ratio) "
+        "VALUES (?, ?, ?, ?, 'OURO', ?, ?, 0, ?)",
+        (GUILD, discord_id, f"nome{discord_id}", f"nick{discord_id}", elo, partidas, kd)
+    ))
+
+
+def _atualizar(discord_id, elo):
+    return _rodar(r6_bot.db.executar_retornando(
+        "UPDATE jogadores SET elo = ? WHERE guild_id = ? AND discord_id = ? RETURNING *", (elo, GUILD, discord_id)
+    ))
+
+
+def _nicks(embed):
+    return [campo.name.split()[1] for campo in embed.fields]
+
+
+def test_top_n_segue_a_ordem_do_banco_e_ignora_inelegiveis():
+    for discord_id in range(1, 16):
+        _registrar(discord_id, 1000 + 100 * discord_id)
+    _registrar(50, 9000, partidas=0)
+    _registrar(51, 0)
+    embed = _rodar(r6_bot.PlacarRanking(GUILD).embed())
+    assert _nicks(embed) == [f"nick{discord_id}" for discord_id in range(15, 5, -1)]
+
+
+def test_aplicar_atualiza_o_top_sem_recarregar():
+    for discord_id in range(1, 16):
+        _registrar(discord_id, 1000 + 100 * discord_id)
+    placar = r6_bot.PlacarRanking(GUILD)
+    _rodar(placar.embed())
+
+    async def nao_recarregar():
+        raise AssertionError("o placar não deveria recarregar")
+
+    placar._carregar = nao_recarregar
+    placar.aplicar([_atualizar(1, 5000)])
+    placar.aplicar([_atualizar(15, 10)])
+    assert _nicks(_rodar(placar.embed()))[:2] == ["nick1", "nick14"]
+    assert "nick15" not in _nicks(_rodar(placar.embed()))
+
+
+def test_embed_em_cache_enquanto_o_top_nao_muda():
+    for discord_id in range(1, 16):
+        _registrar(discord_id, 1000 + 100 * discord_id)
+    placar = r6_bot.PlacarRanking(GUILD)
+    primeiro = _rodar(placar.embed())
+    placar.aplicar([_atualizar(1, 1050)])
+    assert _rodar(placar.embed()) is primeiro
+    placar.aplicar([_atualizar(2, 9000)])
+    assert _rodar(placar.embed()) is not primeiro
+
+
+def test_reserva_recarrega_quando_encolhe():
+    for discord_id in range(1, 8):
+        _registrar(discord_id, 1000 + 100 * discord_id)
+    placar = r6_bot.PlacarRanking(GUILD, tamanho=3, reserva=1)
+    assert _nicks(_rodar(placar.embed())) == ["nick7", "nick6", "nick5"]
+    placar.aplicar([_atualizar(7, 0), _atualizar(6, 0)])
+    assert _nicks(_rodar(placar.embed())) == ["nick5", "nick4", "nick3"]
+
+
+def test_kd_nulo_fica_depois_como_no_banco():
+    _registrar(1, 2000, kd=None)
+    _registrar(2, 2000, kd=0.0)
+    _registrar(3, 2000, kd=0.5)
+    placar = r6_bot.PlacarRanking(GUILD)
+    assert _nicks(_rodar(placar.embed())) == ["nick3", "nick2", "nick1"]
+    placar.aplicar([_atualizar(1, 2000)])
+    assert _nicks(_rodar(placar.embed())) == ["nick3", "nick2", "nick1"]
+
+
+def test_escrita_durante_a_carga_nao_se_perde(monkeypatch):
+    for discord_id in range(1, 16):
+        _registrar(discord_id, 1000 + 100 * discord_id)
+    placar = r6_bot.PlacarRanking(GUILD)
+    buscar_todos = r6_bot.db.buscar_todos
+    leituras = []
+
+    async def leitura_atrasada(sql, params=()):
+        linhas = await buscar_todos(sql, params)
+        if not leituras:
+            # A escrita é gravada e aplicada depois da leitura, antes de a carga terminar
+            placar.aplicar([await r6_bot.db.executar_retornando(
+                "UPDATE jogadores SET elo = 9000 WHERE guild_id = ? AND discord_id = 1 RETURNING *", (GUILD,)
+            )])
+        leituras.append(linhas)
+        return linhas
+
+    monkeypatch.setattr(r6_bot.db, "buscar_todos", leitura_atrasada)
+    assert _nicks(_rodar(placar.embed()))[0] == "nick1"
+    assert len(leituras) == 2
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import r6_bot
+
+GUILD = 1
+RANKS = ["BRONZE", "PRATA", "OURO", "PLATINA", "ESMERALDA"]
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+@pytest.fixture
+def jogadores():
+    """Dez jogadores registrados, com o ELO inicial do rank escolhido."""
+    async def preparar():
+        for tabela in ("partida_jogadores", "partidas", "jogadores", "forma_recente", "estatisticas_mapa"):
+            await r6_bot.db.executar(f"DELETE FROM {tabela}")
+        for discord_id in range(1, 11):
+            rank = RANKS[discord_id % len(RANKS)]
+            await r6_bot.db.executar(
+                "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo) VALUES (?, ?, ?, ?, ?, ?)",
+                (GUILD, discord_id, f"nome{discord_id}", f"nick{discord_id}", rank, r6_bot.RANKS[rank]["valor"])
+            )
+    _rodar(preparar())
+    return list(range(1, 11))
+
+
+def _elos(guild_id=GUILD):
+    linhas = _rodar(r6_bot.db.buscar_todos(
+        "SELECT discord_id, elo FROM jogadores WHERE guild_id = ? ORDER BY discord_id", (guild_id,)
+    ))
+    return {linha["discord_id"]: linha["elo"] for linha in linhas}
+
+
+def test_motor_fixo_usa_os_valores_de_vitoria_e_derrota():
+    time1, time2 = r6_bot.MotorFixo().variacoes([1000] * 5, [3000] * 5, vencedor=2)
+    assert time1 == [r6_bot.ELO_DERROTA] * 5
+    assert time2 == [r6_bot.ELO_VITORIA] * 5
+
+
+def test_motor_elo_premia_a_zebra_e_soma_zero():
+    motor = r6_bot.MotorElo()
+    zebra, favorito = motor.variacoes([1500] * 5, [2500] * 5, vencedor=1)
+    esperado, _ = motor.variacoes([2500] * 5, [1500] * 5, vencedor=1)
+    assert zebra[0] > esperado[0] > 0
+    assert zebra[0] == -favorito[0]
+    empate, _ = motor.variacoes([2000] * 5, [2000] * 5, vencedor=1)
+    assert empate[0] == motor.k / 2
+
+
+def test_variacoes_partida_segue_a_ordem_dos_participantes():
+    participantes = [(1, 2, 0, 0), (2, 1, 0, 0), (3, 2, 0, 0), (4, 1, 0, 0)]
+    ratings = {1: 1000, 2: 1000, 3: 1000, 4: 1000}
+    variacoes = r6_bot.variacoes_partida(r6_bot.MotorFixo(), participantes, ratings, vencedor=1)
+    assert variacoes == [r6_bot.ELO_DERROTA, r6_bot.ELO_VITORIA, r6_bot.ELO_DERROTA, r6_bot.ELO_VITORIA]
+
+
+def test_recalculo_reproduz_os_ratings_incrementais(jogadores, monkeypatch):
+    monkeypatch.setattr(r6_bot, "motor_rating", r6_bot.MotorElo())
+    for numero in range(6):
+        ordem = jogadores[numero:] + jogadores[:numero]
+        partida = {
+            "guild_id": GUILD, "lobby_id": "1", "mapa": "Banco", "time_vencedor": 1 + numero % 2,
+            "jogadores": [(discord_id, 1 if i < 5 else 2, i, 3) for i, discord_id in enumerate(ordem)],
+        }
+        _rodar(r6_bot.finalizar_partidas_em_lote([partida]))
+    incrementais = _elos()
+
+    _rodar(r6_bot.db.executar("UPDATE jogadores SET elo = 0"))
+    ratings, janelas, ultima = r6_bot._recalcular_ratings(GUILD, "elo", "1970-01-01")
+    _rodar(r6_bot.db.transacao(r6_bot._aplicar_recalculo, GUILD, "elo", "1970-01-01", ratings, janelas, ultima))
+    assert _elos() == incrementais
+
+
+def test_temporada_ignora_partidas_anteriores(jogadores):
+    partida = {
+        "guild_id": GUILD, "lobby_id": "1", "mapa": "Banco", "time_vencedor": 1,
+        "jogadores": [(discord_id, 1 if discord_id <= 5 else 2, 0, 0) for discord_id in jogadores],
+    }
+    _rodar(r6_bot.finalizar_partidas_em_lote([partida]))
+    ratings, janelas, ultima = r6_bot._recalcular_ratings(GUILD, "fixo", "2999-01-01")
+    _rodar(r6_bot.db.transacao(r6_bot._aplicar_recalculo, GUILD, "fixo", "2999-01-01", ratings, janelas, ultima))
+    rank = {discord_id: RANKS[discord_id % len(RANKS)] for discord_id in jogadores}
+    assert _elos() == {discord_id: r6_bot.RANKS[rank[discord_id]]["valor"] for discord_id in jogadores}
+
+
+def test_recalculo_nao_altera_outras_guildas(jogadores):
+    _rodar(r6_bot.db.executar(
+        "INSERT INTO jogadores (guild_id, discord_id, discord_name, r6_nickname, rank, elo) VALUES (2, 1, 'nome', 'nick', 'OURO', 1234)"
+    ))
+    ratings, janelas, ultima = r6_bot._recalcular_ratings(GUILD, "fixo", "1970-01-01")
+    _rodar(r6_bot.db.transacao(r6_bot._aplicar_recalculo, GUILD, "fixo", "1970-01-01", ratings, janelas, ultima))
+    assert _elos(2) == {1: 1234}
+    ids = _rodar(r6_bot.db.buscar_todos("SELECT id FROM jogadores WHERE guild_id = ?", (GUILD,)))
+    assert set(ratings) == {linha["id"] for linha in ids}
+
+
+def test_recalculo_troca_o_motor_da_guilda(jogadores, monkeypatch):
+    monkeypatch.setattr(r6_bot, "motores_por_guild", {})
+    assert _rodar(r6_bot.recalcular_ratings(GUILD, "fixo", "1970-01-01")) == len(jogadores)
+    assert r6_bot.motor_da_guild(GUILD).nome == "fixo"
+    assert r6_bot.motor_da_guild(2) is r6_bot.motor_rating
+    assert _rodar(r6_bot.obter_configuracao(f"motor_rating:{GUILD}")) == "fixo"
@@ -0,0 +1,51 @@
+import itertools
+
+import r6_bot
+
+
+def _media(elos, time):
+    return sum(elos[i] for i in time) / len(time)
+
+
+def test_divide_em_dois_times_do_mesmo_tamanho():
+    elos = [1000, 1200, 3000, 3100, 5000, 5200, 7000, 7100, 9000, 9400]
+    time1, time2 = r6_bot.dividir_times(elos)
+    assert sorted(time1 + time2) == list(range(10))
+    assert len(time1) == len(time2) == 5
+
+
+def test_divisao_exaustiva_encontra_a_menor_diferenca():
+    elos = [1000, 1200, 3000, 3100, 5000, 5200, 7000, 7100, 9000, 9400]
+    time1, time2 = r6_bot.dividir_times(elos)
+    melhor = min(
+        abs(_media(elos, grupo) - _media(elos, [i for i in range(10) if i not in grupo]))
+        for grupo in itertools.combinations(range(10), 5)
+    )
+    assert abs(_media(elos, time1) - _media(elos, time2)) == melhor
+
+
+def test_respeita_separados_e_juntos():
+    elos = [5000, 5000, 1000, 1000, 3000, 3000, 2000, 4000, 2500, 3500]
+    time1, time2 = r6_bot.dividir_times(elos, separados=[(0, 1)], juntos=[(2, 3)])
+    assert (0 in time1) != (1 in time1)
+    assert (2 in time1) == (3 in time1)
+
+
+def test_restricoes_impossiveis_sao_ignoradas():
+    elos = [1000, 2000, 3000, 4000]
+    time1, time2 = r6_bot.dividir_times(elos, separados=[(0, 1)], juntos=[(0, 1)])
+    assert sorted(time1 + time2) == [0, 1, 2, 3]
+    assert len(time1) == len(time2) == 2
+
+
+def test_heuristica_acima_do_limite_exaustivo():
+    elos = [1000 + 137 * i for i in range(r6_bot.DIVISAO_EXAUSTIVA_MAX + 6)]
+    time1, time2 = r6_bot.dividir_times(elos, separados=[(0, 1)])
+    assert sorted(time1 + time2) == list(range(len(elos)))
+    assert abs(len(time1) - len(time2)) <= 1
+    assert (0 in time1) != (1 in time1)
+    assert abs(_media(elos, time1) - _media(elos, time2)) < 100
+
+
+def test_poucos_jogadores():
+    assert r6_bot.dividir_times([1500]) == ([0], [])